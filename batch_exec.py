@@ -0,0 +1,161 @@
+"""
+Runs many programs, or one program with many input sets, in a pool of processes.
+Every job has its own MemoryAllocator, VirtualMachine, output and logs folder, errors of programs
+come back as results with exit code and message instead of stopping the batch.
+Run from repository root: python batch_exec.py prog.txt other.txt [--inputs moves.txt ...] [--workers 4]
+"""
+import os
+import signal
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from itertools import product
+from time import perf_counter
+from typing import Any, Iterable, NamedTuple, Optional
+
+import program_exec
+from translator.channels import MemoryOutput, ScriptedInput
+from translator.logger import LogLevel
+from translator.sys_exceptions import ProgramExit
+
+
+# as in coreutils timeout
+TIMEOUT_EXIT_CODE = 124
+
+
+class JobTimeout(BaseException):
+    # not Exception, so nothing in job catches it by mistake
+    pass
+
+
+class Job(NamedTuple):
+    name: str
+    program_file_name: str
+    # lines read by gets, program fails on gets when they run out
+    inputs: tuple[str, ...] = ()
+    # keyword arguments of program_exec.main
+    options: Optional[dict[str, Any]] = None
+
+
+class JobResult(NamedTuple):
+    name: str
+    exit_code: int
+    output: list[str]
+    error: Optional[str]
+    seconds: float
+
+
+def program_jobs(program_file_names: Iterable[str], input_sets: Iterable[Iterable[str]] = ((),),
+                 **options) -> list[Job]:
+    """
+    Job for every program with every input set
+    """
+    input_sets = [tuple(inputs) for inputs in input_sets]
+    jobs = []
+    for program_file_name, (number, inputs) in product(program_file_names, enumerate(input_sets)):
+        name = program_file_name if len(input_sets) == 1 else f'{program_file_name}#{number}'
+        jobs.append(Job(name, program_file_name, inputs, options))
+    return jobs
+
+
+def stop_job(signal_number, frame) -> None:
+    raise JobTimeout()
+
+
+def run_job(job: Job, logs_folder: Optional[str] = None, log_levels: Optional[dict[str, LogLevel]] = None,
+            timeout: Optional[float] = None) -> JobResult:
+    """
+    Timeout needs SIGALRM, so it is ignored where there is no such signal (Windows)
+    """
+    output = MemoryOutput()
+    exit_code, error = 0, None
+    # bytecode cache is off unless asked, so processes do not write the same files at once
+    options = {'cache_folder': None, **(job.options or {})}
+    if logs_folder is not None:
+        logs_folder = os.path.join(logs_folder, job.name.replace(os.sep, '_'), '')
+        os.makedirs(logs_folder, exist_ok=True)
+
+    timer = timeout is not None and hasattr(signal, 'SIGALRM')
+    if timer:
+        signal.signal(signal.SIGALRM, stop_job)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    started = perf_counter()
+    try:
+        # error messages of custom_raise are returned in result, not printed
+        with redirect_stdout(StringIO()):
+            program_exec.main(
+                job.program_file_name, logs_folder=logs_folder or '',
+                log_levels=program_exec.PRODUCTION_LOG_LEVELS if log_levels is None else log_levels,
+                input_channel=ScriptedInput(job.inputs), output_channel=output, **options,
+            )
+    except ProgramExit as stop:
+        exit_code, error = stop.exception.exit_code, stop.exception.message
+    except JobTimeout:
+        exit_code, error = TIMEOUT_EXIT_CODE, f'timed out after {timeout} s'
+    except Exception as failure:
+        # broken program can still break translator itself, e.g. nesting deeper than recursion limit
+        exit_code, error = 1, f'{type(failure).__name__}: {failure}'
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return JobResult(job.name, exit_code, output.lines, error, perf_counter() - started)
+
+
+def run_batch(jobs: list[Job], workers: Optional[int] = None, logs_folder: Optional[str] = None,
+              log_levels: Optional[dict[str, LogLevel]] = None, timeout: Optional[float] = None) -> list[JobResult]:
+    """
+    Results in order of jobs
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(
+            run_job, jobs, [logs_folder] * len(jobs), [log_levels] * len(jobs), [timeout] * len(jobs),
+            chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1))),
+        ))
+
+
+def report(results: list[JobResult], seconds: float) -> str:
+    exit_codes = {}
+    for result in results:
+        exit_codes[result.exit_code] = exit_codes.get(result.exit_code, 0) + 1
+    busy = sum(result.seconds for result in results)
+    rows = [
+        f'{len(results)} jobs in {seconds:.3f} s, {busy:.3f} s of work '
+        f'({busy / seconds if seconds else 0:.1f}x parallel)\n',
+        'exit codes: ' + ', '.join(f'{code}: {count}' for code, count in sorted(exit_codes.items())) + '\n',
+    ]
+    rows.extend(
+        f'  {result.name}: code {result.exit_code}, {result.error}\n' for result in results if result.exit_code
+    )
+    if results:
+        slowest = max(results, key=lambda result: result.seconds)
+        rows.append(f'slowest: {slowest.name} {slowest.seconds:.3f} s\n')
+    return ''.join(rows)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    arguments = ArgumentParser(description='Runs programs in pool of processes')
+    arguments.add_argument('programs', nargs='+', help='source files')
+    arguments.add_argument('--inputs', nargs='*', default=(), help='files with input lines, one job per file')
+    arguments.add_argument('--workers', type=int, default=None, help='number of processes, all CPUs by default')
+    arguments.add_argument('--timeout', type=float, default=60, help='seconds given to every job')
+    arguments.add_argument('--logs', default=None, help='folder for logs of jobs, logs are off by default')
+    arguments.add_argument('-O', dest='optimization_level', type=int, default=0, help='optimization level')
+    options = arguments.parse_args(argv)
+
+    input_sets = []
+    for file_name in options.inputs:
+        with open(file_name, 'r') as file:
+            input_sets.append(file.read().splitlines())
+    jobs = program_jobs(options.programs, input_sets or [()], optimization_level=options.optimization_level)
+    log_levels = None if options.logs is None else program_exec.DEBUG_LOG_LEVELS
+
+    started = perf_counter()
+    results = run_batch(jobs, options.workers, options.logs, log_levels, options.timeout)
+    print(report(results, perf_counter() - started), end='')
+    return max((result.exit_code for result in results), default=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
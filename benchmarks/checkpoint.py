@@ -0,0 +1,153 @@
+"""
+Checkpoint and resume (translator.checkpoint): every program is run to the end and in slices of few
+instructions. After every slice its checkpoint is encoded, decoded and resumed by new VirtualMachine
+with new allocator, as another process would do; programs reading input are resumed by the same
+VirtualMachine, which keeps unread lines. Outputs, exit codes, errors and free memory after restore
+must be the same. With tiering the first slices compile hot loops, the rest of program is resumed without
+max_steps and runs them, endless loop must still stop after max_steps.
+Then size of checkpoint and time of dump and resume of generated programs are printed.
+Exit code is 1 when any program differs.
+Run from repository root: python -m benchmarks.checkpoint
+"""
+import sys
+from itertools import product
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.generators import GENERATORS
+from benchmarks.transpiler import MODES, PROGRAMS, compiled
+from translator import checkpoint
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.program import Program
+from translator.tiering import HotLoopCompiler
+from translator.virtual_machine import Execution, VirtualMachine
+
+
+SLICES = (1, 7, 50)
+
+SIZES = {'tight_loop': 2000, 'string_heavy': 2000, 'many_variables': 2000}
+
+# low, so loops of small programs are compiled in the first slices
+TIER_UP_THRESHOLD = 2
+
+# slices of tiered run before the rest is run without max_steps
+TIERED_SLICES = 3
+
+ENDLESS = '{ i = 0; while (1;) { i = i + 1; } }'
+
+ENDLESS_STEPS = 1000
+
+
+def new_vm(tiering: Optional[HotLoopCompiler] = None) -> VirtualMachine:
+    return VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None, tiering=tiering)
+
+
+def sliced(program: Program, inputs: tuple, max_steps: int) -> tuple[Execution, list[str]]:
+    vm = new_vm()
+    execution = vm.execute(program, inputs=inputs, max_steps=max_steps)
+    outputs, problems = list(execution.outputs), []
+    while execution.checkpoint is not None:
+        state = checkpoint.decode(checkpoint.encode(execution.checkpoint))
+        if state != execution.checkpoint:
+            problems.append(f'checkpoint changed by encoding at {state.address}')
+        if not inputs:
+            # another process: nothing is shared with previous VirtualMachine
+            vm = new_vm()
+        execution = vm.resume(state, program, max_steps=max_steps)
+        outputs.extend(execution.outputs)
+    return execution._replace(outputs=outputs), problems
+
+
+def restored_memory(program: Program, max_steps: int) -> list[str]:
+    problems = []
+    execution = new_vm().execute(program, max_steps=max_steps)
+    while execution.checkpoint is not None:
+        vm = new_vm()
+        state = execution.checkpoint
+        execution = vm.resume(state, program, max_steps=0)
+        if vm.local_variables.memory.memory_size != state.memory_free:
+            problems.append(f'free memory {vm.local_variables.memory.memory_size} != {state.memory_free}')
+        execution = vm.resume(execution.checkpoint, program, max_steps=max_steps)
+    return problems
+
+
+def tiered(program: Program, inputs: tuple, max_steps: int) -> Execution:
+    vm = new_vm(HotLoopCompiler(TIER_UP_THRESHOLD))
+    execution = vm.execute(program, inputs=inputs, max_steps=max_steps)
+    outputs = list(execution.outputs)
+    for _ in range(TIERED_SLICES):
+        if execution.checkpoint is None:
+            break
+        execution = vm.resume(execution.checkpoint, program, max_steps=max_steps)
+        outputs.extend(execution.outputs)
+    if execution.checkpoint is not None:
+        execution = vm.resume(execution.checkpoint, program)
+        outputs.extend(execution.outputs)
+    return execution._replace(outputs=outputs)
+
+
+def endless(max_steps: int) -> list[str]:
+    program = Program(compiled(ENDLESS, (0, False, True)), name='endless')
+    tiering = HotLoopCompiler(TIER_UP_THRESHOLD)
+    vm = new_vm(tiering)
+    checkpoint_steps = []
+    execution = vm.execute(program, max_steps=max_steps)
+    for _ in range(TIERED_SLICES):
+        checkpoint_steps.append(execution.checkpoint and execution.checkpoint.steps)
+        execution = vm.resume(execution.checkpoint, program, max_steps=max_steps)
+    expected = [max_steps * (index + 1) for index in range(TIERED_SLICES)]
+    if checkpoint_steps != expected or not tiering.stats['tier_ups']:
+        return [
+            f'endless tiered by {max_steps}: steps {checkpoint_steps}, expected {expected}, {dict(tiering.stats)}\n'
+        ]
+    return []
+
+
+def check(programs: dict[str, tuple[str, tuple]]) -> list[str]:
+    mismatches = []
+    for (name, (source, inputs)), mode, max_steps in product(programs.items(), MODES, SLICES):
+        program = Program(compiled(source, mode), name=name)
+        expected = new_vm().execute(program, inputs=inputs)
+        actual, problems = sliced(program, inputs, max_steps)
+        if not inputs:
+            problems.extend(restored_memory(program, max_steps))
+        if expected != actual or problems:
+            mismatches.append(f'{name} {mode} by {max_steps}:\n  run     {expected}\n  resumed {actual}\n')
+            mismatches.extend(f'  {problem}\n' for problem in problems[:3])
+        actual = tiered(program, inputs, max_steps)
+        if expected != actual:
+            mismatches.append(f'{name} {mode} tiered by {max_steps}:\n  run     {expected}\n  resumed {actual}\n')
+    mismatches.extend(endless(ENDLESS_STEPS))
+    return mismatches
+
+
+def timings(sizes: dict[str, int]) -> list[str]:
+    rows = []
+    for name, size in sizes.items():
+        program = Program(compiled(GENERATORS[name](size), (2, True, True)), name=name)
+        vm = new_vm()
+        execution = vm.execute(program, max_steps=5000)
+        if execution.checkpoint is None:
+            continue
+        started = perf_counter()
+        data = checkpoint.encode(execution.checkpoint)
+        encoded = perf_counter() - started
+        started = perf_counter()
+        new_vm().resume(checkpoint.decode(data), program, max_steps=0)
+        resumed = perf_counter() - started
+        rows.append(
+            f'{name:<16} {len(data):8} bytes, {len(execution.checkpoint.variables):5} variables, '
+            f'encode {encoded * 1000:7.2f} ms, decode and resume {resumed * 1000:7.2f} ms\n'
+        )
+    return rows
+
+
+def main() -> int:
+    mismatches = check(PROGRAMS)
+    print(f'{len(PROGRAMS)} programs in {len(MODES)} modes by {SLICES} steps, {len(mismatches)} mismatches')
+    print(''.join(mismatches + timings(SIZES)), end='')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
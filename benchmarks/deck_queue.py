@@ -0,0 +1,64 @@
+"""
+Compares list-based ListDeck and ListQueue with ring-buffer Deck and Queue
+on queue workload (push to the end, pop from the beginning), element by element and in batches.
+Run from repository root: python -m benchmarks.deck_queue
+"""
+from time import perf_counter
+
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.stack_deck_queue import Deck, ListDeck, ListQueue, Queue
+
+
+SIZES = (1000, 10000, 50000)
+
+BATCH = 100
+
+
+def fifo_queue(collection, size: int) -> None:
+    for number in range(size):
+        collection.push(number)
+    for _ in range(size):
+        collection.pop()
+
+
+def fifo_deck(collection, size: int) -> None:
+    for number in range(size):
+        collection.push_first(number)
+    for _ in range(size):
+        collection.pop_last()
+    for number in range(size):
+        collection.push_last(number)
+    for _ in range(size):
+        collection.pop_first()
+
+
+def batches(collection, size: int) -> None:
+    for start in range(0, size, BATCH):
+        collection.extend(range(start, start + BATCH))
+    while len(collection):
+        collection.drain(BATCH)
+
+
+def measure(collection_class, workload, size: int) -> float:
+    collection = collection_class(MemoryAllocator(MY_OPERATIVE_MEMORY, None))
+    started = perf_counter()
+    workload(collection, size)
+    return perf_counter() - started
+
+
+def main(sizes: tuple[int, ...] = SIZES) -> None:
+    cases = (
+        ('ListQueue', ListQueue, fifo_queue),
+        ('Queue', Queue, fifo_queue),
+        ('ListDeck', ListDeck, fifo_deck),
+        ('Deck', Deck, fifo_deck),
+        ('Queue batches', Queue, batches),
+    )
+    print(f'{"collection":<16}{"elements":>10}{"time, s":>10}')
+    for size in sizes:
+        for name, collection_class, workload in cases:
+            print(f'{name:<16}{size:>10}{measure(collection_class, workload, size):>10.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares reference VirtualMachine.run with pre-decoded VirtualMachine.run_fast
+on programs where most of executed commands belong to one class.
+Both run on preallocated FixedStack (max_stack_depth of verified program), so time of
+allocator accounting of Stack is left out and numbers are time of dispatch and of commands.
+Run from repository root: python -m benchmarks.dispatch
+"""
+from io import StringIO
+from time import perf_counter
+
+from translator.channels import NullOutput
+from translator.compiler import Compiler
+from translator.fast_dispatch import STOP, predecode
+from translator.lexer import BufferedLexer
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.parser import Parser
+from translator.virtual_machine import VirtualMachine
+
+
+ITERATIONS = 300
+
+# class -> (program, superinstructions are selected)
+PROGRAMS = {
+    'arithmetic': ('{ i = 0; while (i < %d;) { x = 1 + 2 * 3 - 4 / 2 + 5 * 6 - 7; i = i + 1; } }', False),
+    'variables': ('{ i = 0; a = 1; b = 2; while (i < %d;) { c = a; a = b; b = c; d = a; e = d; i = i + 1; } }', False),
+    'branches': ('{ i = 0; while (i < %d;) { if (i ^ 1;) ; if (i ~ 2;) ; if (i < 3;) ; else ; i = i + 1; } }', False),
+    'output': ('{ i = 0; while (i < %d;) { puts i; puts "line"; i = i + 1; } }', False),
+    'superinstr': ('{ i = 0; a = 1; b = 2; while (i < %d;) { c = a + b; d = a < b; e = 7; i = i + 1; } }', True),
+}
+
+
+def compile_program(source: str, superinstructions: bool = False) -> list:
+    parser = Parser(BufferedLexer(StringIO(source), None), None, pretokenize=True)
+    compiler = Compiler(None)
+    program = compiler.compile(parser.parse())
+    return compiler.select_superinstructions(program) if superinstructions else program
+
+
+def new_vm() -> VirtualMachine:
+    return VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, None), None, output_channel=NullOutput())
+
+
+def executed_instructions(program: list) -> int:
+    code, address, executed = predecode(new_vm(), program), 0, 0
+    while address != STOP:
+        address = code[address]()
+        executed += 1
+    return executed
+
+
+def measure(program: list, max_stack_depth: int, fast: bool) -> float:
+    vm = new_vm()
+    started = perf_counter()
+    if fast:
+        vm.run_fast(program, max_stack_depth)
+    else:
+        vm.run(program, max_stack_depth)
+    return perf_counter() - started
+
+
+def main(iterations: int = ITERATIONS) -> None:
+    print(f'{"class":<12}{"commands":>10}{"run, ns":>10}{"run_fast, ns":>14}{"speedup":>10}')
+    for name, (template, superinstructions) in PROGRAMS.items():
+        program = compile_program(template % iterations, superinstructions)
+        max_stack_depth = Compiler.max_stack_depth(program)
+        executed = executed_instructions(program)
+        # time of one executed command
+        reference = min(measure(program, max_stack_depth, fast=False) for _ in range(3)) / executed * 1e9
+        fast = min(measure(program, max_stack_depth, fast=True) for _ in range(3)) / executed * 1e9
+        print(f'{name:<12}{executed:>10}{reference:>10.0f}{fast:>14.0f}{reference / fast:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
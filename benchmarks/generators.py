@@ -0,0 +1,65 @@
+"""
+Generators of synthetic programs for benchmarks. Every generator takes size and returns source text
+"""
+from string import ascii_lowercase
+
+
+def name(number: int) -> str:
+    # identifiers can not contain digits, so numbers are written with letters
+    letters = ''
+    while True:
+        number, rest = divmod(number, len(ascii_lowercase))
+        letters = ascii_lowercase[rest] + letters
+        if number == 0:
+            return letters
+
+
+def deep_nesting(depth: int) -> str:
+    opening = ''.join(f'if ({level} < {depth};) {{ x_{name(level)} = {level}; ' for level in range(depth))
+    return '{ ' + opening + 'puts 1; ' + '} ' * depth + '}'
+
+
+def arithmetic_chain(length: int) -> str:
+    operators = '+-*/'
+    chain = ' '.join(f'{number % 9 + 1} {operators[number % 4]}' for number in range(length))
+    return f'{{ x = {chain} 1; puts x; }}'
+
+
+def many_variables(count: int) -> str:
+    statements = [f'v_{name(0)} = 0;']
+    statements.extend(f'v_{name(number)} = v_{name(number - 1)} + 1;' for number in range(1, count))
+    statements.append(f'puts v_{name(count - 1)};')
+    return '{ ' + ' '.join(statements) + ' }'
+
+
+def tight_loop(iterations: int) -> str:
+    return f'{{ i = 0; s = 0; while (i < {iterations};) {{ s = s + i * 2; i = i + 1; }} puts s; }}'
+
+
+def string_heavy(iterations: int) -> str:
+    return (
+        f'{{ i = 0; line = "|"; while (i < {iterations};) {{ '
+        f'line = line + "cell" + "|"; if (line ^ "|cell|";) puts "first"; i = i + 1; }} '
+        f'puts line; }}'
+    )
+
+
+def goto_marks(count: int) -> str:
+    # marks are visited in reversed order, so every goto jumps backward or forward over the whole program
+    statements = [f'goto @M_{name(count - 1)};']
+    for number in range(count):
+        statements.append(f'@M_{name(number)};')
+        statements.append(f'x = {number};')
+        statements.append(f'goto @M_{name(number - 1)};' if number else 'goto @END;')
+    statements.append('@END; puts x;')
+    return '{ ' + ' '.join(statements) + ' }'
+
+
+GENERATORS = {
+    'deep_nesting': deep_nesting,
+    'arithmetic_chain': arithmetic_chain,
+    'many_variables': many_variables,
+    'tight_loop': tight_loop,
+    'string_heavy': string_heavy,
+    'goto_marks': goto_marks,
+}
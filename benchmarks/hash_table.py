@@ -0,0 +1,97 @@
+"""
+Compares HashTable with CompactHashTable (every probing) on inserts, lookups and
+delete/insert churn with 10^3 to 10^6 keys.
+HashTable does O(capacity) work on every insert, so above REFERENCE_LIMIT keys it is filled without
+that scan and only SAMPLE operations of every kind are timed on the full table, then scaled to all keys.
+These rows do not include resizes, so they are lower bounds.
+Run from repository root: python -m benchmarks.hash_table
+"""
+from time import perf_counter
+
+from translator.hash_table import HashTable, CompactHashTable, Pair, Probing
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+
+
+SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+
+REFERENCE_LIMIT = 10 ** 4
+
+SAMPLE = 100
+
+
+def make_tables() -> dict:
+    tables = {'HashTable': lambda: HashTable(MemoryAllocator(MY_OPERATIVE_MEMORY, None))}
+    for probing in Probing:
+        tables[probing.value] = lambda probing=probing: CompactHashTable(
+            MemoryAllocator(MY_OPERATIVE_MEMORY, None), probing=probing
+        )
+    return tables
+
+
+def measure(new_table, keys: list) -> tuple[float, float, float]:
+    table = new_table()
+
+    started = perf_counter()
+    for value, key in enumerate(keys):
+        table.set_pair(key, value)
+    inserted = perf_counter()
+    for key in keys:
+        table.get(key)
+    found = perf_counter()
+    for key in keys[::2]:
+        table.del_pair(key)
+        table.set_pair(key, 0)
+    churned = perf_counter()
+
+    return inserted - started, found - inserted, churned - found
+
+
+def filled(keys: list, capacity: int) -> HashTable:
+    # set_pair without load factor check, capacity is big enough to never need resize
+    table = HashTable(MemoryAllocator(MY_OPERATIVE_MEMORY, None), capacity)
+    for value, key in enumerate(keys):
+        for index, pair in table._probe(key):
+            if pair is None:
+                table._slots[index] = Pair(key, value)
+                table._handles[index] = table.memory.allocate(table._slots[index])
+                break
+    return table
+
+
+def sampled(keys: list, sample: int = SAMPLE) -> tuple[float, float, float]:
+    # 0.6 is default load factor threshold of HashTable, churn may take one more slot per key
+    table = filled(keys[:-sample], int((len(keys) + sample) / 0.6) + 1)
+    sampled_keys = keys[-sample:]
+
+    started = perf_counter()
+    for key in sampled_keys:
+        table.set_pair(key, 0)
+    inserted = perf_counter()
+    for key in sampled_keys:
+        table.get(key)
+    found = perf_counter()
+    for key in sampled_keys[::2]:
+        table.del_pair(key)
+        table.set_pair(key, 0)
+    churned = perf_counter()
+
+    scale = len(keys) / sample
+    return (inserted - started) * scale, (found - inserted) * scale, (churned - found) * scale
+
+
+def main(sizes: tuple[int, ...] = SIZES, reference_limit: int = REFERENCE_LIMIT) -> None:
+    print(f'{"table":<12}{"keys":>10}{"insert, s":>14}{"get, s":>10}{"churn, s":>14}')
+    for size in sizes:
+        keys = [f'key_{number}' for number in range(size)]
+        for name, new_table in make_tables().items():
+            if name == 'HashTable' and size > reference_limit:
+                insert, get, churn = sampled(keys)
+                print(f'{name:<12}{size:>10}{insert:>14.4f}{get:>10.4f}{churn:>14.4f}  '
+                      f'{SAMPLE} operations scaled, no resizes')
+                continue
+            insert, get, churn = measure(new_table, keys)
+            print(f'{name:<12}{size:>10}{insert:>14.4f}{get:>10.4f}{churn:>14.4f}')
+
+
+if __name__ == '__main__':
+    main()
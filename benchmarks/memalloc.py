@@ -0,0 +1,35 @@
+"""
+Compares MemoryAllocator strategies on the pattern VirtualMachine produces:
+stack values pushed and popped in a long loop, while some long-living values stay allocated.
+Run from repository root: python -m benchmarks.memalloc
+"""
+from time import perf_counter
+
+from translator.memalloc import MemoryAllocator, AllocationStrategy, MY_OPERATIVE_MEMORY
+
+
+ROUNDS = (1000, 5000, 20000)
+
+
+def measure(strategy: AllocationStrategy, rounds: int) -> float:
+    memory = MemoryAllocator(MY_OPERATIVE_MEMORY, None, strategy=strategy)
+    started = perf_counter()
+    for number in range(rounds):
+        value, text = number * 3, f'value {number}'
+        value_handle = memory.allocate(value)
+        memory.free(memory.allocate(text))
+        memory.free(value_handle)
+        if number % 10 == 0:
+            memory.allocate(number)
+    return perf_counter() - started
+
+
+def main(rounds: tuple[int, ...] = ROUNDS) -> None:
+    print(f'{"strategy":<16}{"rounds":>8}{"time, s":>10}')
+    for count in rounds:
+        for strategy in AllocationStrategy:
+            print(f'{strategy.value:<16}{count:>8}{measure(strategy, count):>10.4f}')
+
+
+if __name__ == '__main__':
+    main()
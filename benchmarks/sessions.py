@@ -0,0 +1,131 @@
+"""
+Many concurrent sessions in one event loop (VirtualMachine.run_async): every session plays tic-tac-toe
+of prog.txt, its moves come through QueueInput one by one, as from network, busy program runs beside
+them. Then ticker task measures the longest time busy program holds event loop, with budget and
+without it.
+Outputs of every session are compared with VirtualMachine.run, programs of benchmarks.transpiler
+are compared too, exit code is 1 on any difference.
+Run from repository root: python -m benchmarks.sessions [--sessions 1000] [--budget 1000]
+"""
+import asyncio
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from itertools import product
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.transpiler import MODES, PROGRAMS, compiled, interpreted, outcome
+from program_exec import compile_program, run_session
+from translator.channels import MemoryOutput, NullOutput, QueueInput, ScriptedInput
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.program import Program
+from translator.virtual_machine import INSTRUCTION_BUDGET, VirtualMachine
+
+
+PROGRAM_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prog.txt')
+
+# the first player takes the top row
+MOVES = ('1', '4', '2', '5', '3')
+
+BUSY = '{ i = 0; while (i < 300000;) { i = i + 1; } puts i; }'
+
+
+def game() -> Program:
+    with open(PROGRAM_FILE, 'r') as file:
+        source = file.read()
+    # prog.txt starts with demonstration of errors, game begins with the board
+    return compile_program('{' + source[source.index('ff = '):], 'tic-tac-toe', optimization_level=2)
+
+
+async def player(input_channel: QueueInput) -> None:
+    for move in MOVES:
+        await asyncio.sleep(0)
+        input_channel.put(move)
+
+
+async def ticker(stop: asyncio.Event, gaps: list[float]) -> None:
+    while not stop.is_set():
+        started = perf_counter()
+        await asyncio.sleep(0)
+        gaps.append(perf_counter() - started)
+
+
+async def serve(program: Program, sessions: int, budget: int) -> list:
+    outputs = [MemoryOutput() for _ in range(sessions)]
+    inputs = [QueueInput() for _ in range(sessions)]
+    busy = asyncio.create_task(run_session(compile_program(BUSY), ScriptedInput(()), NullOutput(), budget=budget))
+    results = await asyncio.gather(
+        *(run_session(program, input_channel, output, budget=budget) for input_channel, output in zip(inputs, outputs)),
+        *(player(input_channel) for input_channel in inputs),
+    )
+    await busy
+    return results[:sessions]
+
+
+async def longest_wait(budget: int) -> float:
+    stop, gaps = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, gaps))
+    # ticker starts waiting first
+    await asyncio.sleep(0)
+    await run_session(compile_program(BUSY), ScriptedInput(()), NullOutput(), budget=budget)
+    stop.set()
+    await tick
+    return max(gaps)
+
+
+def check(programs: dict[str, tuple[str, tuple]]) -> list[str]:
+    mismatches = []
+    for (name, (source, inputs)), mode in product(programs.items(), MODES):
+        program = compiled(source, mode)
+        expected = outcome(interpreted(program), inputs)
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None,
+                            input_channel=ScriptedInput(inputs), output_channel=MemoryOutput())
+        execution = asyncio.run(vm.run_async(program))
+        # run keeps FINISH message, run_async drops it as execute does
+        actual = expected._replace(outputs=[str(value) for value in execution.outputs], exit_code=execution.exit_code,
+                                   error=execution.error)
+        if expected.exit_code == 0 and expected.outputs:
+            expected = expected._replace(outputs=expected.outputs[:-1])
+        if expected != actual:
+            mismatches.append(f'{name} {mode}:\n  run       {expected}\n  run_async {actual}\n')
+    return mismatches
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    arguments = ArgumentParser(description='Runs many sessions of prog.txt in one event loop')
+    arguments.add_argument('--sessions', type=int, default=1000)
+    arguments.add_argument('--budget', type=int, default=INSTRUCTION_BUDGET, help='instructions between yields')
+    options = arguments.parse_args(argv)
+
+    program = game()
+    vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None)
+    expected = vm.execute(program, inputs=MOVES)
+    mismatches = check(PROGRAMS)
+
+    started = perf_counter()
+    results = asyncio.run(serve(program, options.sessions, options.budget))
+    seconds = perf_counter() - started
+    mismatches.extend(
+        f'session {number}: {result.exit_code} {result.error}\n'
+        for number, result in enumerate(results) if result != expected
+    )
+
+    # memory is measured in separate run, tracemalloc slows everything down
+    tracemalloc.start()
+    asyncio.run(serve(program, min(options.sessions, 100), options.budget))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f'{options.sessions} sessions in {seconds:.3f} s, budget {options.budget}, '
+          f'peak memory {peak / min(options.sessions, 100) / 1024:.0f} KiB per session')
+    print(f'busy program holds event loop {asyncio.run(longest_wait(options.budget)) * 1000:.2f} ms, '
+          f'without budget {asyncio.run(longest_wait(sys.maxsize)) * 1000:.2f} ms')
+    print(f'{len(mismatches)} mismatches')
+    print(''.join(mismatches), end='')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
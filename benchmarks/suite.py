@@ -0,0 +1,268 @@
+"""
+Throughput of every stage of translator on synthetic programs from benchmarks.generators:
+tokens/s of Lexer and BufferedLexer, nodes/s of Parser, instructions/s of Compiler, executed
+instructions/s of VirtualMachine and operations/s of MemoryAllocator (replay of allocations made
+by VirtualMachine), plus peak Python memory of every stage. Time of stage is median of several runs.
+Results are compared with stored baseline, any stage slower than baseline by more than tolerance
+or taking more peak memory than memory tolerance allows is reported as regression and makes
+exit code 1. Baseline depends on machine, update it after intended changes or on new machine.
+Run from repository root: python -m benchmarks.suite [--update-baseline] [--tolerance 0.3] [--memory-tolerance 0.2]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from io import StringIO
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable
+
+from benchmarks.generators import GENERATORS
+from translator.channels import NullOutput, ScriptedInput
+from translator.compiler import Compiler
+from translator.fast_dispatch import STOP, predecode
+from translator.lexer import BufferedLexer, Lexer
+from translator.linker import decode
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.parser import Parser
+from translator.token_stream import TokenBuffer
+from translator.virtual_machine import VirtualMachine
+
+
+SIZES = {
+    'deep_nesting': 300,
+    'arithmetic_chain': 5000,
+    'many_variables': 3000,
+    'tight_loop': 20000,
+    'string_heavy': 5000,
+    'goto_marks': 2000,
+}
+
+STAGES = {
+    'lexer': 'tokens',
+    'buffered_lexer': 'tokens',
+    'parser': 'nodes',
+    'compiler': 'instructions',
+    'virtual_machine': 'instructions',
+    'memory_allocator': 'operations',
+}
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+REPEATS = 7
+
+# stages faster than this are run several times in a row, so timer noise does not look like regression
+MIN_TIME = 0.1
+
+TOLERANCE = 0.3
+
+# iterations of plain Python loop, whose speed is speed of machine
+CALIBRATION_LOOPS = 100000
+
+# peak memory does not depend on timer, small growth is allowed for allocations of interpreter itself
+MEMORY_TOLERANCE = 0.2
+
+
+class RecordingAllocator(MemoryAllocator):
+    """
+    Remembers every allocation and free, so they can be replayed on clean MemoryAllocator
+    """
+
+    __slots__ = 'trace'
+
+    def __init__(self, memory_size: int):
+        super().__init__(memory_size, None)
+        self.trace: list[tuple[str, Any, int]] = []
+
+    def allocate(self, any_object: Any) -> int:
+        handle = super().allocate(any_object)
+        self.trace.append(('allocate', any_object, handle))
+        return handle
+
+    def allocate_many(self, objects) -> int:
+        objects = list(objects)
+        handle = super().allocate_many(objects)
+        self.trace.append(('allocate_many', objects, handle))
+        return handle
+
+    def free(self, handle: int) -> None:
+        super().free(handle)
+        self.trace.append(('free', None, handle))
+
+
+def new_vm(memory: MemoryAllocator) -> VirtualMachine:
+    return VirtualMachine(memory, None, input_channel=ScriptedInput([]), output_channel=NullOutput())
+
+
+def count_executed(program: list) -> int:
+    vm = new_vm(MemoryAllocator(MY_OPERATIVE_MEMORY, None))
+    code = predecode(vm, program)
+    executed = 0
+    address = 0
+    while address != STOP:
+        address = code[address]()
+        executed += 1
+    return executed
+
+
+def replay(trace: list[tuple[str, Any, int]]) -> None:
+    memory = MemoryAllocator(MY_OPERATIVE_MEMORY, None)
+    handles = {}
+    for operation, argument, handle in trace:
+        if operation == 'allocate':
+            handles[handle] = memory.allocate(argument)
+        elif operation == 'allocate_many':
+            handles[handle] = memory.allocate_many(argument)
+        else:
+            memory.free(handles.pop(handle))
+
+
+def stages(source: str) -> dict[str, tuple[Callable[[], Any], int]]:
+    """
+    Stage name -> (function running only this stage, number of processed units)
+    """
+    tokens = TokenBuffer.tokenize(BufferedLexer(StringIO(source), None))
+    tree = Parser(tokens, None).parse_flat()
+    program = Compiler(None).compile_flat(tree)
+    max_stack_depth = Compiler.max_stack_depth(program)
+    recorder = RecordingAllocator(MY_OPERATIVE_MEMORY)
+    new_vm(recorder).run_fast(program, max_stack_depth)
+
+    return {
+        'lexer': (lambda: TokenBuffer.tokenize(Lexer(StringIO(source), None)), len(tokens)),
+        'buffered_lexer': (lambda: TokenBuffer.tokenize(BufferedLexer(StringIO(source), None)), len(tokens)),
+        'parser': (lambda: Parser(tokens, None).parse_flat(), len(tree)),
+        'compiler': (lambda: Compiler(None).compile_flat(tree), len(decode(program))),
+        'virtual_machine': (
+            lambda: new_vm(MemoryAllocator(MY_OPERATIVE_MEMORY, None)).run_fast(program, max_stack_depth),
+            count_executed(program),
+        ),
+        'memory_allocator': (lambda: replay(recorder.trace), len(recorder.trace)),
+    }
+
+
+def timed(function: Callable[[], Any], number: int = 1) -> float:
+    # garbage collector is off as in timeit, its pauses depend on everything allocated before
+    gc.disable()
+    try:
+        started = perf_counter()
+        for _ in range(number):
+            function()
+        return (perf_counter() - started) / number
+    finally:
+        gc.enable()
+
+
+def calibration_loop() -> int:
+    total = 0
+    for number in range(CALIBRATION_LOOPS):
+        total += number * 2
+    return total
+
+
+def calibrate() -> float:
+    """
+    Speed of plain Python loop on this machine right now. Results are compared with baseline
+    relative to it, so slower or busier machine does not look like regression
+    """
+    return CALIBRATION_LOOPS / min(timed(calibration_loop, 10) for _ in range(REPEATS))
+
+
+def measure(function: Callable[[], Any]) -> tuple[float, float, int]:
+    """
+    Median time of several runs, speed of machine measured between them and peak of Python memory
+    in separate run, as tracing slows code down
+    """
+    number = max(1, int(MIN_TIME / max(timed(function), 1e-9)))
+    times, speeds = [], []
+    for _ in range(REPEATS):
+        times.append(timed(function, number))
+        speeds.append(CALIBRATION_LOOPS / timed(calibration_loop))
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return median(times), median(speeds), peak
+
+
+def run_suite(sizes: dict[str, int]) -> dict[str, Any]:
+    results = {'calibration': calibrate()}
+    for program_name, size in sizes.items():
+        results[program_name] = {}
+        for stage, (function, units) in stages(GENERATORS[program_name](size)).items():
+            seconds, speed, peak = measure(function)
+            results[program_name][stage] = {
+                'units': units, 'seconds': seconds, 'per_second': units / seconds, 'peak_bytes': peak,
+                'calibration': speed,
+            }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float = MEMORY_TOLERANCE) -> list[str]:
+    regressions = []
+    print(
+        f'{"program":<18}{"stage":<18}{"units":>10}{"units/s":>14}{"peak, KiB":>11}{"baseline":>14}{"change":>9}'
+        f'{"baseline, KiB":>15}{"change":>9}'
+    )
+    for program_name, program_results in results.items():
+        if program_name == 'calibration':
+            continue
+        for stage, result in program_results.items():
+            line = (
+                f'{program_name:<18}{stage:<18}{result["units"]:>10}'
+                f'{result["per_second"]:>14.0f}{result["peak_bytes"] / 1024:>11.1f}'
+            )
+            expected = baseline.get(program_name, {}).get(stage)
+            if expected is not None:
+                # ratio of machine speed now and when baseline was stored, both taken next to the stage
+                speed = result['calibration'] / expected.get('calibration', result['calibration'])
+                change = result['per_second'] / (expected['per_second'] * speed) - 1
+                memory_change = result['peak_bytes'] / max(expected['peak_bytes'], 1) - 1
+                line += (
+                    f'{expected["per_second"]:>14.0f}{change:>+9.0%}'
+                    f'{expected["peak_bytes"] / 1024:>15.1f}{memory_change:>+9.0%}'
+                )
+                if change < -tolerance:
+                    line += '  REGRESSION'
+                    regressions.append(f'{program_name}/{stage}: {STAGES[stage]}/s dropped by {-change:.0%}')
+                if memory_change > memory_tolerance:
+                    line += '  MEMORY REGRESSION'
+                    regressions.append(f'{program_name}/{stage}: peak memory grew by {memory_change:.0%}')
+            print(line)
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    arguments = ArgumentParser(description='Stage-by-stage benchmarks of translator')
+    arguments.add_argument('--update-baseline', action='store_true', help='store results as new baseline')
+    arguments.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown, 0.3 is 30%%')
+    arguments.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE,
+                           help='allowed growth of peak memory, 0.2 is 20%%')
+    arguments.add_argument('--baseline', default=BASELINE_FILE, help='file with baseline results')
+    options = arguments.parse_args(argv)
+
+    results = run_suite(SIZES)
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline, 'r') as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, options.tolerance, options.memory_tolerance)
+    print(f'calibration: {results["calibration"]:.0f} loops/s, baseline {baseline.get("calibration", 0):.0f}')
+
+    if options.update_baseline:
+        with open(options.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f'baseline stored to {options.baseline}')
+        return 0
+    if regressions:
+        print(f'\n{len(regressions)} REGRESSIONS against baseline:', *regressions, sep='\n  ')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Tiered execution (translator.tiering): programs are run by VirtualMachine.run (reference) and by
+VirtualMachine.run_fast with HotLoopCompiler, printed values, exit codes and errors must be the same.
+Low threshold compiles every loop, including loops whose guards fail and which go back to interpreter.
+Then loops from benchmarks.generators are timed without tiering and with it.
+Exit code is 1 when any program differs.
+Run from repository root: python -m benchmarks.tiering
+"""
+import sys
+from itertools import product
+from time import perf_counter
+from typing import Callable
+
+from benchmarks.generators import GENERATORS
+from benchmarks.transpiler import MODES, PROGRAMS, compiled, interpreted, outcome
+from translator.channels import MemoryOutput, ScriptedInput
+from translator.compiler import Compiler
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.tiering import HotLoopCompiler, THRESHOLD
+from translator.virtual_machine import VirtualMachine
+
+
+LOOPS = {
+    # t is defined in the third pass, guard fails before it
+    'late_variable': ('{ i = 0; @LOOP; i = i + 1; if (i ^ 3;) { t = 5; } if (i < 6;) goto @LOOP; puts t; }', ()),
+    # u is never defined, guard always fails and loop is dropped
+    'dropped': ('{ i = 0; @LOOP; i = i + 1; if (i ^ 100;) puts u; if (i < 30;) goto @LOOP; puts i; }', ()),
+    'error_in_loop': ('{ i = 5; s = 0; while (1;) { s = s + 10 / i; puts s; i = i - 1; } }', ()),
+    'raise_in_loop': ('{ i = 0; while (i < 10;) { i = i + 1; if (i ^ 7;) raise i; } }', ()),
+    'finish_in_loop': ('{ i = 0; @LOOP; i = i + 1; puts i; if (i < 5;) goto @LOOP; }', ()),
+    'nested_loops': ('{ i = 0; n = 0; while (i < 6;) { j = 0; while (j < i;) { j = j + 1; n = n + j; } '
+                     'i = i + 1; } puts n; puts j; }', ()),
+    'input_in_loop': ('{ i = 0; s = ">"; while (i < 3;) { s = s + gets; i = i + 1; } puts s; }', ('a', 'b', 'c')),
+    'strings_in_loop': ('{ i = 0; s = "x"; while (i < 4;) { s = s + s; i = i + 1; } puts s; t = s + "y"; puts t; }',
+                        ()),
+}
+
+# expressions are evaluated from left to right, so values of tight_loop grow into long integers
+TIMED = {
+    'counting_loop': '{ i = 0; s = 0; while (i < 100000;) { s = s + 3; i = i + 1; } puts s; }',
+    'tight_loop': GENERATORS['tight_loop'](20000),
+    'string_heavy': GENERATORS['string_heavy'](20000),
+}
+
+
+def tiered(program: list, tiering: HotLoopCompiler) -> Callable[[ScriptedInput, MemoryOutput], None]:
+    def run(input_channel, output_channel):
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None,
+                            input_channel=input_channel, output_channel=output_channel, tiering=tiering)
+        vm.run_fast(program, Compiler.max_stack_depth(program))
+    return run
+
+
+def check(programs: dict[str, tuple[str, tuple]], tiering: HotLoopCompiler) -> list[str]:
+    mismatches = []
+    for (name, (source, inputs)), mode in product(programs.items(), MODES):
+        program = compiled(source, mode)
+        expected, actual = outcome(interpreted(program), inputs), outcome(tiered(program, tiering), inputs)
+        if expected != actual:
+            mismatches.append(f'{name} {mode}:\n  interpreter {expected}\n  tiered      {actual}\n')
+    return mismatches
+
+
+def timings(sources: dict[str, str]) -> list[str]:
+    rows = []
+    for name, source in sources.items():
+        program = compiled(source, (2, True, True))
+        seconds = []
+        for tiering in (None, HotLoopCompiler()):
+            started = perf_counter()
+            outcome(tiered(program, tiering), ())
+            seconds.append(perf_counter() - started)
+        rows.append(
+            f'{name:<14} run_fast {seconds[0]:8.4f} s, tiered {seconds[1]:8.4f} s '
+            f'({seconds[0] / seconds[1] if seconds[1] else 0:5.1f}x), threshold {THRESHOLD}\n'
+        )
+    return rows
+
+
+def main() -> int:
+    tiering = HotLoopCompiler(threshold=1)
+    mismatches = check({**PROGRAMS, **LOOPS}, tiering)
+    print(f'{len(PROGRAMS) + len(LOOPS)} programs in {len(MODES)} modes, {len(mismatches)} mismatches')
+    print(tiering.report().splitlines()[0])
+    print(''.join(mismatches + timings(TIMED)), end='')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Differential check of translator.transpiler: every program is run by VirtualMachine.run (reference) and
+as transpiled Python module, with every combination of optimizations, printed values, exit codes and
+error messages must be the same. Time of both runs is printed for programs from benchmarks.generators.
+Exit code is 1 when any program differs.
+Run from repository root: python -m benchmarks.transpiler
+"""
+import sys
+from io import StringIO
+from itertools import product
+from time import perf_counter
+from typing import Callable, NamedTuple, Optional
+
+from benchmarks.generators import GENERATORS
+from program_exec import translate
+from translator.channels import MemoryOutput, ScriptedInput
+from translator.commands import Commands
+from translator.compiler import Compiler
+from translator.logger import LoggingConfig
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.sys_exceptions import ProgramExit, errors_not_printed
+from translator.transpiler import Transpiler, execute, load
+from translator.virtual_machine import VirtualMachine
+
+
+SIZES = {
+    'deep_nesting': 100,
+    'arithmetic_chain': 500,
+    'many_variables': 300,
+    'tight_loop': 2000,
+    'string_heavy': 500,
+    'goto_marks': 200,
+}
+
+# name: (source, input lines)
+PROGRAMS = {
+    'division': ('{ puts 7 / 2; puts 6 / 3; puts 1 / 3 * 3; a = 5; b = 2; puts a / b; puts a / b * b; }', ()),
+    'division_by_zero': ('{ a = 0; puts 1; puts 2 / a; puts 3; }', ()),
+    'raise': ('{ puts "before"; raise "oops"; puts "after"; }', ()),
+    'raise_number': ('{ a = 2; a = a * 21; raise a; }', ()),
+    'goto': ('{ i = 0; @START; i = i + 1; if (i < 3;) { goto @START; } puts i; goto @A; puts "no"; @B; '
+             'puts "b"; goto @C; @A; puts "a"; goto @B; @C; puts "c"; }', ()),
+    'failed_goto': ('{ puts 1; goto @NOWHERE; puts 2; }', ()),
+    'undefined_variable': ('{ a = 1; puts a; puts b; }', ()),
+    'system_function_pair': ('{ a = 1; puts a + gets; }', ('2',)),
+    'conditions': ('{ a = 1; b = 2; if (a < b;) puts "lt"; if (a ~ b;) puts "ne"; if (a ^ b;) puts "eq"; '
+                   'else puts "not eq"; while (0;) puts "never"; j = 0; while (j < 5;) { j = j + 1; '
+                   'if (j ^ 3;) puts "three"; } puts j; k = 1 ~ 2; puts k; puts a < b; }', ()),
+    'strings': ('{ s = "ab"; puts s * 3; puts 2 * s; t = s + "cd"; puts t + t; if (t ^ "abcd";) puts "same"; }', ()),
+    'input': ('{ a = gets; b = gets; puts a + b; puts a * b; c = gets; puts c + "!"; }', ('3', '4.5', 'word')),
+    'input_ended': ('{ a = gets; puts a; b = gets; puts b; }', ('1',)),
+    'type_error': ('{ a = "x"; puts a - 1; }', ()),
+    # expression statements leave values on stack, so stack depth is not static in loop
+    'dynamic_stack': ('{ i = 0; @LOOP; i; i = i + 1; if (i < 4;) goto @LOOP; puts i; puts 10 / 4; }', ()),
+    'dynamic_stack_errors': ('{ i = 0; @LOOP; i * 2; i = i + 1; if (i < 4;) goto @LOOP; j = i - 4; puts 1 / j; }', ()),
+    'nested': ('{ a = 1; b = 2; puts a + b * a - b / a * b + a * a * b - b / b / a; '
+               'c = a * b * a * b * a; puts c; }', ()),
+}
+
+# parser does not let system functions be used as values, so bytecode is written by hand
+BYTECODE = {
+    'system_function': [Commands.PUSH, 1, Commands.OUTPUT, Commands.FETCH, 'puts', Commands.OUTPUT, Commands.FINISH],
+    'system_function_pair': [Commands.FETCH2, 'a', 'gets', Commands.ADD, Commands.OUTPUT, Commands.FINISH],
+}
+
+# optimization_level, superinstructions, resolve_slots
+MODES = list(product((0, 1, 2), (False, True), (False, True)))
+
+
+class Outcome(NamedTuple):
+    outputs: list
+    exit_code: int
+    error: Optional[str]
+
+
+def outcome(run: Callable[[ScriptedInput, MemoryOutput], None], inputs) -> Outcome:
+    output = MemoryOutput()
+    exit_code, error = 0, None
+    with errors_not_printed():
+        try:
+            run(ScriptedInput(inputs), output)
+        except ProgramExit as stop:
+            exit_code, error = stop.exception.exit_code, stop.exception.message
+        except (TypeError, ValueError, ArithmeticError) as failure:
+            exit_code, error = 1, f'{type(failure).__name__}: {failure}'
+    # values are compared as printed
+    return Outcome([str(value) for value in output.lines], exit_code, error)
+
+
+def interpreted(program: list) -> Callable[[ScriptedInput, MemoryOutput], None]:
+    def run(input_channel, output_channel):
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None,
+                            input_channel=input_channel, output_channel=output_channel)
+        vm.run(program)
+    return run
+
+
+def transpiled(program: list) -> Callable[[ScriptedInput, MemoryOutput], None]:
+    transpiled_run = load(Transpiler().transpile(program))
+    return lambda input_channel, output_channel: execute(transpiled_run, input_channel, output_channel)
+
+
+def compiled(source: str, mode: tuple[int, bool, bool]) -> list:
+    optimization_level, superinstructions, resolve_slots = mode
+    return translate(source, LoggingConfig({}, {}), optimization_level=optimization_level,
+                     superinstructions=superinstructions, resolve_slots=resolve_slots)
+
+
+def check(programs: dict[str, tuple[str, tuple]]) -> list[str]:
+    mismatches = []
+    for (name, (source, inputs)), mode in product(programs.items(), MODES):
+        program = compiled(source, mode)
+        expected, actual = outcome(interpreted(program), inputs), outcome(transpiled(program), inputs)
+        if expected != actual:
+            mismatches.append(f'{name} {mode}:\n  interpreter {expected}\n  transpiled  {actual}\n')
+    for name, program in BYTECODE.items():
+        expected, actual = outcome(interpreted(program), ()), outcome(transpiled(program), ())
+        if expected != actual:
+            mismatches.append(f'{name}:\n  interpreter {expected}\n  transpiled  {actual}\n')
+    return mismatches
+
+
+def timings(sizes: dict[str, int]) -> list[str]:
+    rows = []
+    for name, size in sizes.items():
+        program = compiled(GENERATORS[name](size), (2, True, True))
+        run_transpiled = transpiled(program)
+        started = perf_counter()
+        outcome(interpreted(program), ())
+        interpreter_time = perf_counter() - started
+        started = perf_counter()
+        outcome(run_transpiled, ())
+        transpiled_time = perf_counter() - started
+        mode = 'static' if Compiler.stack_depths(program) is not None else 'dynamic'
+        rows.append(
+            f'{name:<18} interpreter {interpreter_time:8.4f} s, transpiled {transpiled_time:8.4f} s '
+            f'({interpreter_time / transpiled_time if transpiled_time else 0:5.1f}x), stack {mode}\n'
+        )
+    return rows
+
+
+def main() -> int:
+    generated = {name: (GENERATORS[name](size), ()) for name, size in SIZES.items()}
+    mismatches = check({**PROGRAMS, **generated})
+    report = StringIO()
+    report.write(
+        f'{len(PROGRAMS) + len(generated)} programs in {len(MODES)} modes and {len(BYTECODE)} bytecode programs, '
+        f'{len(mismatches)} mismatches\n'
+    )
+    report.writelines(mismatches)
+    report.writelines(timings(SIZES))
+    print(report.getvalue(), end='')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,34 +1,176 @@
-from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
-from translator.lexer import Lexer
+from io import StringIO
+from typing import Optional, Union
+
+from translator.bytecode import BytecodeCache
+from translator.channels import AsyncInputChannel, InputChannel, OutputChannel
+from translator.memalloc import MemoryAllocator, AllocationStrategy, MY_OPERATIVE_MEMORY
+from translator.optimizer import Optimizer
+from translator.lexer import Lexer, BufferedLexer
+from translator.logger import LoggingConfig, LogLevel
 from translator.parser import Parser
+from translator.profiler import Profiler
+from translator.program import Program
 from translator.compiler import Compiler
-from translator.virtual_machine import VirtualMachine
+from translator.tiering import HotLoopCompiler
+from translator.transpiler import Transpiler, dump
+from translator.virtual_machine import INSTRUCTION_BUDGET, Execution, VirtualMachine
+
+
+LOG_FILES = {
+    'memory_allocator': 'memory_allocator_logs.txt',
+    'lexer': 'lexer_logs.txt',
+    'parser': 'parser_logs.txt',
+    'compiler': 'compile_logs.txt',
+    'virtual_machine': 'virtual_machine_logs.txt',
+}
+
+DEBUG_LOG_LEVELS = {component: LogLevel.TRACE for component in LOG_FILES}
+
+PRODUCTION_LOG_LEVELS = {component: LogLevel.OFF for component in LOG_FILES}
+
+PROFILE_FILE = 'profile.txt'
+
+# accounted memory of one of concurrent sessions, its program fails when it needs more
+SESSION_MEMORY = 16 * 1024 * 1024
+
+
+def translate(source: str, logging: LoggingConfig, buffered_lexer: bool = True, pretokenize: bool = True,
+              iterative: bool = True, optimization_level: int = 0, superinstructions: bool = False,
+              resolve_slots: bool = False) -> list:
+    return translate_with_lines(
+        source, logging, buffered_lexer, pretokenize, iterative, optimization_level, superinstructions, resolve_slots,
+    )[0]
+
+
+def translate_with_lines(source: str, logging: LoggingConfig, buffered_lexer: bool = True, pretokenize: bool = True,
+                         iterative: bool = True, optimization_level: int = 0, superinstructions: bool = False,
+                         resolve_slots: bool = False) -> tuple[list, list[int]]:
+    """
+    Program and source line of its every address. Parser writes FlatTree, without iterative it makes
+    Node tree, which Compiler flattens, so both ways give the same program for any nesting depth
+    """
+    lexer_class = BufferedLexer if buffered_lexer else Lexer
+    lexer = lexer_class(StringIO(source), log_to=logging.logger('lexer'))
+    parser = Parser(lexer, log_to=logging.logger('parser'), pretokenize=pretokenize)
+    compiler = Compiler(log_to=logging.logger('compiler'))
+
+    if iterative:
+        program = compiler.compile_flat(parser.parse_flat())
+    else:
+        program = compiler.compile(parser.parse())
+
+    lines = compiler.lines
+    if optimization_level:
+        optimizer = Optimizer(optimization_level, log_to=logging.logger('compiler'))
+        program = optimizer.optimize(program, lines)
+        lines = optimizer.lines
+    if superinstructions:
+        program = compiler.select_superinstructions(program, lines)
+        lines = compiler.lines
+    if resolve_slots:
+        program = compiler.resolve_slots(program)
+    return program, lines
+
+
+def compile_program(source: str, name: str = '<program>', optimization_level: int = 0,
+                    superinstructions: bool = False, resolve_slots: bool = True) -> Program:
+    """
+    Compiled once, Program is run by VirtualMachine.execute as many times as needed, for example
+    vm.execute(program, inputs=['1', '2']).outputs
+    """
+    bytecode, lines = translate_with_lines(
+        source, LoggingConfig({}, {}), iterative=True, optimization_level=optimization_level,
+        superinstructions=superinstructions, resolve_slots=resolve_slots,
+    )
+    return Program(bytecode, lines, name)
+
+
+async def run_session(program: Program, input_channel: Union[InputChannel, AsyncInputChannel],
+                      output_channel: OutputChannel, memory_size: int = SESSION_MEMORY,
+                      budget: int = INSTRUCTION_BUDGET) -> Execution:
+    """
+    One of many programs run concurrently in one event loop, for example many games of prog.txt,
+    each with own QueueInput: asyncio.gather(*(run_session(program, QueueInput(), output) for ...)).
+    Every session has own VirtualMachine and memory_size bytes of memory
+    """
+    if budget < 1:
+        raise ValueError(f'budget must be a positive number, got {budget}')
+    vm = VirtualMachine(MemoryAllocator(memory_size, log_to=None), log_to=None,
+                        input_channel=input_channel, output_channel=output_channel)
+    return await vm.run_async(program, budget=budget)
+
 
+def transpile(program_file_name: str, module_file_name: str, optimization_level: int = 0,
+              superinstructions: bool = False) -> None:
+    """
+    Writes program as Python module, run it with translator.transpiler.load and execute
+    """
+    with open(program_file_name, 'r') as read_from:
+        source = read_from.read()
+    program = translate(source, LoggingConfig({}, {}), iterative=True, optimization_level=optimization_level,
+                        superinstructions=superinstructions, resolve_slots=True)
+    dump(Transpiler().transpile(program, program_file_name), module_file_name)
 
-def main(program_file_name: str, logs_folder: str = 'logs/'):
-    log_files = {
-        'memory_allocator': open(f'{logs_folder}memory_allocator_logs.txt', 'w'),
-        'lexer': open(f'{logs_folder}lexer_logs.txt', 'w'),
-        'parser': open(f'{logs_folder}parser_logs.txt', 'w'),
-        'compiler': open(f'{logs_folder}compile_logs.txt', 'w'),
-        'virtual_machine': open(f'{logs_folder}virtual_machine_logs.txt', 'w'),
-    }
 
-    read_from = open(program_file_name, 'r')
+def main(program_file_name: str, logs_folder: str = 'logs/', buffered_lexer: bool = True,
+         pretokenize: bool = True, log_levels: Optional[dict[str, LogLevel]] = None, iterative: bool = True,
+         cache_folder: Optional[str] = '.bytecode_cache/', optimization_level: int = 0,
+         superinstructions: bool = False, fast_dispatch: bool = True, resolve_slots: bool = False,
+         allocation_strategy: AllocationStrategy = AllocationStrategy.SEGREGATED_FIT, verify_stack: bool = True,
+         input_channel: Optional[InputChannel] = None, output_channel: Optional[OutputChannel] = None,
+         profile: bool = False, tier_up_threshold: Optional[int] = None):
+    """
+    With profile report of hottest opcodes, lines and loops is written to logs folder (needs fast_dispatch).
+    With tier_up_threshold loops, which jump back more times, are compiled to Python (needs fast_dispatch),
+    statistics of tier-ups are logged by virtual_machine. Trace of virtual_machine shows instructions,
+    which stay in interpreter, compiled loop is traced as one step
+    """
+    log_levels = DEBUG_LOG_LEVELS if log_levels is None else log_levels
+    logging = LoggingConfig(
+        {component: f'{logs_folder}{file_name}' for component, file_name in LOG_FILES.items()}, log_levels,
+    )
 
-    memory_allocator = MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=log_files['memory_allocator'])
-    lexer = Lexer(read_from, log_to=log_files['lexer'])
-    parser = Parser(lexer, log_to=log_files['parser'])
-    compiler = Compiler(log_to=log_files['compiler'])
-    vm = VirtualMachine(memory_allocator, log_to=log_files['virtual_machine'])
+    with open(program_file_name, 'r') as read_from:
+        source = read_from.read()
+    # cached bytecode has no source lines, so profiled program is always translated
+    cache = BytecodeCache(cache_folder) if cache_folder and not profile else None
+    profiler = Profiler() if profile else None
+    tiering = None if tier_up_threshold is None else HotLoopCompiler(
+        tier_up_threshold, log_to=logging.logger('virtual_machine')
+    )
 
-    parsed_program = parser.parse()
-    compiled_program = compiler.compile(parsed_program)
+    try:
+        memory_allocator = MemoryAllocator(
+            MY_OPERATIVE_MEMORY, log_to=logging.logger('memory_allocator'), strategy=allocation_strategy
+        )
+        vm = VirtualMachine(memory_allocator, log_to=logging.logger('virtual_machine'),
+                            input_channel=input_channel, output_channel=output_channel, profiler=profiler,
+                            tiering=tiering)
 
-    vm.run(compiled_program)
+        cache_options = f'O{optimization_level}{"S" if superinstructions else ""}{"V" if resolve_slots else ""}'
+        compiled_program = cache.load(source, cache_options) if cache else None
+        if compiled_program is None:
+            compiled_program, lines = translate_with_lines(
+                source, logging, buffered_lexer, pretokenize, iterative, optimization_level, superinstructions,
+                resolve_slots,
+            )
+            if profiler is not None:
+                profiler.lines = lines
+            if cache:
+                cache.store(source, compiled_program, cache_options)
 
-    for file in log_files.values():
-        file.close()
+        max_stack_depth = Compiler.max_stack_depth(compiled_program) if verify_stack else None
+        if fast_dispatch:
+            vm.run_fast(compiled_program, max_stack_depth)
+        else:
+            vm.run(compiled_program, max_stack_depth)
+    finally:
+        if tiering is not None:
+            tiering.logger.log(LogLevel.INFO, tiering.report())
+        logging.close()
+        if profiler is not None and profiler.program:
+            with open(f'{logs_folder}{PROFILE_FILE}', 'w') as report:
+                report.write(profiler.report())
 
 
 if __name__ == '__main__':
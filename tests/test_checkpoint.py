@@ -0,0 +1,43 @@
+"""
+Programs suspended every few instructions, encoded, decoded and resumed by new VirtualMachine finish
+as one whole run, with the same free memory. Full check with sizes and timings is
+python -m benchmarks.checkpoint
+"""
+import unittest
+
+from benchmarks.checkpoint import new_vm, restored_memory, sliced
+from benchmarks.transpiler import PROGRAMS, compiled
+from translator import checkpoint
+from translator.program import Program
+
+
+CHECKED = 'division', 'division_by_zero', 'raise', 'goto', 'input', 'dynamic_stack'
+
+MODES = (0, False, False), (2, True, True)
+
+SLICES = 1, 7
+
+
+class CheckpointTest(unittest.TestCase):
+    def test_resumed_program_finishes_as_whole_run(self):
+        for name in CHECKED:
+            source, inputs = PROGRAMS[name]
+            for mode in MODES:
+                program = Program(compiled(source, mode), name=name)
+                expected = new_vm().execute(program, inputs=inputs)
+                for max_steps in SLICES:
+                    with self.subTest(program=name, mode=mode, max_steps=max_steps):
+                        self.assertEqual((expected, []), sliced(program, inputs, max_steps))
+                        if not inputs:
+                            self.assertEqual([], restored_memory(program, max_steps))
+
+    def test_checkpoint_of_other_program_is_refused(self):
+        program = Program(compiled(PROGRAMS['goto'][0], MODES[0]), name='goto')
+        other = Program(compiled(PROGRAMS['division'][0], MODES[0]), name='division')
+        state = checkpoint.decode(checkpoint.encode(new_vm().execute(program, max_steps=3).checkpoint))
+        with self.assertRaises(ValueError):
+            new_vm().resume(state, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+"""
+Programs nested deeper than recursion limit of interpreter are translated and run, FlatTree
+written by Parser and Node tree flattened by Compiler give the same program
+"""
+import sys
+import unittest
+
+from benchmarks.generators import deep_nesting
+from program_exec import compile_program, translate
+from translator.logger import LoggingConfig
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.virtual_machine import VirtualMachine
+
+
+DEPTH = 3 * sys.getrecursionlimit()
+
+
+class DeepNestingTest(unittest.TestCase):
+    def test_flat_tree_and_node_tree_give_the_same_program(self):
+        source = deep_nesting(DEPTH)
+        self.assertEqual(
+            translate(source, LoggingConfig({}, {})), translate(source, LoggingConfig({}, {}), iterative=False),
+        )
+
+    def test_deep_program_runs(self):
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None)
+        execution = vm.execute(compile_program(deep_nesting(DEPTH)))
+        self.assertEqual((execution.outputs, execution.exit_code), (['1'], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Differential test of BufferedLexer: tokens, values, lines and errors are the same as of Lexer,
+read one by one by next_token and at once by TokenBuffer.tokenize
+"""
+import os
+import unittest
+from io import StringIO
+
+from benchmarks.generators import GENERATORS
+from translator.lexer import BufferedLexer, Lexer, Tokens
+from translator.sys_exceptions import ProgramExit, errors_not_printed
+from translator.token_stream import TokenBuffer
+
+
+PROGRAM_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prog.txt')
+
+SOURCES = {
+    'strings': '{ a = "x y"; b = ""; c = "if"; puts a + "\t"; }',
+    'numbers': '{ a = 1.5; b = 10 / 4; c = 007; }',
+    'marks': '{ @LOOP; i = i + 1;\n if (i < 3;)\n goto @LOOP; }',
+    'unexpected_symbol': '{ a = 1;\n b = $; }',
+}
+
+
+def tokens(lexer_class, source: str) -> list:
+    lexer, found = lexer_class(StringIO(source), None), []
+    try:
+        with errors_not_printed():
+            while lexer.translated_token != Tokens.EOF:
+                lexer.next_token()
+                found.append((lexer.translated_token, lexer.value, lexer.current_line_count))
+    except ProgramExit as stop:
+        found.append(stop.exception.message)
+    return found
+
+
+def buffered(source: str) -> list:
+    try:
+        with errors_not_printed():
+            return list(TokenBuffer.tokenize(BufferedLexer(StringIO(source), None)))
+    except ProgramExit as stop:
+        return [stop.exception.message]
+
+
+class BufferedLexerTest(unittest.TestCase):
+    def setUp(self):
+        with open(PROGRAM_FILE, 'r') as file:
+            self.sources = {'prog.txt': file.read(), **SOURCES}
+        self.sources.update((name, generate(50)) for name, generate in GENERATORS.items())
+
+    def test_same_tokens_as_lexer(self):
+        for name, source in self.sources.items():
+            with self.subTest(source=name):
+                self.assertEqual(tokens(Lexer, source), tokens(BufferedLexer, source))
+
+    def test_token_buffer_reads_all_tokens_at_once(self):
+        for name, source in self.sources.items():
+            with self.subTest(source=name):
+                expected = tokens(Lexer, source)
+                if expected and isinstance(expected[-1], str):
+                    # tokens before error are not returned, only the error
+                    expected = expected[-1:]
+                self.assertEqual(expected, buffered(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
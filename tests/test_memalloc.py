@@ -0,0 +1,49 @@
+"""
+Allocation strategies of MemoryAllocator account the same memory: free memory is the same after every
+allocate and free, freed handles give all memory back, too big allocation is refused by both
+"""
+import unittest
+
+from translator.memalloc import AllocationStrategy, MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.sys_exceptions import ProgramExit, errors_not_printed
+
+
+ROUNDS = 2000
+
+
+def free_memory(strategy: AllocationStrategy) -> list[int]:
+    # pattern of VirtualMachine: short-living values of stack and long-living variables
+    memory = MemoryAllocator(MY_OPERATIVE_MEMORY, None, strategy=strategy)
+    history, kept = [], []
+    for number in range(ROUNDS):
+        value_handle = memory.allocate(number * 3)
+        memory.free(memory.allocate(f'value {number}'))
+        history.append(memory.memory_size)
+        memory.free(value_handle)
+        if number % 10 == 0:
+            kept.append(memory.allocate('x' * number))
+        history.append(memory.memory_size)
+    for handle in kept:
+        memory.free(handle)
+    history.append(memory.memory_size)
+    return history
+
+
+class AllocationStrategyTest(unittest.TestCase):
+    def test_strategies_account_the_same_memory(self):
+        expected = free_memory(AllocationStrategy.FIRST_FIT)
+        self.assertEqual(expected, free_memory(AllocationStrategy.SEGREGATED_FIT))
+        self.assertEqual(expected[-1], MY_OPERATIVE_MEMORY)
+
+    def test_run_out_of_memory(self):
+        for strategy in AllocationStrategy:
+            with self.subTest(strategy=strategy):
+                memory = MemoryAllocator(1000, None, strategy=strategy)
+                memory.allocate('x' * 500)
+                with errors_not_printed(), self.assertRaises(ProgramExit) as stop:
+                    memory.allocate('y' * 500)
+                self.assertEqual(stop.exception.exception.message, 'Run out of memory')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Sessions of run_async share one event loop: every session ends as VirtualMachine.execute of the same
+program, with any budget. Full check with timings is python -m benchmarks.sessions
+"""
+import asyncio
+import unittest
+
+from benchmarks.sessions import MOVES, check, game, player
+from benchmarks.transpiler import PROGRAMS
+from program_exec import run_session
+from translator.channels import MemoryOutput, QueueInput, ScriptedInput
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.virtual_machine import VirtualMachine
+
+
+CHECKED = 'division_by_zero', 'raise', 'goto', 'input', 'type_error'
+
+SESSIONS = 20
+
+
+async def sessions(program, budget: int) -> list:
+    inputs = [QueueInput() for _ in range(SESSIONS)]
+    results = await asyncio.gather(
+        *(run_session(program, input_channel, MemoryOutput(), budget=budget) for input_channel in inputs),
+        *(player(input_channel) for input_channel in inputs),
+    )
+    return results[:SESSIONS]
+
+
+class SessionsTest(unittest.TestCase):
+    def test_run_async_as_run(self):
+        self.assertEqual([], check({name: PROGRAMS[name] for name in CHECKED}))
+
+    def test_concurrent_sessions(self):
+        program = game()
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), log_to=None)
+        expected = vm.execute(program, inputs=MOVES)
+        for budget in (1, 7, 1000):
+            with self.subTest(budget=budget):
+                self.assertEqual([expected] * SESSIONS, asyncio.run(sessions(program, budget)))
+
+    def test_budget_must_be_positive(self):
+        for budget in (0, -1):
+            with self.subTest(budget=budget), self.assertRaises(ValueError):
+                asyncio.run(run_session(game(), ScriptedInput(()), MemoryOutput(), budget=budget))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Differential test of translator.tiering: with every loop compiled, programs print the same values and
+finish with the same exit codes and errors as VirtualMachine.run, also when guards of compiled loops
+fail and loops go back to interpreter. Full check with timings is python -m benchmarks.tiering
+"""
+import unittest
+from io import StringIO
+
+from benchmarks.tiering import LOOPS, check
+from benchmarks.transpiler import compiled
+from translator.channels import NullOutput
+from translator.logger import Logger
+from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
+from translator.tiering import HotLoopCompiler, MAX_DEOPTS
+from translator.virtual_machine import VirtualMachine
+
+
+class TieringTest(unittest.TestCase):
+    def test_same_outcome_as_virtual_machine(self):
+        tiering = HotLoopCompiler(threshold=1)
+        self.assertEqual([], check(LOOPS, tiering))
+        self.assertGreater(tiering.stats['tier_ups'], 0)
+
+    def test_loop_with_failing_guard_is_dropped(self):
+        tiering = HotLoopCompiler(threshold=1)
+        self.assertEqual([], check({'dropped': LOOPS['dropped']}, tiering))
+        self.assertGreaterEqual(tiering.stats['deopts'], MAX_DEOPTS)
+        self.assertGreater(tiering.stats['dropped'], 0)
+        self.assertEqual(tiering.stats['entries'], 0)
+
+    def test_trace_shows_runs_of_compiled_loop(self):
+        trace = StringIO()
+        logger = Logger('virtual_machine', trace)
+        tiering = HotLoopCompiler(threshold=1, log_to=logger)
+        vm = VirtualMachine(MemoryAllocator(MY_OPERATIVE_MEMORY, log_to=None), logger,
+                            output_channel=NullOutput(), tiering=tiering)
+        vm.run_fast(compiled('{ i = 0; while (i < 50;) { i = i + 1; } puts i; }', (0, False, False)))
+        self.assertEqual(tiering.stats['entries'], 1)
+        self.assertIn('Compiled loop', trace.getvalue())
+        self.assertIn('executing', trace.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+"""
+Differential test of translator.transpiler: transpiled programs print the same values, finish with
+the same exit codes and error messages as VirtualMachine.run. Full check with timings is
+python -m benchmarks.transpiler
+"""
+import unittest
+
+from benchmarks.transpiler import MODES, PROGRAMS, compiled, interpreted, outcome, transpiled
+
+
+CHECKED = 'division', 'division_by_zero', 'raise', 'goto', 'failed_goto', 'input', 'type_error', 'dynamic_stack'
+
+
+class TranspilerTest(unittest.TestCase):
+    def test_same_outcome_as_virtual_machine(self):
+        for name in CHECKED:
+            source, inputs = PROGRAMS[name]
+            for mode in MODES:
+                with self.subTest(program=name, mode=mode):
+                    program = compiled(source, mode)
+                    self.assertEqual(outcome(interpreted(program), inputs), outcome(transpiled(program), inputs))
+
+
+if __name__ == '__main__':
+    unittest.main()
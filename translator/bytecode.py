@@ -0,0 +1,187 @@
+import os
+import struct
+import sys
+from array import array
+from hashlib import sha256
+from mmap import mmap, ACCESS_READ
+from typing import Any, Optional
+
+from translator import __version__
+from translator.commands import Commands, Operand, Slot, COMMAND_OPERANDS
+
+
+MAGIC = b'TRBC'
+FORMAT_VERSION = 2
+
+# magic, format version, reserved, length of code, number of constants
+HEADER = struct.Struct('<4sHHII')
+
+INT, BIG_INT, FLOAT, STRING, NONE, SLOT = b'i', b'I', b'f', b's', b'n', b'v'
+
+INT64 = struct.Struct('<q')
+DOUBLE = struct.Struct('<d')
+LENGTH = struct.Struct('<I')
+
+COMMANDS = {command.value: command for command in Commands}
+
+
+class BytecodeFormatError(ValueError):
+    pass
+
+
+def encode(program: list) -> bytes:
+    """
+    Serializes compiled program: commands and addresses are stored in int32 array,
+    numbers, strings, identifiers and slots are stored once in constant pool and referenced by index
+    """
+    code = array('i')
+    constants: list[Any] = []
+    indexes: dict[tuple[type, Any], int] = {}
+
+    address = 0
+    while address < len(program):
+        command = program[address]
+        code.append(command.value)
+        for operand in COMMAND_OPERANDS.get(command, ()):
+            address += 1
+            argument = program[address]
+            if operand in (Operand.VALUE, Operand.NAME):
+                key = (type(argument), argument)
+                if key not in indexes:
+                    indexes[key] = len(constants)
+                    constants.append(argument)
+                code.append(indexes[key])
+            elif operand == Operand.COMMAND:
+                code.append(argument.value)
+            else:
+                code.append(argument)
+        address += 1
+
+    if sys.byteorder != 'little':
+        code.byteswap()
+    chunks = [HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(code), len(constants)), code.tobytes()]
+    chunks.extend(encode_constant(constant) for constant in constants)
+    return b''.join(chunks)
+
+
+def decode(data) -> list:
+    magic, version, _, code_length, constants_count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise BytecodeFormatError('Unknown bytecode format')
+
+    code_end = HEADER.size + 4 * code_length
+    with memoryview(data)[HEADER.size:code_end] as raw_code:
+        if sys.byteorder == 'little':
+            with raw_code.cast('i') as view:
+                code = view.tolist()
+        else:
+            swapped = array('i', raw_code.tobytes())
+            swapped.byteswap()
+            code = swapped.tolist()
+
+    constants = []
+    offset = code_end
+    for _ in range(constants_count):
+        constant, offset = decode_constant(data, offset)
+        constants.append(constant)
+
+    program = []
+    address = 0
+    while address < code_length:
+        command = COMMANDS[code[address]]
+        program.append(command)
+        for operand in COMMAND_OPERANDS.get(command, ()):
+            address += 1
+            if operand in (Operand.VALUE, Operand.NAME):
+                program.append(constants[code[address]])
+            elif operand == Operand.COMMAND:
+                program.append(COMMANDS[code[address]])
+            else:
+                program.append(code[address])
+        address += 1
+    return program
+
+
+def dump(program: list, file_name: str) -> None:
+    temporary_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temporary_name, 'wb') as file:
+        file.write(encode(program))
+    os.replace(temporary_name, file_name)
+
+
+def load(file_name: str) -> list:
+    with open(file_name, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+        return decode(mapped)
+
+
+class BytecodeCache:
+    """
+    Compiled programs on disk, keyed by hash of source, translator version and compile options
+    """
+
+    __slots__ = 'folder'
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, source: str, options: str = '') -> str:
+        salt = f'{__version__}:{FORMAT_VERSION}:{options}:'.encode()
+        return sha256(salt + source.encode()).hexdigest()
+
+    def load(self, source: str, options: str = '') -> Optional[list]:
+        file_name = self._file_name(self.key(source, options))
+        try:
+            return load(file_name)
+        except (OSError, ValueError, KeyError, IndexError, struct.error):
+            return None
+
+    def store(self, source: str, program: list, options: str = '') -> None:
+        dump(program, self._file_name(self.key(source, options)))
+
+    # PRIVATE
+
+    def _file_name(self, key: str) -> str:
+        return os.path.join(self.folder, f'{key}.trbc')
+
+
+def encode_constant(constant: Any) -> bytes:
+    if constant is None:
+        return NONE
+    if isinstance(constant, Slot):
+        payload = constant.name.encode()
+        return SLOT + INT64.pack(constant) + LENGTH.pack(len(payload)) + payload
+    if isinstance(constant, int):
+        if -2 ** 63 <= constant < 2 ** 63:
+            return INT + INT64.pack(constant)
+        payload = str(constant).encode()
+        return BIG_INT + LENGTH.pack(len(payload)) + payload
+    if isinstance(constant, float):
+        return FLOAT + DOUBLE.pack(constant)
+    if isinstance(constant, str):
+        payload = constant.encode()
+        return STRING + LENGTH.pack(len(payload)) + payload
+    raise BytecodeFormatError(f'Constant {constant!r} can not be serialized')
+
+
+def decode_constant(data, offset: int) -> tuple[Any, int]:
+    tag = bytes(data[offset:offset + 1])
+    offset += 1
+    if tag == NONE:
+        return None, offset
+    if tag == INT:
+        return INT64.unpack_from(data, offset)[0], offset + INT64.size
+    if tag == FLOAT:
+        return DOUBLE.unpack_from(data, offset)[0], offset + DOUBLE.size
+    if tag == SLOT:
+        index = INT64.unpack_from(data, offset)[0]
+        length = LENGTH.unpack_from(data, offset + INT64.size)[0]
+        offset += INT64.size + LENGTH.size
+        return Slot(index, bytes(data[offset:offset + length]).decode()), offset + length
+    if tag in (BIG_INT, STRING):
+        length = LENGTH.unpack_from(data, offset)[0]
+        offset += LENGTH.size
+        payload = bytes(data[offset:offset + length])
+        offset += length
+        return (int(payload) if tag == BIG_INT else payload.decode()), offset
+    raise BytecodeFormatError(f'Unknown constant tag {tag!r}')
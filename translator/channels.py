@@ -0,0 +1,165 @@
+import asyncio
+import sys
+from typing import Any, Iterable, Optional, Protocol, TextIO, Union
+
+from translator.sys_exceptions import CustomException, custom_raise
+
+
+def parse_value(text: str) -> Union[int, float, str]:
+    # value got by gets: number if it looks like number, string otherwise
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return str(text)
+
+
+class OutputChannel(Protocol):
+    def write(self, value: Any) -> None: ...
+
+    def flush(self) -> None: ...
+
+
+class InputChannel(Protocol):
+    # when True, output is flushed before reading
+    interactive: bool
+
+    def read(self) -> str: ...
+
+
+class AsyncInputChannel(Protocol):
+    # read by VirtualMachine.run_async, which waits for line without blocking other programs
+    interactive: bool
+
+    async def read(self) -> str: ...
+
+
+class ConsoleOutput:
+    """
+    Collects printed values in memory and writes them to stdout in one call,
+    when buffer_size lines are collected, before interactive input and at the end of execution
+    """
+
+    __slots__ = 'file', 'buffer_size', '_buffer'
+
+    def __init__(self, file: Optional[TextIO] = None, buffer_size: int = 1024):
+        self.file = file
+        self.buffer_size = buffer_size
+        self._buffer: list[str] = []
+
+    def write(self, value: Any) -> None:
+        self._buffer.append(f'{value}\n')
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            # stdout is looked up on every flush, so redirected stdout is respected
+            (self.file or sys.stdout).write(''.join(self._buffer))
+            self._buffer.clear()
+
+
+class MemoryOutput:
+    """
+    Keeps printed values as lines, for running programs from code
+    """
+
+    __slots__ = 'lines'
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def write(self, value: Any) -> None:
+        self.lines.append(str(value))
+
+    def flush(self) -> None:
+        pass
+
+
+class NullOutput:
+    """
+    Drops everything, for benchmarks
+    """
+
+    __slots__ = ()
+
+    def write(self, value: Any) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+class ConsoleInput:
+    __slots__ = ()
+
+    # output is flushed before reading, so user sees everything printed before question
+    interactive = True
+
+    def read(self) -> str:
+        return input()
+
+
+class ScriptedInput:
+    """
+    Input lines given in advance: list, generator or opened file
+    """
+
+    __slots__ = '_lines'
+
+    interactive = False
+
+    def __init__(self, lines: Iterable[str]):
+        self._lines = iter(lines)
+
+    @classmethod
+    def from_file(cls, file_name: str) -> 'ScriptedInput':
+        with open(file_name, 'r') as file:
+            return cls(file.read().splitlines())
+
+    def feed(self, lines: Iterable[str]) -> None:
+        # replaces lines left unread
+        self._lines = iter(lines)
+
+    def read(self) -> str:
+        line = next(self._lines, None)
+        if line is None:
+            custom_raise(CustomException('No more input for gets'))
+        return line
+
+
+class QueueInput:
+    """
+    Lines sent by another task, for example by network session: gets waits for the next line
+    without blocking event loop (VirtualMachine.run_async). Queue is bounded, put raises
+    asyncio.QueueFull when program does not read lines as fast as they come.
+    After close gets fails as ScriptedInput does when lines run out
+    """
+
+    __slots__ = '_queue', '_closed'
+
+    interactive = True
+
+    def __init__(self, max_lines: int = 16):
+        self._queue: asyncio.Queue[Optional[str]] = asyncio.Queue(max_lines)
+        self._closed = False
+
+    def put(self, line: str) -> None:
+        self._queue.put_nowait(line)
+
+    def close(self) -> None:
+        self._closed = True
+        if not self._queue.full():
+            # wakes up waiting gets
+            self._queue.put_nowait(None)
+
+    async def read(self) -> str:
+        if self._closed and self._queue.empty():
+            custom_raise(CustomException('No more input for gets'))
+        line = await self._queue.get()
+        if line is None:
+            custom_raise(CustomException('No more input for gets'))
+        return line
@@ -0,0 +1,77 @@
+import os
+import struct
+from typing import Any, NamedTuple
+
+from translator.bytecode import BytecodeFormatError, decode_constant, encode_constant
+
+
+MAGIC = b'TRCP'
+FORMAT_VERSION = 2
+
+# magic, format version, reserved, address, executed steps, free memory, digest of program, stack size,
+# number of variables
+HEADER = struct.Struct('<4sHHqqq32sII')
+
+
+class Checkpoint(NamedTuple):
+    """
+    Suspended execution of VirtualMachine.execute(..., max_steps=N): digest of its Program, address of
+    the next instruction, operand stack from the bottom, variables and free memory of allocator.
+    Ropes are stored as strings. VirtualMachine.resume continues it with the same Program
+    in this or any other process
+    """
+    program: bytes
+    address: int
+    stack: tuple
+    variables: dict[str, Any]
+    memory_free: int
+    # instructions executed from the start of program
+    steps: int
+
+
+def encode(checkpoint: Checkpoint) -> bytes:
+    """
+    Values are stored as constants of bytecode (translator.bytecode), program only as its digest
+    """
+    chunks = [
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, checkpoint.address, checkpoint.steps, checkpoint.memory_free,
+            checkpoint.program, len(checkpoint.stack), len(checkpoint.variables),
+        ),
+    ]
+    chunks.extend(encode_constant(value) for value in checkpoint.stack)
+    for name, value in checkpoint.variables.items():
+        chunks.append(encode_constant(name))
+        chunks.append(encode_constant(value))
+    return b''.join(chunks)
+
+
+def decode(data) -> Checkpoint:
+    magic, version, _, address, steps, memory_free, program, stack_size, variables_count = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise BytecodeFormatError('Unknown checkpoint format')
+
+    offset = HEADER.size
+    stack = []
+    for _ in range(stack_size):
+        value, offset = decode_constant(data, offset)
+        stack.append(value)
+    variables = {}
+    for _ in range(variables_count):
+        name, offset = decode_constant(data, offset)
+        variables[name], offset = decode_constant(data, offset)
+    return Checkpoint(program, address, tuple(stack), variables, memory_free, steps)
+
+
+def dump(checkpoint: Checkpoint, file_name: str) -> None:
+    # written next to old checkpoint and renamed, so crash in the middle keeps the old one
+    temporary_name = f'{file_name}.{os.getpid()}.tmp'
+    with open(temporary_name, 'wb') as file:
+        file.write(encode(checkpoint))
+    os.replace(temporary_name, file_name)
+
+
+def load(file_name: str) -> Checkpoint:
+    with open(file_name, 'rb') as file:
+        return decode(file.read())
@@ -0,0 +1,105 @@
+from enum import Enum
+
+
+class Commands(Enum):
+    FETCH = 1        # FETCH x   - push to stack value of ID x
+    STORE = 2        # STORE x   - save to ID x value from top of stack
+    PUSH = 3         # PUSH  n   - push to stack n
+    POP = 4          # POP       - pop from stack
+    ADD = 5          # ADD       - sum two numbers on top of stack
+    DIV = 6          # DIV       - div two numbers on top of stack
+    MULT = 7         # MULT      - multiply two numbers on top of stack
+    SUB = 8          # SUB       - substitute two numbers on top of stack
+    LT = 9           # LT        - compare two numbers on top of stack (a < b). Result - 0 или 1
+    NON_EQUAL = 10   # NON_EQUAL - compare two numbers on top of stack (a != b). Result - 0 или 1
+    EQUAL = 11       # EQUAL     - compare two numbers on top of stack (a == b). Result - 0 или 1
+    JZ = 12          # JZ    A   - if 0 on top of stack - jump to A address.
+    JNZ = 13         # JNZ   A   - if NOT 0 on top of stack - jump to A address.
+    JMP = 14         # JMP   A   - jump to A address
+    FINISH = 15      # FINISH    - terminate executing
+    INPUT = 16       # INPUT     - get object from standard input
+    OUTPUT = 17      # OUTPUT    - print object to standard output
+    ARRAY = 18       # ARRAY     - describe new array and fill it with values
+    INDEX = 19       # INDEX i   - gets element from array by index i
+    RAISE = 20       # RAISE     - raises runtime error with text got as argument
+
+    # superinstructions, made by Compiler from common sequences of commands above
+    CMP_JZ = 21      # CMP_JZ  c A    - compare two values on top of stack with c (LT, NON_EQUAL, EQUAL), jump to A if 0
+    CMP_JNZ = 22     # CMP_JNZ c A    - compare two values on top of stack with c, jump to A if NOT 0
+    FETCH2 = 23      # FETCH2 x y c   - push result of c (ADD ... EQUAL) applied to values of IDs x and y
+    PUSH_STORE = 24  # PUSH_STORE n x - save n to ID x
+    STORE_POP = 25   # STORE_POP x    - save to ID x value from top of stack, then POP
+
+
+class Operand(Enum):
+    VALUE, ADDRESS, COMMAND, NAME = range(4)
+
+
+# names, which can not be used as variables
+SYSTEM_FUNCTIONS = ['puts', 'gets', 'raise']
+
+
+class Slot(int):
+    """
+    Index of variable in locals array of VirtualMachine, given by Compiler instead of its name.
+    Name is kept for messages and dumps
+    """
+
+    def __new__(cls, index: int, name: str):
+        slot = super().__new__(cls, index)
+        slot.name = name
+        return slot
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f'Slot({int(self)}, {self.name!r})'
+
+    def __reduce__(self):
+        return Slot, (int(self), self.name)
+
+
+# kinds of arguments which follow command in program, commands not listed here have no arguments
+COMMAND_OPERANDS = {
+    Commands.FETCH: (Operand.NAME,),
+    Commands.STORE: (Operand.NAME,),
+    Commands.PUSH: (Operand.VALUE,),
+    Commands.JZ: (Operand.ADDRESS,),
+    Commands.JNZ: (Operand.ADDRESS,),
+    Commands.JMP: (Operand.ADDRESS,),
+    Commands.INDEX: (Operand.VALUE,),
+    Commands.CMP_JZ: (Operand.COMMAND, Operand.ADDRESS),
+    Commands.CMP_JNZ: (Operand.COMMAND, Operand.ADDRESS),
+    Commands.FETCH2: (Operand.NAME, Operand.NAME, Operand.COMMAND),
+    Commands.PUSH_STORE: (Operand.VALUE, Operand.NAME),
+    Commands.STORE_POP: (Operand.NAME,),
+}
+
+
+# command -> (values popped from stack, values pushed to stack), commands not listed here can not be verified
+STACK_EFFECTS = {
+    Commands.FETCH: (0, 1),
+    Commands.STORE: (1, 0),
+    Commands.PUSH: (0, 1),
+    Commands.POP: (0, 0),
+    Commands.ADD: (2, 1),
+    Commands.DIV: (2, 1),
+    Commands.MULT: (2, 1),
+    Commands.SUB: (2, 1),
+    Commands.LT: (2, 1),
+    Commands.NON_EQUAL: (2, 1),
+    Commands.EQUAL: (2, 1),
+    Commands.JZ: (1, 0),
+    Commands.JNZ: (1, 0),
+    Commands.JMP: (0, 0),
+    Commands.FINISH: (0, 0),
+    Commands.INPUT: (1, 1),
+    Commands.OUTPUT: (1, 0),
+    Commands.RAISE: (1, 0),
+    Commands.CMP_JZ: (2, 0),
+    Commands.CMP_JNZ: (2, 0),
+    Commands.FETCH2: (0, 1),
+    Commands.PUSH_STORE: (0, 0),
+    Commands.STORE_POP: (1, 0),
+}
@@ -1,33 +1,15 @@
-from typing import TextIO
-from enum import Enum
+from collections import Counter
+from sys import intern
+from typing import Optional, TextIO, Union
 
-from translator.parser import ParserExpr
+from translator.commands import Commands, Operand, Slot, COMMAND_OPERANDS, STACK_EFFECTS, SYSTEM_FUNCTIONS
+from translator.frames import Frame, run_frames
+from translator.linker import Instruction, decode, link, line_table, jump_targets
+from translator.logger import Logger, LogLevel, as_logger
+from translator.parser import ParserExpr, FlatTree, EXPRESSIONS
 from translator.sys_exceptions import custom_raise, CustomException
 
 
-class Commands(Enum):
-    FETCH = 1        # FETCH x   - push to stack value of ID x
-    STORE = 2        # STORE x   - save to ID x value from top of stack
-    PUSH = 3         # PUSH  n   - push to stack n
-    POP = 4          # POP       - pop from stack
-    ADD = 5          # ADD       - sum two numbers on top of stack
-    DIV = 6          # DIV       - div two numbers on top of stack
-    MULT = 7         # MULT      - multiply two numbers on top of stack
-    SUB = 8          # SUB       - substitute two numbers on top of stack
-    LT = 9           # LT        - compare two numbers on top of stack (a < b). Result - 0 или 1
-    NON_EQUAL = 10   # NON_EQUAL - compare two numbers on top of stack (a != b). Result - 0 или 1
-    EQUAL = 11       # EQUAL     - compare two numbers on top of stack (a == b). Result - 0 или 1
-    JZ = 12          # JZ    A   - if 0 on top of stack - jump to A address.
-    JNZ = 13         # JNZ   A   - if NOT 0 on top of stack - jump to A address.
-    JMP = 14         # JMP   A   - jump to A address
-    FINISH = 15      # FINISH    - terminate executing
-    INPUT = 16       # INPUT     - get object from standard input
-    OUTPUT = 17      # OUTPUT    - print object to standard output
-    ARRAY = 18       # ARRAY     - describe new array and fill it with values
-    INDEX = 19       # INDEX i   - gets element from array by index i
-    RAISE = 20       # RAISE     - raises runtime error with text got as argument
-
-
 class Compiler:
     CALCULATION_COMMANDS = {
         ParserExpr.ADD: Commands.ADD,
@@ -42,108 +24,282 @@ class Compiler:
         ParserExpr.EQUAL: Commands.EQUAL
     }
 
-    __slots__ = 'logger_file', 'program', 'current_address', 'marks', 'jumps'
+    BINARY_COMMANDS = {
+        Commands.ADD, Commands.SUB, Commands.MULT, Commands.DIV,
+        Commands.LT, Commands.NON_EQUAL, Commands.EQUAL,
+    }
+
+    BRANCH_SUPERINSTRUCTIONS = {
+        Commands.JZ: Commands.CMP_JZ,
+        Commands.JNZ: Commands.CMP_JNZ,
+    }
+
+    TERMINATORS = {Commands.JMP, Commands.RAISE, Commands.FINISH}
 
-    def __init__(self, log_to: TextIO):
-        self.logger_file = log_to
+    __slots__ = 'logger', 'program', 'lines', 'current_line', 'current_address', 'marks', 'jumps', 'fusions', 'slots'
+
+    def __init__(self, log_to: Union[Logger, TextIO, None]):
+        self.logger = as_logger(log_to, 'compiler')
         self.program = []
+        # source line of every cell of program, 0 when unknown
+        self.lines: list[int] = []
+        self.current_line = 0
         self.current_address = 0
-        self.marks = {}
-        self.jumps = {}
+        self.marks: dict[str, int] = {}
+        self.jumps: dict[str, list[int]] = {}
+        self.fusions: Counter[str] = Counter()
+        self.slots: dict[str, Slot] = {}
 
     def gen(self, command) -> None:
         self.program.append(command)
+        self.lines.append(self.current_line)
         self.current_address += 1
 
+    @staticmethod
+    def constant(value):
+        # equal string literals and names share one object, so they are compared by identity first
+        return intern(value) if type(value) is str else value
+
     def compile(self, node) -> list[int, Commands]:
-        if node.kind == ParserExpr.VAR:
+        """
+        Node tree is flattened and compiled by compile_flat, so both trees get the same code
+        and depth of program is not limited by interpreter recursion limit
+        """
+        return self.compile_flat(FlatTree.from_node(node))
+
+    # compile has no recursion since it goes through compile_flat, name is kept for old callers
+    compile_iterative = compile
+
+    def jump_to_mark(self, mark_id: str) -> None:
+        self.gen(Commands.JMP)
+        if mark_id in self.marks:
+            self.gen(self.marks[mark_id])
+        else:
+            self.jumps.setdefault(mark_id, []).append(self.current_address)
+            self.gen(-1)
+
+    def declare_mark(self, mark_id: str) -> None:
+        if mark_id in self.marks:
+            custom_raise(CustomException(f'Mark {mark_id} was declared more than once'))
+        self.marks[mark_id] = self.current_address
+        for planed_jump in self.jumps.pop(mark_id, ()):
+            self.program[planed_jump] = self.current_address
+
+    def select_superinstructions(self, program: list, lines: Optional[list[int]] = None) -> list:
+        """
+        With lines of program given, lines of new program are left in self.lines
+        """
+        instructions = decode(program, lines)
+        targets = jump_targets(instructions)
+        selected = []
+        index = 0
+        while index < len(instructions):
+            instruction = instructions[index]
+            fused = self._fuse(instructions[index:index + 3], targets)
+            if fused:
+                self.fusions[instruction.command.name] += 1
+                index += fused
+            else:
+                index += 1
+            selected.append(instruction)
+
+        if self.logger.is_enabled(LogLevel.INFO):
+            details = ', '.join(f'{name}: {count}' for name, count in self.fusions.most_common())
+            self.logger.log(LogLevel.INFO, f'superinstructions: {details if details else "none"}\n')
+        if lines:
+            self.lines = line_table(selected)
+        return link(selected)
+
+    def resolve_slots(self, program: list) -> list:
+        # every variable gets index in locals array of VirtualMachine, system names are left
+        # as they are, so VirtualMachine reports them when (and if) they are executed
+        resolved = list(program)
+        address = 0
+        while address < len(resolved):
+            operands = COMMAND_OPERANDS.get(resolved[address], ())
+            for offset, operand in enumerate(operands, start=1):
+                name = resolved[address + offset]
+                if operand != Operand.NAME or isinstance(name, Slot) or name in SYSTEM_FUNCTIONS:
+                    continue
+                if name not in self.slots:
+                    self.slots[name] = Slot(len(self.slots), name)
+                resolved[address + offset] = self.slots[name]
+            address += 1 + len(operands)
+        return resolved
+
+    @staticmethod
+    def stack_depths(program: list) -> Optional[dict[int, int]]:
+        """
+        Depth of operand stack before every reachable instruction, by its address.
+        None when it can not be proven: stack underflows, unknown command or different
+        depth on the same address (value left on stack on every pass through loop)
+        """
+        instructions = decode(program)
+        if not instructions:
+            return {}
+
+        following = {instruction: index + 1 for index, instruction in enumerate(instructions)}
+        depths = {instructions[0]: 0}
+        pending = [instructions[0]]
+        while pending:
+            instruction = pending.pop()
+            if instruction.command not in STACK_EFFECTS:
+                return None
+            popped, pushed = STACK_EFFECTS[instruction.command]
+            depth = depths[instruction]
+            if popped > depth:
+                return None
+            depth += pushed - popped
+
+            successors = [] if instruction.target is None else [instruction.target]
+            index = following[instruction]
+            if instruction.command not in Compiler.TERMINATORS and index < len(instructions):
+                successors.append(instructions[index])
+            for successor in successors:
+                if successor not in depths:
+                    depths[successor] = depth
+                    pending.append(successor)
+                elif depths[successor] != depth:
+                    return None
+        return {instruction.address: depth for instruction, depth in depths.items()}
+
+    @staticmethod
+    def max_stack_depth(program: list) -> Optional[int]:
+        """
+        Static stack-effect analysis: the deepest operand stack program can reach.
+        None when it can not be proven (see stack_depths)
+        """
+        depths = Compiler.stack_depths(program)
+        if depths is None:
+            return None
+
+        deepest = 0
+        for address, depth in depths.items():
+            command = program[address]
+            popped, pushed = STACK_EFFECTS[command]
+            # POP pushes its argument before popping it
+            deepest = max(deepest, depth + 1 if command == Commands.POP else depth, depth + pushed - popped)
+        return deepest
+
+    def compile_flat(self, tree: FlatTree) -> list[int, Commands]:
+        run_frames(self._compile_flat_frame(tree, tree.root))
+        return self.program
+
+    def log(self):
+        self.logger.log(LogLevel.DEBUG, ''.join(f'{command}\n' for command in self.program))
+
+    # PRIVATE
+
+    def _fuse(self, window: list[Instruction], targets: set[Instruction]) -> Optional[int]:
+        # first instruction of sequence is replaced by superinstruction in place, so jumps to it stay valid.
+        # Other instructions of sequence are dropped, that is why they must not be jump targets
+        commands = [instruction.command for instruction in window]
+        first = window[0]
+        if commands[:2] == [Commands.FETCH, Commands.FETCH] and len(window) == 3 \
+                and commands[2] in self.BINARY_COMMANDS and not targets.intersection(window[1:]):
+            first.command = Commands.FETCH2
+            first.arguments = [first.arguments[0], window[1].arguments[0], commands[2]]
+            return 3
+        if len(window) < 2 or window[1] in targets:
+            return None
+        if commands[0] in self.COMPARE_COMMANDS.values():
+            # condition in parentheses is a statement, so there is POP between comparison and branch
+            if commands[1] == Commands.POP and len(window) == 3 and window[2] not in targets:
+                branch = window[2]
+            else:
+                branch = window[1]
+            if branch.command in self.BRANCH_SUPERINSTRUCTIONS:
+                first.command = self.BRANCH_SUPERINSTRUCTIONS[branch.command]
+                first.arguments = [commands[0], -1]
+                first.target = branch.target
+                return window.index(branch) + 1
+        if commands[:2] == [Commands.PUSH, Commands.STORE]:
+            first.command = Commands.PUSH_STORE
+            first.arguments = [first.arguments[0], window[1].arguments[0]]
+            return 2
+        if commands[:2] == [Commands.STORE, Commands.POP]:
+            first.command = Commands.STORE_POP
+            return 2
+        return None
+
+    def _compile_flat_frame(self, tree: FlatTree, node: int) -> Frame:
+        kind = EXPRESSIONS[tree.kinds[node]]
+        # ids of operands, see FlatTree
+        children, first = tree.children, tree.first_child[node]
+        outer_line = self.current_line
+        if tree.lines[node]:
+            self.current_line = tree.lines[node]
+        if kind == ParserExpr.VAR:
             self.gen(Commands.FETCH)
-            self.gen(node.value)
-        elif node.kind == ParserExpr.CONST:
+            self.gen(self.constant(tree.values[node]))
+        elif kind == ParserExpr.CONST:
             self.gen(Commands.PUSH)
-            self.gen(node.value)
-        elif node.kind in self.CALCULATION_COMMANDS:
-            self.compile(node.operands[0])
-            self.compile(node.operands[1])
-            self.gen(self.CALCULATION_COMMANDS[node.kind])
-        elif node.kind == ParserExpr.STDOUT:
-            self.compile(node.operands[0])
+            self.gen(self.constant(tree.values[node]))
+        elif kind in self.CALCULATION_COMMANDS:
+            yield self._compile_flat_frame(tree, children[first])
+            yield self._compile_flat_frame(tree, children[first + 1])
+            self.gen(self.CALCULATION_COMMANDS[kind])
+        elif kind == ParserExpr.STDOUT:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.OUTPUT)
-        elif node.kind == ParserExpr.RAISE:
-            self.compile(node.operands[0])
+        elif kind == ParserExpr.RAISE:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.RAISE)
-        elif node.kind == ParserExpr.STDIN:
+        elif kind == ParserExpr.STDIN:
             self.gen(Commands.PUSH)
             self.gen(0)
             self.gen(Commands.INPUT)
-        elif node.kind == ParserExpr.SET:
-            self.compile(node.operands[1])
+        elif kind == ParserExpr.SET:
+            yield self._compile_flat_frame(tree, children[first + 1])
             self.gen(Commands.STORE)
-            self.gen(node.operands[0].value)
-        elif node.kind in self.COMPARE_COMMANDS:
-            self.compile(node.operands[0])
-            self.compile(node.operands[1])
-            self.gen(self.COMPARE_COMMANDS[node.kind])
-        elif node.kind == ParserExpr.IF1:
-            self.compile(node.operands[0])
+            self.gen(self.constant(tree.values[children[first]]))
+        elif kind in self.COMPARE_COMMANDS:
+            yield self._compile_flat_frame(tree, children[first])
+            yield self._compile_flat_frame(tree, children[first + 1])
+            self.gen(self.COMPARE_COMMANDS[kind])
+        elif kind == ParserExpr.IF1:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.JZ)
             address_of_branch = self.current_address
             self.gen(0)
-            self.compile(node.operands[1])
+            yield self._compile_flat_frame(tree, children[first + 1])
             self.program[address_of_branch] = self.current_address
-        elif node.kind == ParserExpr.IF2:
-            self.compile(node.operands[0])
+        elif kind == ParserExpr.IF2:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.JZ)
             addr1 = self.current_address
             self.gen(0)
-            self.compile(node.operands[1])
+            yield self._compile_flat_frame(tree, children[first + 1])
             self.gen(Commands.JMP)
             addr2 = self.current_address
             self.gen(0)
             self.program[addr1] = self.current_address
-            self.compile(node.operands[2])
+            yield self._compile_flat_frame(tree, children[first + 2])
             self.program[addr2] = self.current_address
-        elif node.kind == ParserExpr.WHILE:
+        elif kind == ParserExpr.WHILE:
+            # condition is after body and jumps back while it is true, so iteration has one jump, not two
+            self.gen(Commands.JMP)
             addr1 = self.current_address
-            self.compile(node.operands[0])
-            self.gen(Commands.JZ)
-            addr2 = self.current_address
             self.gen(0)
-            self.compile(node.operands[1])
-            self.gen(Commands.JMP)
-            self.gen(addr1)
-            self.program[addr2] = self.current_address
-        elif node.kind == ParserExpr.SEQ:
-            for each_node in node.operands:
-                self.compile(each_node)
-        elif node.kind == ParserExpr.EXPR:
-            self.compile(node.operands[0])
+            body = self.current_address
+            yield self._compile_flat_frame(tree, children[first + 1])
+            self.program[addr1] = self.current_address
+            yield self._compile_flat_frame(tree, children[first])
+            self.gen(Commands.JNZ)
+            self.gen(body)
+        elif kind == ParserExpr.SEQ:
+            for each_node in tree.operands(node):
+                yield self._compile_flat_frame(tree, each_node)
+        elif kind == ParserExpr.EXPR:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.POP)
-        elif node.kind == ParserExpr.GOTO:
-            mark = node.operands[0].operands[0]
-            mark_id = mark.value
-            self.gen(Commands.JMP)
-            if self.marks.get(mark_id):
-                self.gen(self.marks[mark_id])
-            else:
-                self.jumps[mark_id] = self.current_address
-                self.gen(-1)
-        elif node.kind == ParserExpr.MARK:
-            mark = self.marks.get(node.value)
-            if mark:
-                custom_raise(CustomException(f'Mark {node.value} was declared more than once'))
-            self.marks[node.value] = self.current_address
-            planed_jump = self.jumps.get(node.value)
-            if planed_jump:
-                self.program[planed_jump] = self.current_address
-        elif node.kind == ParserExpr.MAIN:
-            self.compile(node.operands[0])
+        elif kind == ParserExpr.GOTO:
+            self.jump_to_mark(tree.values[children[tree.first_child[children[first]]]])
+        elif kind == ParserExpr.MARK:
+            self.declare_mark(tree.values[node])
+        elif kind == ParserExpr.MAIN:
+            yield self._compile_flat_frame(tree, children[first])
             self.gen(Commands.FINISH)
-            self.log()
-        return self.program
-
-    def log(self):
-        for command in self.program:
-            self.logger_file.write(str(command) + '\n')
-
-
+            if self.logger.is_enabled(LogLevel.DEBUG):
+                self.log()
+        self.current_line = outer_line
@@ -0,0 +1,439 @@
+import operator
+from typing import Any, Callable, TYPE_CHECKING
+
+from translator.channels import parse_value
+from translator.commands import Commands, Slot, COMMAND_OPERANDS
+from translator.rope import Rope, concat
+from translator.sys_exceptions import CustomException, custom_raise
+
+if TYPE_CHECKING:
+    from translator.virtual_machine import VirtualMachine
+
+
+# pre-decoded instruction: executes itself and returns address of the next one, -1 stops execution
+Handler = Callable[[], int]
+
+STOP = -1
+
+# written by FINISH
+FINISH_MESSAGE = 'Execution finished with exit code 0'
+
+# value of slot of variable, which was not stored yet
+UNDEFINED = object()
+
+COMPARATORS = {
+    Commands.LT: operator.lt,
+    Commands.NON_EQUAL: operator.ne,
+    Commands.EQUAL: operator.eq,
+}
+
+
+def _divide(first, second):
+    if second == 0:
+        custom_raise(CustomException('division by zero detected'))
+    result = first / second
+    return int(result) if int(result) == result else result
+
+
+# binary command -> its operation on (first, second) as in VirtualMachine.calculate,
+# bound to pre-decoded instruction, so command is not compared on every execution
+OPERATIONS = {
+    Commands.ADD: concat,
+    Commands.SUB: operator.sub,
+    Commands.MULT: lambda first, second: second * first,
+    Commands.DIV: _divide,
+    Commands.LT: lambda first, second: 1 if first < second else 0,
+    Commands.NON_EQUAL: lambda first, second: 1 if first != second else 0,
+    Commands.EQUAL: lambda first, second: 1 if first == second else 0,
+}
+
+
+def predecode(vm: 'VirtualMachine', program: list) -> list[Handler]:
+    """
+    Turns program into threaded code: list of closures with the same addresses as commands in program.
+    Operands are read and bound to closures once, at load time
+    """
+    _bind_slots(vm, program)
+
+    code: list[Handler] = [None] * len(program)
+    address = 0
+    while address < len(program):
+        opcode = program[address].value
+        code[address] = HANDLERS.get(opcode, _unknown)(vm, program, address)
+        address += 1 + OPERAND_COUNTS.get(opcode, 0)
+    return code
+
+
+def _bind_slots(vm, program: list) -> None:
+    # memory of values left from previous run is released first
+    memory = vm.local_variables.memory
+    for handle in vm.slot_handles:
+        if handle is not None:
+            memory.free(handle)
+    if vm.slots_handle is not None:
+        memory.free(vm.slots_handle)
+
+    slots = [argument for argument in program if isinstance(argument, Slot)]
+    vm.slot_names = [None] * (max(slots, default=-1) + 1)
+    for slot in slots:
+        vm.slot_names[slot] = slot.name
+    vm.slots = [UNDEFINED] * len(vm.slot_names)
+    vm.slot_handles = [None] * len(vm.slot_names)
+    vm.slots_handle = memory.allocate(vm.slots)
+
+
+def _system_function_alert(name) -> None:
+    custom_raise(CustomException(f'invalid operation. "{name}" is a system functions. finished with code 1'))
+
+
+def _not_found_alert(name) -> None:
+    custom_raise(CustomException(f'No id: "{name}" found'))
+
+
+def _variable_reader(vm, name) -> Callable[[], Any]:
+    if not isinstance(name, Slot):
+        return lambda: vm.fetch(name)
+
+    slots, index = vm.slots, int(name)
+
+    def read():
+        value = slots[index]
+        if value is UNDEFINED:
+            _not_found_alert(name)
+        return value
+    return read
+
+
+def variable_writer(vm, name) -> Callable[[Any], None]:
+    if not isinstance(name, Slot):
+        set_pair = vm.local_variables.set_pair
+        return lambda value: set_pair(name, value)
+
+    slots, handles, index = vm.slots, vm.slot_handles, int(name)
+    memory = vm.local_variables.memory
+
+    def write(value):
+        if handles[index] is not None:
+            memory.free(handles[index])
+        handles[index] = memory.allocate(value)
+        slots[index] = value
+    return write
+
+
+def _fetch(vm, program, address) -> Handler:
+    name, next_address = program[address + 1], address + 2
+    push, get = vm.stack.push, vm.local_variables.get
+
+    if isinstance(name, Slot):
+        slots, index = vm.slots, int(name)
+
+        def fetch_slot():
+            value = slots[index]
+            if value is UNDEFINED:
+                _not_found_alert(name)
+                return STOP
+            push(value)
+            return next_address
+        return fetch_slot
+
+    if name in vm.SYSTEM_FUNCTIONS:
+        def fetch():
+            _system_function_alert(name)
+            return STOP
+        return fetch
+
+    def fetch():
+        push(get(name))
+        return next_address
+    return fetch
+
+
+def _store(vm, program, address) -> Handler:
+    name, next_address = program[address + 1], address + 2
+    pop, set_pair = vm.stack.pop, vm.local_variables.set_pair
+
+    if isinstance(name, Slot):
+        write = variable_writer(vm, name)
+
+        def store_slot():
+            write(pop())
+            return next_address
+        return store_slot
+
+    def store():
+        set_pair(name, pop())
+        return next_address
+    return store
+
+
+def _push(vm, program, address) -> Handler:
+    value, next_address = program[address + 1], address + 2
+    push = vm.stack.push
+
+    def push_value():
+        push(value)
+        return next_address
+    return push_value
+
+
+def _pop(vm, program, address) -> Handler:
+    # same as in VirtualMachine.run: next word of program is pushed and popped back
+    argument = program[address + 1] if address + 1 < len(program) else None
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def pop_value():
+        push(argument)
+        pop()
+        return next_address
+    return pop_value
+
+
+def _add(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def add():
+        value = pop()
+        first = pop()
+        push(Rope(first, value) if type(first) is str and type(value) is str else first + value)
+        return next_address
+    return add
+
+
+def _sub(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def sub():
+        value = pop()
+        push(pop() - value)
+        return next_address
+    return sub
+
+
+def _mult(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def mult():
+        push(pop() * pop())
+        return next_address
+    return mult
+
+
+def _div(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def div():
+        value = pop()
+        value_2 = pop()
+        if value == 0:
+            custom_raise(CustomException('division by zero detected'))
+            return STOP
+        result = value_2 / value
+        push(int(result) if int(result) == result else result)
+        return next_address
+    return div
+
+
+def _lt(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def lt():
+        second = pop()
+        push(1 if pop() < second else 0)
+        return next_address
+    return lt
+
+
+def _non_equal(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def non_equal():
+        second = pop()
+        push(1 if pop() != second else 0)
+        return next_address
+    return non_equal
+
+
+def _equal(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    def equal():
+        second = pop()
+        push(1 if pop() == second else 0)
+        return next_address
+    return equal
+
+
+def _jz(vm, program, address) -> Handler:
+    target, next_address = program[address + 1], address + 2
+    pop = vm.stack.pop
+
+    def jz():
+        return target if pop() == 0 else next_address
+    return jz
+
+
+def _jnz(vm, program, address) -> Handler:
+    target, next_address = program[address + 1], address + 2
+    pop = vm.stack.pop
+
+    def jnz():
+        return target if pop() != 0 else next_address
+    return jnz
+
+
+def _jmp(vm, program, address) -> Handler:
+    target = program[address + 1]
+
+    if target == -1:
+        def failed_jump():
+            custom_raise(CustomException('Failed jump. Check if marks correct'))
+            return STOP
+        return failed_jump
+
+    def jmp():
+        return target
+    return jmp
+
+
+def _finish(vm, program, address) -> Handler:
+    write = vm.output_channel.write
+
+    def finish():
+        write(FINISH_MESSAGE)
+        return STOP
+    return finish
+
+
+def _input(vm, program, address) -> Handler:
+    next_address = address + 1
+    push, pop = vm.stack.push, vm.stack.pop
+
+    read, interactive, flush = vm.input_channel.read, vm.input_channel.interactive, vm.output_channel.flush
+
+    def read_input():
+        if interactive:
+            flush()
+        value = parse_value(read())
+        pop()
+        push(value)
+        return next_address
+    return read_input
+
+
+def _output(vm, program, address) -> Handler:
+    next_address = address + 1
+    pop, write = vm.stack.pop, vm.output_channel.write
+
+    def output():
+        write(pop())
+        return next_address
+    return output
+
+
+def _raise(vm, program, address) -> Handler:
+    pop = vm.stack.pop
+
+    def raise_error():
+        custom_raise(CustomException(f'raised an exception: "{pop()}"', 2))
+        return STOP
+    return raise_error
+
+
+def _cmp_jz(vm, program, address) -> Handler:
+    compare, target, next_address = COMPARATORS[program[address + 1]], program[address + 2], address + 3
+    pop = vm.stack.pop
+
+    def cmp_jz():
+        second = pop()
+        return next_address if compare(pop(), second) else target
+    return cmp_jz
+
+
+def _cmp_jnz(vm, program, address) -> Handler:
+    compare, target, next_address = COMPARATORS[program[address + 1]], program[address + 2], address + 3
+    pop = vm.stack.pop
+
+    def cmp_jnz():
+        second = pop()
+        return target if compare(pop(), second) else next_address
+    return cmp_jnz
+
+
+def _fetch2(vm, program, address) -> Handler:
+    first, second, command = program[address + 1:address + 4]
+    next_address = address + 4
+    push, operation = vm.stack.push, OPERATIONS[command]
+    read_first, read_second = _variable_reader(vm, first), _variable_reader(vm, second)
+
+    def fetch2():
+        push(operation(read_first(), read_second()))
+        return next_address
+    return fetch2
+
+
+def _push_store(vm, program, address) -> Handler:
+    value, name, next_address = program[address + 1], program[address + 2], address + 3
+    write = variable_writer(vm, name)
+
+    def push_store():
+        write(value)
+        return next_address
+    return push_store
+
+
+def _store_pop(vm, program, address) -> Handler:
+    name, next_address = program[address + 1], address + 2
+    pop, write = vm.stack.pop, variable_writer(vm, name)
+
+    def store_pop():
+        write(pop())
+        return next_address
+    return store_pop
+
+
+def _unknown(vm, program, address) -> Handler:
+    command = program[address]
+
+    def unknown():
+        custom_raise(CustomException(f'Unknown command {command}'))
+        return STOP
+    return unknown
+
+
+# opcode -> number of arguments after it, commands not listed here have no arguments
+OPERAND_COUNTS = {command.value: len(operands) for command, operands in COMMAND_OPERANDS.items()}
+
+# integer opcode -> factory of pre-decoded instruction
+HANDLERS = {
+    Commands.FETCH.value: _fetch,
+    Commands.STORE.value: _store,
+    Commands.PUSH.value: _push,
+    Commands.POP.value: _pop,
+    Commands.ADD.value: _add,
+    Commands.DIV.value: _div,
+    Commands.MULT.value: _mult,
+    Commands.SUB.value: _sub,
+    Commands.LT.value: _lt,
+    Commands.NON_EQUAL.value: _non_equal,
+    Commands.EQUAL.value: _equal,
+    Commands.JZ.value: _jz,
+    Commands.JNZ.value: _jnz,
+    Commands.JMP.value: _jmp,
+    Commands.FINISH.value: _finish,
+    Commands.INPUT.value: _input,
+    Commands.OUTPUT.value: _output,
+    Commands.RAISE.value: _raise,
+    Commands.CMP_JZ.value: _cmp_jz,
+    Commands.CMP_JNZ.value: _cmp_jnz,
+    Commands.FETCH2.value: _fetch2,
+    Commands.PUSH_STORE.value: _push_store,
+    Commands.STORE_POP.value: _store_pop,
+}
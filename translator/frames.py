@@ -0,0 +1,24 @@
+from typing import Any, Generator
+
+
+Frame = Generator[Any, Any, Any]
+
+
+def run_frames(entry: Frame) -> Any:
+    """
+    Runs generator frames on explicit stack instead of interpreter call stack.
+    Frame yields new frame to call it and receives its return value back, so
+    recursive algorithms keep their shape and work on any nesting depth
+    """
+    stack = [entry]
+    result = None
+    while stack:
+        try:
+            call = stack[-1].send(result)
+        except StopIteration as finished:
+            stack.pop()
+            result = finished.value
+        else:
+            stack.append(call)
+            result = None
+    return result
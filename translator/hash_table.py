@@ -1,3 +1,5 @@
+from array import array
+from enum import Enum
 from typing import Any, Optional, NamedTuple, TypeVar
 
 from translator.memalloc import MemoryAllocator, MY_OPERATIVE_MEMORY
@@ -20,7 +22,7 @@ class Pair(NamedTuple):
 class HashTable:
     DELETED = object()
 
-    __slots__ = '_slots', 'memory', '_load_factor_threshold'
+    __slots__ = '_slots', '_handles', 'memory', '_load_factor_threshold'
 
     def __init__(self, memory: MemoryAllocator, capacity: int = 8, load_factor_threshold: float = 0.6):
         if capacity < 1:
@@ -28,6 +30,8 @@ class HashTable:
         if not (0 < load_factor_threshold <= 1):
             custom_raise(CustomException("Load factor must be a number between (0, 1]"))
         self._slots: list[Optional[Pair]] = capacity * [None]
+        # handles of memory allocated for pairs, by the same index as pairs
+        self._handles: list[Optional[int]] = capacity * [None]
         self.memory: MemoryAllocator = memory
         self._load_factor_threshold = load_factor_threshold
 
@@ -36,10 +40,13 @@ class HashTable:
             self._resize_and_rehash()
 
         new_pair = Pair(key, value)
-        self.memory.allocate(new_pair)
+        handle = self.memory.allocate(new_pair)
         for index, pair in self._probe(key):
             if pair in (None, self.DELETED) or pair.key == key:
+                if self._handles[index] is not None:
+                    self.memory.free(self._handles[index])
                 self._slots[index] = new_pair
+                self._handles[index] = handle
                 break
 
     def get(self, key) -> Any:
@@ -69,8 +76,9 @@ class HashTable:
             if pair is self.DELETED:
                 continue
             if pair.key == key:
-                self.memory.free(self._slots[index])
+                self.memory.free(self._handles[index])
                 self._slots[index] = self.DELETED
+                self._handles[index] = None
                 break
         else:
             custom_raise(CustomException(f'No id: "{key}" found'))
@@ -133,13 +141,271 @@ class HashTable:
         copy = HashTable(self.memory, self.size * 2)
         for key, value in self.pairs:
             copy.set_pair(key, value)
-        for pair in self.pairs:
-            self.memory.free(pair)
+        for handle in self._handles:
+            if handle is not None:
+                self.memory.free(handle)
         self._slots = copy._slots
+        self._handles = copy._handles
+
+
+class Probing(Enum):
+    LINEAR = 'linear'
+    QUADRATIC = 'quadratic'
+    ROBIN_HOOD = 'robin_hood'
+
+
+class CompactHashTable:
+    """
+    Open-addressing table laid out like CPython dict: sparse array of indexes points into dense
+    arrays of cached hashes, keys and values, which keep insertion order.
+    Live entries and tombstones are counted on every change, so nothing has to scan the table
+    to know how full it is. Tombstones are compacted away when dense arrays are rebuilt.
+    Every value holds its own memory handle, which is freed when value is overwritten or deleted
+    """
+
+    DELETED = object()
+
+    EMPTY, DUMMY = -1, -2
+
+    MIN_CAPACITY = 8
+
+    __slots__ = (
+        'memory', 'probing', '_load_factor_threshold', '_indexes', '_mask',
+        '_hashes', '_keys', '_values', '_handles', '_storage', '_live', '_tombstones',
+    )
+
+    def __init__(self, memory: MemoryAllocator, capacity: int = 8, load_factor_threshold: float = 0.6,
+                 probing: Probing = Probing.LINEAR):
+        if capacity < 1:
+            custom_raise(CustomException("Capacity must be a positive number"))
+        if not (0 < load_factor_threshold <= 1):
+            custom_raise(CustomException("Load factor must be a number between (0, 1]"))
+        self.memory: MemoryAllocator = memory
+        self.probing = probing
+        self._load_factor_threshold = load_factor_threshold
+        self._live = 0
+        self._tombstones = 0
+
+        size = 2
+        while size < capacity:
+            size *= 2
+        self._storage: list[int] = []
+        self._allocate(size)
+
+    def set_pair(self, key, value) -> None:
+        key_hash = hash(key)
+        slot = self._find(key, key_hash)
+        if slot >= 0:
+            entry = self._indexes[slot]
+            self.memory.free(self._handles[entry])
+            self._handles[entry] = self.memory.allocate(value)
+            self._values[entry] = value
+            return
+
+        entry = self._live + self._tombstones
+        if entry == len(self._keys):
+            self._rebuild()
+            entry = self._live + self._tombstones
+        self._hashes[entry] = key_hash
+        self._keys[entry] = key
+        self._values[entry] = value
+        self._handles[entry] = self.memory.allocate(value)
+        self._live += 1
+        self._insert_index(entry, key_hash)
+
+    def get(self, key) -> Any:
+        slot = self._find(key, hash(key))
+        if slot < 0:
+            custom_raise(CustomException(f'No id: "{key}" found'))
+        return self._values[self._indexes[slot]]
+
+    def get_or_default(self, key, default=None) -> Optional[Any]:
+        slot = self._find(key, hash(key))
+        return default if slot < 0 else self._values[self._indexes[slot]]
+
+    def del_pair(self, key) -> None:
+        slot = self._find(key, hash(key))
+        if slot < 0:
+            custom_raise(CustomException(f'No id: "{key}" found'))
+
+        entry = self._indexes[slot]
+        self.memory.free(self._handles[entry])
+        self._keys[entry] = self.DELETED
+        self._values[entry] = None
+        self._handles[entry] = None
+        self._live -= 1
+        self._tombstones += 1
+        if self.probing is Probing.ROBIN_HOOD:
+            self._shift_back(slot)
+        else:
+            self._indexes[slot] = self.DUMMY
+
+        if self._tombstones > self._live and self._tombstones >= self.MIN_CAPACITY:
+            self._rebuild()
+
+    def clear(self) -> None:
+        # memory of values is freed, arrays keep their size and stay allocated for the next entries
+        for entry in range(self._live + self._tombstones):
+            if self._handles[entry] is not None:
+                self.memory.free(self._handles[entry])
+            self._keys[entry] = self._values[entry] = self._handles[entry] = None
+        self._indexes[:] = array('q', [self.EMPTY]) * len(self._indexes)
+        self._live = self._tombstones = 0
+
+    @property
+    def values(self):
+        return [pair.value for pair in self.pairs]
+
+    @property
+    def keys(self):
+        return {pair.key for pair in self.pairs}
+
+    @property
+    def pairs(self) -> list[Pair]:
+        # in insertion order
+        used = self._live + self._tombstones
+        return [
+            Pair(key, value) for key, value in zip(self._keys[:used], self._values[:used])
+            if key is not self.DELETED
+        ]
+
+    def __len__(self):
+        return self._live
+
+    @property
+    def size(self) -> int:
+        return len(self._indexes)
+
+    @property
+    def load_factor(self):
+        return (self._live + self._tombstones) / self.size
+
+    @property
+    def tombstones(self) -> int:
+        return self._tombstones
+
+    def __contains__(self, key) -> bool:
+        return self._find(key, hash(key)) >= 0
+
+    def __str__(self):
+        pairs = []
+        for key, value in self.pairs:
+            pairs.append(f"{key!r}: {value!r}")
+        return "{" + ", ".join(pairs) + "}"
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, (HashTable, CompactHashTable)):
+            return False
+        return set(self.pairs) == set(other.pairs)
+
+    # PRIVATE
+
+    def _find(self, key, key_hash: int) -> int:
+        # slot of index array, which points to entry with key, or -1
+        indexes, hashes, keys, mask = self._indexes, self._hashes, self._keys, self._mask
+        slot = key_hash & mask
+        if self.probing is Probing.ROBIN_HOOD:
+            distance = 0
+            while True:
+                entry = indexes[slot]
+                if entry == -1:
+                    return -1
+                entry_hash = hashes[entry]
+                if (slot - entry_hash) & mask < distance:
+                    return -1
+                if entry_hash == key_hash and (keys[entry] is key or keys[entry] == key):
+                    return slot
+                slot = (slot + 1) & mask
+                distance += 1
+
+        step, increment = 1, self.probing is Probing.QUADRATIC
+        while True:
+            entry = indexes[slot]
+            if entry == -1:
+                return -1
+            if entry >= 0 and hashes[entry] == key_hash and (keys[entry] is key or keys[entry] == key):
+                return slot
+            slot = (slot + step) & mask
+            step += increment
+
+    def _insert_index(self, entry: int, key_hash: int) -> None:
+        indexes, mask = self._indexes, self._mask
+        slot = key_hash & mask
+        if self.probing is Probing.ROBIN_HOOD:
+            # entry, which is farther from its home slot, takes place of closer one
+            hashes = self._hashes
+            distance = 0
+            while True:
+                resident = indexes[slot]
+                if resident == -1:
+                    indexes[slot] = entry
+                    return
+                resident_distance = (slot - hashes[resident]) & mask
+                if resident_distance < distance:
+                    indexes[slot] = entry
+                    entry, distance = resident, resident_distance
+                slot = (slot + 1) & mask
+                distance += 1
+
+        step, increment = 1, self.probing is Probing.QUADRATIC
+        while indexes[slot] >= 0:
+            slot = (slot + step) & mask
+            step += increment
+        indexes[slot] = entry
+
+    def _shift_back(self, slot: int) -> None:
+        # robin-hood deletion: following entries move one slot closer to home, so no tombstones needed
+        indexes, hashes, mask = self._indexes, self._hashes, self._mask
+        while True:
+            following = (slot + 1) & mask
+            entry = indexes[following]
+            if entry == -1 or (following - hashes[entry]) & mask == 0:
+                indexes[slot] = -1
+                return
+            indexes[slot] = entry
+            slot = following
+
+    def _rebuild(self) -> None:
+        # new capacity keeps live entries under half of usable space, tombstones are dropped
+        size = self.MIN_CAPACITY
+        while self._live >= size * self._load_factor_threshold / 2:
+            size *= 2
+
+        used = self._live + self._tombstones
+        old_hashes, old_keys, old_values, old_handles = self._hashes, self._keys, self._values, self._handles
+        for handle in self._storage:
+            self.memory.free(handle)
+        self._allocate(size)
+
+        entry = 0
+        for index in range(used):
+            key = old_keys[index]
+            if key is self.DELETED:
+                continue
+            key_hash = old_hashes[index]
+            self._hashes[entry] = key_hash
+            self._keys[entry] = key
+            self._values[entry] = old_values[index]
+            self._handles[entry] = old_handles[index]
+            self._insert_index(entry, key_hash)
+            entry += 1
+        self._tombstones = 0
+
+    def _allocate(self, size: int) -> None:
+        # index array has at least one empty slot, so probing always stops
+        usable = min(max(1, int(size * self._load_factor_threshold)), size - 1)
+        self._indexes = array('q', [self.EMPTY]) * size
+        self._hashes = array('q', [0]) * usable
+        self._keys, self._values, self._handles = [None] * usable, [None] * usable, [None] * usable
+        self._mask = size - 1
+        parts = self._indexes, self._hashes, self._keys, self._values, self._handles
+        self._storage = [self.memory.allocate(part) for part in parts]
 
 
 def main():
-    m = MemoryAllocator(MY_OPERATIVE_MEMORY)
+    m = MemoryAllocator(MY_OPERATIVE_MEMORY, None)
     hash_table = HashTable(m)
     for i in range(20):
         num_pairs = len(hash_table)
@@ -1,7 +1,12 @@
+import re
+from array import array
+from bisect import bisect_left
+from functools import partial
 from string import ascii_letters, digits
-from typing import TextIO
+from typing import Callable, Optional, TextIO, Union
 from enum import Enum
 
+from translator.logger import Logger, LogLevel, as_logger
 from translator.sys_exceptions import CustomException, custom_raise
 
 
@@ -41,7 +46,8 @@ class Lexer:
     __slots__ = (
         'hash_table',
         'program_file',
-        'logger_file',
+        'logger',
+        'log_enabled',
         'current_char',
         'value',
         'translated_token',
@@ -50,10 +56,11 @@ class Lexer:
         'current_char_count',
     )
 
-    def __init__(self, program_file: TextIO, log_to: TextIO):
+    def __init__(self, program_file: TextIO, log_to: Union[Logger, TextIO, None]):
         self.hash_table = hash
         self.program_file = program_file
-        self.logger_file = log_to
+        self.logger = as_logger(log_to, 'lexer')
+        self.log_enabled = self.logger.is_enabled(LogLevel.DEBUG)
         self.current_char = ''
         self.value = None
         self.translated_token = None
@@ -90,7 +97,8 @@ class Lexer:
                         f'Unexpected symbol at {self.current_line_count}:{self.current_char_count}: {self.current_char}'
                     )
                 )
-            self.log_token()
+            if self.log_enabled:
+                self.log_token()
 
     def tokenize_special_symbol(self):
         self.greedy_perform = False
@@ -154,12 +162,178 @@ class Lexer:
 
     def log_token(self):
         log = f'{self.translated_token} = {self.value}\n' if self.value is not None else f'{self.translated_token}\n'
-        self.logger_file.write(log)
+        self.logger.log(LogLevel.DEBUG, log)
 
     def __str__(self):
         return f'LAST TRANSLATED: {self.translated_token} NOW: {self.current_char if self.current_char else "EMPTY"}'
 
 
+class BufferedLexer(Lexer):
+    """
+    Lexer which reads whole source at once and scans it with single master pattern in one pass,
+    lines of tokens are counted from offsets of all newlines at once. next_token only returns
+    scanned tokens, TokenBuffer takes them all (tokenize_all). Tokens, line and column counters are
+    the same as in Lexer, also whitespace after the last token is unexpected symbol in both and
+    char after empty string is skipped in both. Where Lexer never finishes (unterminated string,
+    name, number or mark at the very end of source), BufferedLexer reports unexpected symbol.
+    Errors are raised when token with error is reached, as in Lexer
+    """
+
+    TOKEN_PATTERN = re.compile(
+        r'[ \t\n]*(?:'
+        r'(?P<SYMBOL>[{}=;()+\-*/<~^])'
+        r'|(?P<ID>[A-Za-z][A-Za-z_]*)'
+        r'|(?P<NUM>[0-9][0-9.]*)'
+        # Lexer reads one char after empty string and then reads the next one, so that char is lost
+        r'|(?P<EMPTY>"")[\s\S]?'
+        r'|"(?P<STRING>[^"]*)"'
+        r'|(?P<MARK>@[A-Za-z_@]*)'
+        r'|(?P<EOF>\Z)'
+        r'|(?P<ERROR>[^ \t\n])'
+        r')'
+    )
+
+    NEWLINE = re.compile('\n')
+
+    KINDS = tuple(Tokens)
+
+    SYMBOL_KINDS = {symbol: token.value for symbol, token in Lexer.LANGUAGE_SYMBOLS.items()}
+
+    RESERVED_KINDS = {word: token.value for word, token in Lexer.RESERVED_WORDS.items()}
+
+    __slots__ = 'source', 'kinds', 'values', 'lines', 'offsets', 'index', 'failure'
+
+    def __init__(self, program_file: TextIO, log_to: Union[Logger, TextIO, None]):
+        super().__init__(program_file, log_to)
+        self.source: str = program_file.read()
+        # scanned tokens: values of Tokens, values, lines and offsets after chars read by Lexer
+        self.kinds: Optional[list[int]] = None
+        self.values: list = []
+        self.lines: list[int] = []
+        self.offsets: list[int] = []
+        # the next token returned by next_token
+        self.index = 0
+        # raises error of source after the last scanned token, when there is one
+        self.failure: Optional[Callable[[], None]] = None
+
+    def next_token(self):
+        if self.kinds is None:
+            self._scan()
+        index = self.index
+        if index == len(self.kinds):
+            if self.failure is not None:
+                self.failure()
+            # Lexer returns EOF again after end of source
+            index -= 1
+        self.translated_token = self.KINDS[self.kinds[index]]
+        self.value = self.values[index]
+        self.current_line_count = self.lines[index]
+        self.index = index + 1
+        if self.log_enabled:
+            self.log_token()
+
+    def tokenize_all(self) -> tuple[array, array, list]:
+        """
+        Kinds, lines and values of all tokens not returned yet, as arrays of TokenBuffer
+        """
+        if self.kinds is None:
+            self._scan()
+        index = self.index
+        if self.log_enabled:
+            for kind, value in zip(self.kinds[index:], self.values[index:]):
+                self.translated_token, self.value = self.KINDS[kind], value
+                self.log_token()
+        self.index = len(self.kinds)
+        if self.failure is not None:
+            self.failure()
+        self.translated_token, self.value, self.current_line_count = Tokens.EOF, None, self.lines[-1]
+        return array('B', self.kinds[index:]), array('I', self.lines[index:]), self.values[index:]
+
+    # PRIVATE
+
+    def _scan(self) -> None:
+        source = self.source
+        kinds, values, offsets = [], [], []
+        add_kind, add_value, add_offset = kinds.append, values.append, offsets.append
+        symbols, reserved = self.SYMBOL_KINDS, self.RESERVED_KINDS
+        name, number, string, mark = Tokens.ID.value, Tokens.NUM.value, Tokens.STRING.value, Tokens.MARK.value
+        # Lexer reads one char after name, number, string and mark, so lines are counted up to it
+        last = len(source)
+        position = 0
+        greedy = False
+        for match in self.TOKEN_PATTERN.finditer(source):
+            kind = match.lastgroup
+            end = match.end()
+            if kind == 'SYMBOL':
+                add_kind(symbols[match[kind]])
+                add_value(None)
+                add_offset(end)
+                greedy = False
+            else:
+                lexeme = match[kind]
+                if kind == 'ID':
+                    lexeme = lexeme.lower()
+                    if lexeme in reserved:
+                        add_kind(reserved[lexeme])
+                        add_value(None)
+                    else:
+                        add_kind(name)
+                        add_value(lexeme)
+                elif kind == 'NUM':
+                    try:
+                        float_value = float(lexeme)
+                    except ValueError:
+                        # the same error as in Lexer, when number is reached
+                        self.failure = partial(float, lexeme)
+                        break
+                    add_kind(number)
+                    add_value(int(float_value) if int(float_value) == float_value else float_value)
+                elif kind == 'STRING':
+                    add_kind(string)
+                    add_value(lexeme)
+                elif kind == 'MARK':
+                    add_kind(mark)
+                    add_value(lexeme.lower())
+                elif kind == 'EMPTY':
+                    add_kind(string)
+                    add_value('')
+                    add_offset(end)
+                    greedy = False
+                    position = end
+                    continue
+                elif kind == 'EOF' and not greedy and match.start(kind) == position:
+                    add_kind(Tokens.EOF.value)
+                    add_value(None)
+                    add_offset(end)
+                    break
+                else:
+                    # Lexer reads end of source as the next char, not as end of input, after greedy tokens and spaces
+                    self.failure = partial(self._unexpected_symbol, last if kind == 'EOF' else match.start(kind))
+                    break
+                add_offset(end + 1 if end < last else last)
+                greedy = True
+            position = end
+
+        newlines = [newline.start() for newline in self.NEWLINE.finditer(source)]
+        self.lines = [bisect_left(newlines, offset) + 1 for offset in offsets]
+        self.kinds, self.values, self.offsets = kinds, values, offsets
+
+    def _unexpected_symbol(self, position: int) -> None:
+        self.current_line_count = self.source.count('\n', 0, position + 1) + 1
+        self.current_char = self.source[position:position + 1]
+        self.current_char_count = position + 1 - (self.source.rfind('\n', 0, position) + 1)
+        custom_raise(
+            CustomException(
+                f'Unexpected symbol at {self.current_line_count}:{self.current_char_count}: {self.current_char}'
+            )
+        )
+
+    def __str__(self):
+        consumed = self.offsets[self.index - 1] if self.kinds and self.index else 0
+        current_char = self.source[consumed - 1:consumed] if consumed else ''
+        return f'LAST TRANSLATED: {self.translated_token} NOW: {current_char if current_char else "EMPTY"}'
+
+
 if __name__ == '__main__':
     read_from = open('../prog.txt', 'r')
     lexer = Lexer(read_from)
@@ -0,0 +1,102 @@
+from typing import Iterable, Optional
+
+from translator.commands import Commands, Operand, COMMAND_OPERANDS
+
+
+class Instruction:
+    """
+    Command with its arguments. Jump address is kept as reference to target instruction,
+    so instructions can be removed or replaced and program linked back to addresses later.
+    Source line (0 when unknown) travels with instruction through all passes
+    """
+
+    __slots__ = 'command', 'arguments', 'target', 'address', 'line'
+
+    def __init__(self, command: Commands, arguments: list, target: Optional['Instruction'] = None, line: int = 0):
+        self.command = command
+        self.arguments = arguments
+        self.target = target
+        self.address = -1
+        self.line = line
+
+    @property
+    def operands(self) -> tuple[Operand, ...]:
+        return COMMAND_OPERANDS.get(self.command, ())
+
+    @property
+    def is_jump(self) -> bool:
+        return Operand.ADDRESS in self.operands
+
+    def __str__(self):
+        return f'{self.command} {self.arguments}'
+
+
+def decode(program: list, lines: Optional[list[int]] = None) -> list[Instruction]:
+    instructions = []
+    by_address = {}
+    address = 0
+    while address < len(program):
+        command = program[address]
+        operands_count = len(COMMAND_OPERANDS.get(command, ()))
+        instruction = Instruction(command, program[address + 1:address + 1 + operands_count])
+        instruction.address = address
+        if lines:
+            instruction.line = lines[address]
+        by_address[address] = instruction
+        instructions.append(instruction)
+        address += 1 + operands_count
+
+    for instruction in instructions:
+        for operand, argument in zip(instruction.operands, instruction.arguments):
+            if operand == Operand.ADDRESS:
+                instruction.target = by_address.get(argument)
+    return instructions
+
+
+def link(instructions: list[Instruction]) -> list:
+    address = 0
+    for instruction in instructions:
+        instruction.address = address
+        address += 1 + len(instruction.arguments)
+
+    program = []
+    for instruction in instructions:
+        program.append(instruction.command)
+        for operand, argument in zip(instruction.operands, instruction.arguments):
+            if operand == Operand.ADDRESS:
+                argument = instruction.target.address if instruction.target is not None else -1
+            program.append(argument)
+    return program
+
+
+def line_table(instructions: list[Instruction]) -> list[int]:
+    """
+    Source line of every cell of linked program: command and its arguments get line of instruction
+    """
+    lines = []
+    for instruction in instructions:
+        lines.extend([instruction.line] * (1 + len(instruction.arguments)))
+    return lines
+
+
+def jump_targets(instructions: Iterable[Instruction]) -> set[Instruction]:
+    return {instruction.target for instruction in instructions if instruction.target is not None}
+
+
+def remove(instructions: list[Instruction], removed: set[Instruction]) -> list[Instruction]:
+    """
+    Drops instructions from removed set, jumps to them are moved to the next kept instruction
+    """
+    successors = {}
+    successor = None
+    for instruction in reversed(instructions):
+        if instruction in removed:
+            successors[instruction] = successor
+        else:
+            successor = instruction
+
+    kept = [instruction for instruction in instructions if instruction not in removed]
+    for instruction in kept:
+        if instruction.target in removed:
+            instruction.target = successors[instruction.target]
+    return kept
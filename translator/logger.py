@@ -0,0 +1,112 @@
+from enum import IntEnum
+from queue import SimpleQueue
+from threading import Thread
+from typing import Optional, TextIO, Union
+
+
+class LogLevel(IntEnum):
+    TRACE = 5      # events of hot paths: executed instructions, allocations
+    DEBUG = 10     # results of pipeline stages: tokens, trees, commands
+    INFO = 20
+    OFF = 100
+
+
+class AsyncFileSink:
+    """
+    Collects messages in memory and passes them in big chunks to background thread,
+    which writes them to file, so logging component never waits for disk
+    """
+
+    __slots__ = 'file', 'buffer_size', '_buffer', '_queue', '_thread'
+
+    def __init__(self, file_name: str, buffer_size: int = 4096):
+        self.file = open(file_name, 'w')
+        self.buffer_size = buffer_size
+        self._buffer: list[str] = []
+        self._queue = SimpleQueue()
+        self._thread = Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        self._buffer.append(message)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._queue.put(''.join(self._buffer))
+            self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self.file.close()
+
+    # PRIVATE
+
+    def _write_chunks(self) -> None:
+        while (chunk := self._queue.get()) is not None:
+            self.file.write(chunk)
+
+
+class Logger:
+    __slots__ = 'name', 'sink', 'level'
+
+    def __init__(self, name: str, sink: Optional[TextIO] = None, level: LogLevel = LogLevel.TRACE):
+        self.name = name
+        self.sink = sink
+        self.level = level if sink is not None else LogLevel.OFF
+
+    def is_enabled(self, level: LogLevel) -> bool:
+        return level >= self.level
+
+    def log(self, level: LogLevel, message: str) -> None:
+        if level >= self.level:
+            self.sink.write(message)
+
+    def write(self, message: str) -> None:
+        if self.sink is not None:
+            self.sink.write(message)
+
+    def close(self) -> None:
+        if self.sink is not None:
+            self.sink.close()
+
+
+def as_logger(log_to: Union[Logger, TextIO, None], name: str) -> Logger:
+    if isinstance(log_to, Logger):
+        return log_to
+    return Logger(name, log_to)
+
+
+class LoggingConfig:
+    """
+    Per-component log levels. Sinks are opened only for components with enabled logging,
+    other components get disabled loggers which cost nothing
+    """
+
+    __slots__ = 'files', 'levels', 'async_sinks', 'loggers'
+
+    def __init__(self, files: dict[str, str], levels: dict[str, LogLevel], async_sinks: bool = True):
+        self.files = files
+        self.levels = levels
+        self.async_sinks = async_sinks
+        self.loggers: dict[str, Logger] = {}
+
+    def logger(self, component: str) -> Logger:
+        if component in self.loggers:
+            return self.loggers[component]
+
+        level = self.levels.get(component, LogLevel.OFF)
+        sink = None
+        if level < LogLevel.OFF:
+            file_name = self.files[component]
+            sink = AsyncFileSink(file_name) if self.async_sinks else open(file_name, 'w')
+        logger = Logger(component, sink, level)
+        self.loggers[component] = logger
+        return logger
+
+    def close(self) -> None:
+        for logger in self.loggers.values():
+            logger.close()
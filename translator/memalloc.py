@@ -1,11 +1,22 @@
-from typing import List, Any, TextIO
+from bisect import bisect_left, insort
+from enum import Enum
+from typing import Iterable, List, Any, Optional, TextIO, Union
 from sys import getsizeof
 
+from translator.logger import Logger, LogLevel, as_logger
+from translator.rope import Rope
 from translator.sys_exceptions import CustomException, custom_raise
 
 
 MY_OPERATIVE_MEMORY = 8 * 1024 * 1024 * 1024
 
+# handle of allocation of zero bytes (for example allocate_many of nothing), backends own no such
+# handle, so freeing it frees nothing
+EMPTY_HANDLE = -1
+
+# Rope is accounted as the string it stands for, this is size of string without characters
+STRING_HEADER_SIZE = getsizeof('')
+
 
 class Block:
     __slots__ = 'size', 'is_used', 'start', 'finish'
@@ -26,34 +37,39 @@ class Block:
         return f'|{self.start} - {self.finish}, size: {self.size}, is_used: {self.is_used}| '
 
 
-class MemoryAllocator:
-    __slots__ = 'logger_file', 'memory_size', 'blocks'
+class AllocationStrategy(Enum):
+    FIRST_FIT = 'first_fit'
+    SEGREGATED_FIT = 'segregated_fit'
 
-    def __init__(self, memory_size: int, log_to: TextIO):
-        self.logger_file = log_to
-        self.memory_size: int = memory_size
-        self.blocks: List[Block] = []
 
-    def allocate(self, any_object: Any) -> None:
-        size = getsizeof(any_object)
+class FirstFit:
+    """
+    Memory as list of blocks in address order, which is searched from the beginning on every call.
+    Allocation can take several free blocks, all of them are released by its handle
+    """
 
-        self._run_of_memory_alert(size)
+    __slots__ = 'blocks', 'allocations'
 
-        self._log(f'allocated {size} bytes\n')
+    def __init__(self, memory_size: int):
+        self.blocks: List[Block] = []
+        # handle -> blocks of allocation
+        self.allocations: dict[int, List[Block]] = {}
 
+    def allocate(self, size: int) -> Optional[int]:
+        taken = []
         insertion_place = None
         for block in self._unused_blocks():
             if size == 0:
-                return
+                break
             if size >= block.size:
                 block.use()
-                self.memory_size -= block.size
+                taken.append(block)
                 size -= block.size
             elif size < block.size:
                 insertion_place = self.blocks.index(block)
                 block_in_use = Block(block.start, size, is_used=True)
                 free_block = Block(block_in_use.finish + 1, block.size - size, is_used=False)
-                self.memory_size -= size
+                taken.append(block_in_use)
                 size -= block_in_use.size
 
         if insertion_place is not None:
@@ -61,32 +77,20 @@ class MemoryAllocator:
             self.blocks.insert(insertion_place + 1, free_block)
 
         if size > 0:
-            self.memory_size -= size
-            self.blocks.append(Block(self._new_block_start(), size, is_used=True))
-
-    def free(self, any_object: Any) -> None:
-        size = getsizeof(any_object)
+            block = Block(self._new_block_start(), size, is_used=True)
+            self.blocks.append(block)
+            taken.append(block)
 
-        self._log(f'freed {size} bytes\n')
+        handle = taken[0].start
+        self.allocations[handle] = taken
+        return handle
 
-        insertion_place = None
-        for block in self._used_blocks():
-            if size == 0:
-                return
-            if size >= block.size:
-                block.free()
-                self.memory_size += block.size
-                size -= block.size
-            elif size < block.size:
-                insertion_place = self.blocks.index(block)
-                block_in_use = Block(block.start, block.size - size, is_used=True)
-                free_block = Block(block_in_use.finish + 1, size, is_used=False)
-                self.memory_size += size
-                size -= free_block.size
-
-        if insertion_place is not None:
-            self.blocks[insertion_place] = block_in_use
-            self.blocks.insert(insertion_place + 1, free_block)
+    def free(self, handle: int) -> int:
+        freed = 0
+        for block in self.allocations.pop(handle, ()):
+            block.free()
+            freed += block.size
+        return freed
 
     def __str__(self):
         output = ''
@@ -101,25 +105,176 @@ class MemoryAllocator:
             return 0
         return self.blocks[-1].finish + 1
 
-    def _run_of_memory_alert(self, size) -> None:
-        if size > self.memory_size:
-            custom_raise(CustomException('Run out of memory'))
-
     def _unused_blocks(self) -> List[Block]:
         return list(filter(lambda block: (not block.is_used), self.blocks))
 
-    def _used_blocks(self) -> List[Block]:
-        return list(filter(lambda block: block.is_used, self.blocks))
+
+class SegregatedFit:
+    """
+    Free blocks are kept in lists by size class (class k holds sizes from 2^(k-1) to 2^k - 1),
+    bitmap of non-empty classes finds the smallest class which surely fits in O(1). Every list is
+    sorted by (size, start), so fitting block of the same class is found by binary search, adding
+    and removing block shifts only the tail of its list.
+    Free blocks are indexed by both boundaries, so freed block is merged with free neighbours at once.
+    Handle of allocation is its start address
+    """
+
+    __slots__ = 'free_lists', 'classes', 'free_starts', 'free_ends', 'used_blocks'
+
+    def __init__(self, memory_size: int):
+        # sorted (size, start) of free blocks by size class
+        self.free_lists: List[List[tuple[int, int]]] = [[] for _ in range(memory_size.bit_length() + 1)]
+        self.classes = 0
+        self.free_starts: dict[int, int] = {}
+        self.free_ends: dict[int, int] = {}
+        # start -> size of used blocks
+        self.used_blocks: dict[int, int] = {}
+        self._add_free(0, memory_size)
+
+    def allocate(self, size: int) -> Optional[int]:
+        start = self._find_free(size)
+        if start is None:
+            return None
+
+        block_size = self._remove_free(start)
+        if block_size > size:
+            self._add_free(start + size, block_size - size)
+        self.used_blocks[start] = size
+        return start
+
+    def free(self, handle: int) -> int:
+        size = self.used_blocks.pop(handle, 0)
+        if not size:
+            return 0
+
+        start, finish = handle, handle + size
+        if start in self.free_ends:
+            start = self.free_ends[start]
+            self._remove_free(start)
+        if finish in self.free_starts:
+            finish += self._remove_free(finish)
+        self._add_free(start, finish - start)
+        return size
+
+    def __str__(self):
+        blocks = [Block(start, size, is_used=False) for start, size in self.free_starts.items()]
+        blocks.extend(Block(start, size, is_used=True) for start, size in self.used_blocks.items())
+        return ''.join(str(block) for block in sorted(blocks, key=lambda block: block.start))
+
+    # PRIVATE
+
+    def _find_free(self, size: int) -> Optional[int]:
+        size_class = size.bit_length()
+        larger = self.classes >> (size_class + 1)
+        if larger:
+            # every block of bigger class fits, take the smallest block of the lowest non-empty one
+            size_class += (larger & -larger).bit_length()
+            return self.free_lists[size_class][0][1]
+
+        # the smallest block of the same class which is not smaller than size
+        free_list = self.free_lists[size_class]
+        position = bisect_left(free_list, (size, 0))
+        return free_list[position][1] if position < len(free_list) else None
+
+    def _add_free(self, start: int, size: int) -> None:
+        size_class = size.bit_length()
+        self.free_starts[start] = size
+        self.free_ends[start + size] = start
+        insort(self.free_lists[size_class], (size, start))
+        self.classes |= 1 << size_class
+
+    def _remove_free(self, start: int) -> int:
+        size = self.free_starts.pop(start)
+        del self.free_ends[start + size]
+        size_class = size.bit_length()
+        free_list = self.free_lists[size_class]
+        del free_list[bisect_left(free_list, (size, start))]
+        if not free_list:
+            self.classes &= ~(1 << size_class)
+        return size
+
+
+BACKENDS = {
+    AllocationStrategy.FIRST_FIT: FirstFit,
+    AllocationStrategy.SEGREGATED_FIT: SegregatedFit,
+}
+
+
+class MemoryAllocator:
+    __slots__ = 'logger', 'log_enabled', 'memory_size', 'strategy', 'backend'
+
+    def __init__(self, memory_size: int, log_to: Union[Logger, TextIO, None],
+                 strategy: AllocationStrategy = AllocationStrategy.SEGREGATED_FIT):
+        self.logger = as_logger(log_to, 'memory_allocator')
+        self.log_enabled = self.logger.is_enabled(LogLevel.TRACE)
+        self.memory_size: int = memory_size
+        self.strategy = strategy
+        self.backend = BACKENDS[strategy](memory_size)
+
+    def allocate(self, any_object: Any) -> int:
+        """
+        Returns handle of allocated memory, which is the only way to free it
+        """
+        if type(any_object) is Rope:
+            return self._allocate(STRING_HEADER_SIZE + any_object.length)
+        return self._allocate(getsizeof(any_object))
+
+    def allocate_many(self, objects: Iterable[Any]) -> int:
+        """
+        One allocation for all objects, they are freed together by returned handle
+        """
+        return self._allocate(sum(
+            STRING_HEADER_SIZE + any_object.length if type(any_object) is Rope else getsizeof(any_object)
+            for any_object in objects
+        ))
+
+    def reserve(self, size: int) -> int:
+        """
+        Accounts size bytes, which belong to no object, for example memory of restored checkpoint
+        """
+        return self._allocate(size)
+
+    def free(self, handle: int) -> None:
+        size = self.backend.free(handle)
+
+        if self.log_enabled:
+            self._log(f'freed {size} bytes\n')
+
+        self.memory_size += size
+
+    def __str__(self):
+        return str(self.backend)
+
+    # PRIVATE
+
+    def _allocate(self, size: int) -> int:
+        if size <= 0:
+            if size < 0:
+                custom_raise(CustomException('Size of allocation can not be negative'))
+            return EMPTY_HANDLE
+        self._run_of_memory_alert(size)
+
+        if self.log_enabled:
+            self._log(f'allocated {size} bytes\n')
+
+        handle = self.backend.allocate(size)
+        if handle is None:
+            custom_raise(CustomException('Run out of memory'))
+        self.memory_size -= size
+        return handle
+
+    def _run_of_memory_alert(self, size) -> None:
+        if size > self.memory_size:
+            custom_raise(CustomException('Run out of memory'))
 
     def _log(self, log_message: str) -> None:
-        self.logger_file.write(log_message)
+        self.logger.log(LogLevel.TRACE, log_message)
 
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    memory = MemoryAllocator(1000)
-    memory.allocate(5)
-    memory.free(5)
+    memory = MemoryAllocator(1000, None)
+    memory.free(memory.allocate(5))
     memory.allocate('hkjhkhjkhsdsvdvdsvs')
     print(memory.memory_size)
     print(memory)
@@ -0,0 +1,177 @@
+from collections import Counter
+from typing import Any, Optional, TextIO, Union
+
+from translator.commands import Commands
+from translator.linker import Instruction, decode, link, line_table, jump_targets, remove
+from translator.logger import Logger, LogLevel, as_logger
+
+
+class Optimizer:
+    """
+    Optimization pass between Compiler and VirtualMachine.
+    Level 1 removes POP commands, unreachable code and threads jumps,
+    level 2 also folds constant expressions and branches on constants
+    """
+
+    FOLDABLE_COMMANDS = {
+        Commands.ADD, Commands.SUB, Commands.MULT, Commands.DIV,
+        Commands.LT, Commands.NON_EQUAL, Commands.EQUAL,
+    }
+
+    TERMINATORS = {Commands.JMP, Commands.RAISE, Commands.FINISH}
+
+    # folded constants bigger than this are left to be calculated at runtime
+    MAX_FOLDED_SIZE = 4096
+
+    MAX_ROUNDS = 8
+
+    __slots__ = 'level', 'logger', 'stats', 'instructions_before', 'instructions_after', 'lines'
+
+    def __init__(self, level: int = 1, log_to: Union[Logger, TextIO, None] = None):
+        self.level = level
+        self.logger = as_logger(log_to, 'optimizer')
+        self.stats: Counter[str] = Counter()
+        self.instructions_before = 0
+        self.instructions_after = 0
+        # source lines of optimized program, when lines of original program were given
+        self.lines: Optional[list[int]] = None
+
+    def optimize(self, program: list, lines: Optional[list[int]] = None) -> list:
+        instructions = decode(program, lines)
+        self.instructions_before = len(instructions)
+        if self.level > 0:
+            for _ in range(self.MAX_ROUNDS):
+                count = len(instructions)
+                instructions = self._remove_pops(instructions)
+                if self.level > 1:
+                    instructions = self._fold_constants(instructions)
+                instructions = self._thread_jumps(instructions)
+                instructions = self._remove_unreachable(instructions)
+                if len(instructions) == count:
+                    break
+        self.instructions_after = len(instructions)
+        if lines:
+            self.lines = line_table(instructions)
+
+        if self.logger.is_enabled(LogLevel.INFO):
+            details = ', '.join(f'{name}: {count}' for name, count in sorted(self.stats.items()))
+            self.logger.log(LogLevel.INFO, f'-O{self.level} removed {self.removed} instructions ({details})\n')
+        return link(instructions)
+
+    @property
+    def removed(self) -> int:
+        return self.instructions_before - self.instructions_after
+
+    # PRIVATE
+
+    def _remove_pops(self, instructions: list[Instruction]) -> list[Instruction]:
+        # POP pushes and pops its own argument, so it never changes stack
+        # (value of expression in parentheses is still used by JZ after it)
+        removed = {instruction for instruction in instructions if instruction.command == Commands.POP}
+        self.stats['pops'] += len(removed)
+        return remove(instructions, removed) if removed else instructions
+
+    def _fold_constants(self, instructions: list[Instruction]) -> list[Instruction]:
+        targets = jump_targets(instructions)
+        folded = []
+        for instruction in instructions:
+            if instruction in targets or not folded or folded[-1].command != Commands.PUSH or folded[-1] in targets:
+                folded.append(instruction)
+                continue
+
+            if instruction.command in self.FOLDABLE_COMMANDS and len(folded) > 1 \
+                    and folded[-2].command == Commands.PUSH:
+                value = self._evaluate(instruction.command, folded[-2].arguments[0], folded[-1].arguments[0])
+                if value is not None:
+                    folded.pop()
+                    folded[-1].arguments = [value]
+                    self.stats['folded'] += 2
+                    continue
+            elif instruction.command in (Commands.JZ, Commands.JNZ):
+                is_zero = folded[-1].arguments[0] == 0
+                if is_zero == (instruction.command == Commands.JZ):
+                    folded[-1] = Instruction(Commands.JMP, [-1], instruction.target, instruction.line)
+                    self.stats['branches'] += 1
+                else:
+                    folded.pop()
+                    self.stats['branches'] += 2
+                continue
+            folded.append(instruction)
+        return folded
+
+    def _evaluate(self, command: Commands, first: Any, second: Any) -> Optional[Any]:
+        try:
+            if command == Commands.ADD:
+                result = first + second
+            elif command == Commands.SUB:
+                result = first - second
+            elif command == Commands.MULT:
+                if isinstance(first, str) or isinstance(second, str):
+                    return None
+                result = second * first
+            elif command == Commands.DIV:
+                if second == 0:
+                    return None
+                result = first / second
+                result = int(result) if int(result) == result else result
+            elif command == Commands.LT:
+                result = 1 if first < second else 0
+            elif command == Commands.NON_EQUAL:
+                result = 1 if first != second else 0
+            else:
+                result = 1 if first == second else 0
+        except (TypeError, ValueError, OverflowError, ArithmeticError):
+            return None
+
+        if isinstance(result, str) and len(result) > self.MAX_FOLDED_SIZE:
+            return None
+        if isinstance(result, int) and result.bit_length() > self.MAX_FOLDED_SIZE:
+            return None
+        return result
+
+    def _thread_jumps(self, instructions: list[Instruction]) -> list[Instruction]:
+        removed = set()
+        for index, instruction in enumerate(instructions):
+            if instruction.target is None:
+                continue
+
+            final = instruction.target
+            visited = {instruction}
+            while final.command == Commands.JMP and final.target is not None and final not in visited:
+                visited.add(final)
+                final = final.target
+            if final is not instruction.target:
+                instruction.target = final
+                self.stats['threaded'] += 1
+
+            if instruction.command != Commands.JMP:
+                continue
+            if final.command == Commands.FINISH:
+                instruction.command, instruction.arguments, instruction.target = Commands.FINISH, [], None
+                self.stats['threaded'] += 1
+            elif index + 1 < len(instructions) and instructions[index + 1] is final:
+                removed.add(instruction)
+                self.stats['jumps'] += 1
+        return remove(instructions, removed) if removed else instructions
+
+    def _remove_unreachable(self, instructions: list[Instruction]) -> list[Instruction]:
+        if not instructions:
+            return instructions
+
+        indexes = {instruction: index for index, instruction in enumerate(instructions)}
+        reachable = set()
+        pending = [instructions[0]]
+        while pending:
+            instruction = pending.pop()
+            if instruction in reachable:
+                continue
+            reachable.add(instruction)
+            if instruction.target is not None:
+                pending.append(instruction.target)
+            index = indexes[instruction] + 1
+            if instruction.command not in self.TERMINATORS and index < len(instructions):
+                pending.append(instructions[index])
+
+        removed = {instruction for instruction in instructions if instruction not in reachable}
+        self.stats['unreachable'] += len(removed)
+        return remove(instructions, removed) if removed else instructions
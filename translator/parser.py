@@ -1,7 +1,12 @@
-from typing import TypeVar, Optional, TextIO
+from array import array
+from io import StringIO
+from typing import TypeVar, Optional, TextIO, Union
 from enum import Enum
 
 from translator.lexer import Lexer, Tokens
+from translator.frames import Frame, run_frames
+from translator.logger import Logger, LogLevel, as_logger
+from translator.token_stream import TOKENS, TokenBuffer, TokenStream
 from translator.sys_exceptions import CustomException, custom_raise
 
 
@@ -14,12 +19,14 @@ class ParserExpr(Enum):
 
 
 class Node:
-    __slots__ = 'kind', 'value', 'operands'
+    __slots__ = 'kind', 'value', 'operands', 'line'
 
     def __init__(self, kind: ParserExpr, value: Optional[int] = None, operands: list[SelfNode] = ()):
         self.kind: ParserExpr = kind
         self.value = value
         self.operands: list[SelfNode] = list(operands)
+        # source line where statement starts, 0 for expressions
+        self.line = 0
 
     def __str__(self):
         self.draw_tree()
@@ -30,136 +37,274 @@ class Node:
             nodes += '\t' * depth + f'{(node.draw_tree(depth + 1))}'
         return f'{self.kind}, VALUE: {self.value} \n{nodes}'
 
+    def draw_tree_iterative(self) -> str:
+        buffer = StringIO()
+        self.dump(buffer)
+        return buffer.getvalue()
+
+    def dump(self, file: TextIO) -> None:
+        stack = [(self, 1, '')]
+        while stack:
+            node, depth, indent = stack.pop()
+            file.write(f'{indent}{node.kind}, VALUE: {node.value} \n')
+            if node.operands:
+                indent = '\t' * depth
+                file.write(f'{indent}NODES:\n')
+                stack.extend((child, depth + 1, indent) for child in reversed(node.operands))
+
+
+EXPRESSIONS = tuple(ParserExpr)
+
+
+class FlatTree:
+    """
+    Whole tree in parallel arrays indexed by node id. Node is added when its operands are done,
+    so operands have smaller ids and root is the last node. Ids of operands of every node are
+    in children array from first_child to first_child + child_count
+    """
+
+    __slots__ = 'kinds', 'values', 'first_child', 'child_count', 'lines', 'children'
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values: list = []
+        self.first_child = array('I')
+        self.child_count = array('I')
+        self.lines = array('I')
+        self.children = array('I')
+
+    @classmethod
+    def from_node(cls, root: Node) -> 'FlatTree':
+        tree = cls()
+        # ids of done operands wait on the stack until their node is added
+        pending, done = [(root, False)], []
+        while pending:
+            node, operands_done = pending.pop()
+            if operands_done:
+                first = len(done) - len(node.operands)
+                operands = done[first:]
+                del done[first:]
+                done.append(tree.add(node.kind, node.value, operands, node.line))
+            else:
+                pending.append((node, True))
+                pending.extend((child, False) for child in reversed(node.operands))
+        return tree
+
+    @property
+    def root(self) -> int:
+        return len(self.kinds) - 1
+
+    def add(self, kind: ParserExpr, value, operands: list[int], line: int = 0) -> int:
+        self.kinds.append(kind.value)
+        self.values.append(value)
+        self.first_child.append(len(self.children))
+        self.child_count.append(len(operands))
+        self.lines.append(line)
+        self.children.extend(operands)
+        return len(self.kinds) - 1
+
+    def kind(self, node_id: int) -> ParserExpr:
+        return EXPRESSIONS[self.kinds[node_id]]
+
+    def operands(self, node_id: int) -> array:
+        first = self.first_child[node_id]
+        return self.children[first:first + self.child_count[node_id]]
+
+    def dump(self, file: TextIO) -> None:
+        stack = [(self.root, 1, '')]
+        while stack:
+            node_id, depth, indent = stack.pop()
+            file.write(f'{indent}{EXPRESSIONS[self.kinds[node_id]]}, VALUE: {self.values[node_id]} \n')
+            if self.child_count[node_id]:
+                indent = '\t' * depth
+                file.write(f'{indent}NODES:\n')
+                stack.extend((child, depth + 1, indent) for child in reversed(self.operands(node_id)))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
 
 class Parser:
-    __slots__ = 'logger_file', 'lexer'
+    LEXER_COMPARE = {
+        Tokens.LESS: ParserExpr.LT,
+        Tokens.NON_EQUAL: ParserExpr.NON_EQUAL,
+        Tokens.EQUAL: ParserExpr.EQUAL
+    }
 
-    def __init__(self, lexer: Lexer, log_to: TextIO):
-        self.logger_file = log_to
-        self.lexer = lexer
+    LEXER_MATH = {
+        Tokens.PLUS: ParserExpr.ADD,
+        Tokens.MINUS: ParserExpr.SUB,
+        Tokens.MULT: ParserExpr.MULT,
+        Tokens.DIV: ParserExpr.DIV,
+    }
+
+    LEXER_TERMS = {
+        Tokens.ID: ParserExpr.VAR,
+        Tokens.GETS: ParserExpr.STDIN,
+        Tokens.NUM: ParserExpr.CONST,
+        Tokens.STRING: ParserExpr.CONST,
+        Tokens.MARK: ParserExpr.MARK,
+    }
+
+    __slots__ = 'logger', 'kinds', 'values', 'lines', 'position', 'tree'
+
+    def __init__(self, lexer: Union[Lexer, TokenBuffer], log_to: Union[Logger, TextIO, None],
+                 pretokenize: bool = False):
+        self.logger = as_logger(log_to, 'parser')
+        if isinstance(lexer, TokenBuffer):
+            tokens = lexer
+        elif pretokenize:
+            tokens = TokenBuffer.tokenize(lexer)
+        else:
+            tokens = TokenStream(lexer)
+        # grammar reads token kind at self.position first, then its value and line
+        self.kinds = tokens.kinds
+        self.values = tokens.values
+        self.lines = tokens.lines
+        self.position = 0
+        # nodes are added to it by parse_flat, Node objects are made otherwise
+        self.tree: Optional[FlatTree] = None
 
     def parse(self) -> Node:
-        self.lexer.next_token()
-        node = Node(ParserExpr.MAIN, operands=[self._statement()])
-        if self.lexer.translated_token != Tokens.EOF:
-            custom_raise(CustomException(f"Invalid statement syntax at line {self.lexer.current_line_count}"))
-        self._log(node)
-        return node
+        """
+        Nested statements and expressions are parsed by generator frames on explicit stack (run_frames),
+        so depth of program is not limited by interpreter recursion limit
+        """
+        return self._finish(self._main())
+
+    # parse has no recursion since grammar methods became frames, name is kept for old callers
+    parse_iterative = parse
+
+    def parse_flat(self) -> FlatTree:
+        """
+        Same grammar as parse, but nodes go straight to arrays of FlatTree, no Node is made
+        """
+        tree = self.tree = FlatTree()
+        try:
+            self._main()
+        finally:
+            self.tree = None
+        return self._finish(tree)
 
     # PRIVATE
 
-    def _statement(self) -> Node:
-        if self.lexer.translated_token == Tokens.IF:
-            node = Node(ParserExpr.IF1)
-            self.lexer.next_token()
-            node.operands = [
-                self._paren_expr(),
-                self._statement()
+    def _main(self) -> Union[Node, int]:
+        self.position = 0
+        return self._node(ParserExpr.MAIN, None, [run_frames(self._statement())])
+
+    def _finish(self, result: Union[Node, FlatTree]) -> Union[Node, FlatTree]:
+        if TOKENS[self.kinds[self.position]] != Tokens.EOF:
+            custom_raise(CustomException(f"Invalid statement syntax at line {self.lines[self.position]}"))
+        if self.logger.is_enabled(LogLevel.DEBUG):
+            self._log(result)
+        return result
+
+    def _node(self, kind: ParserExpr, value, operands: list = (), line: int = 0) -> Union[Node, int]:
+        if self.tree is not None:
+            return self.tree.add(kind, value, operands, line)
+        node = Node(kind, value, operands)
+        node.line = line
+        return node
+
+    # Every nested call of grammar method is yielded to run_frames, which sends its result back.
+    # Results are Node objects or node ids of FlatTree, see _node
+
+    def _statement(self) -> Frame:
+        token = TOKENS[self.kinds[self.position]]
+        line = self.lines[self.position]
+        if token == Tokens.IF:
+            kind = ParserExpr.IF1
+            self.position += 1
+            operands = [
+                (yield self._paren_expr()),
+                (yield self._statement())
             ]
-            if self.lexer.translated_token == Tokens.ELSE:
-                node.kind = ParserExpr.IF2
-                self.lexer.next_token()
-                node.operands.append(self._statement())
-        elif self.lexer.translated_token == Tokens.WHILE:
-            node = Node(ParserExpr.WHILE)
-            self.lexer.next_token()
-            node.operands = [self._paren_expr(), self._statement()]
-        elif self.lexer.translated_token == Tokens.GOTO:
-            node = Node(ParserExpr.GOTO)
-            self.lexer.next_token()
-            node.operands = [self._statement()]
-        elif self.lexer.translated_token == Tokens.PUTS:
-            node = Node(ParserExpr.STDOUT)
-            self.lexer.next_token()
-            node.operands = [self._statement()]
-        elif self.lexer.translated_token == Tokens.RAISE:
-            node = Node(ParserExpr.RAISE)
-            self.lexer.next_token()
-            node.operands = [self._term()]
-        elif self.lexer.translated_token == Tokens.SEMICOLON:
-            node = Node(ParserExpr.EMPTY)
-            self.lexer.next_token()
-        elif self.lexer.translated_token == Tokens.LBRA:
-            node = Node(ParserExpr.EMPTY)
-            self.lexer.next_token()
-            while self.lexer.translated_token != Tokens.RBRA:
-                node.kind = ParserExpr.SEQ
-                node.operands.append(self._statement())
-            self.lexer.next_token()
+            if TOKENS[self.kinds[self.position]] == Tokens.ELSE:
+                kind = ParserExpr.IF2
+                self.position += 1
+                operands.append((yield self._statement()))
+        elif token == Tokens.WHILE:
+            kind = ParserExpr.WHILE
+            self.position += 1
+            operands = [(yield self._paren_expr()), (yield self._statement())]
+        elif token == Tokens.GOTO:
+            kind = ParserExpr.GOTO
+            self.position += 1
+            operands = [(yield self._statement())]
+        elif token == Tokens.PUTS:
+            kind = ParserExpr.STDOUT
+            self.position += 1
+            operands = [(yield self._statement())]
+        elif token == Tokens.RAISE:
+            kind = ParserExpr.RAISE
+            self.position += 1
+            operands = [(yield self._term())]
+        elif token == Tokens.SEMICOLON:
+            kind = ParserExpr.EMPTY
+            self.position += 1
+            operands = []
+        elif token == Tokens.LBRA:
+            kind = ParserExpr.EMPTY
+            self.position += 1
+            operands = []
+            while TOKENS[self.kinds[self.position]] != Tokens.RBRA:
+                kind = ParserExpr.SEQ
+                operands.append((yield self._statement()))
+            self.position += 1
         else:
-            node = Node(ParserExpr.EXPR, operands=[self._expr()])
-            if self.lexer.translated_token != Tokens.SEMICOLON:
-                custom_raise(CustomException(f'";" expected at line {self.lexer.current_line_count}'))
-            self.lexer.next_token()
-        return node
+            kind = ParserExpr.EXPR
+            operands = [(yield self._expr())]
+            if TOKENS[self.kinds[self.position]] != Tokens.SEMICOLON:
+                custom_raise(CustomException(f'";" expected at line {self.lines[self.position]}'))
+            self.position += 1
+        return self._node(kind, None, operands, line)
 
-    def _paren_expr(self) -> Node:
-        if self.lexer.translated_token != Tokens.LPAR:
-            custom_raise(CustomException(f'"(" expected at line {self.lexer.current_line_count}'))
-        self.lexer.next_token()
-        node = self._statement()
-        if self.lexer.translated_token != Tokens.RPAR:
-            custom_raise(CustomException(f'")" expected at line {self.lexer.current_line_count}'))
-        self.lexer.next_token()
+    def _paren_expr(self) -> Frame:
+        if TOKENS[self.kinds[self.position]] != Tokens.LPAR:
+            custom_raise(CustomException(f'"(" expected at line {self.lines[self.position]}'))
+        self.position += 1
+        node = yield self._statement()
+        if TOKENS[self.kinds[self.position]] != Tokens.RPAR:
+            custom_raise(CustomException(f'")" expected at line {self.lines[self.position]}'))
+        self.position += 1
         return node
 
-    def _expr(self) -> Node:
-        if self.lexer.translated_token != Tokens.ID:
-            return self._test()
-        node = self._test()
-        if node.kind == ParserExpr.VAR and self.lexer.translated_token == Tokens.SET:
-            self.lexer.next_token()
-            node = Node(ParserExpr.SET, operands=[node, self._expr()])
-        return node
+    def _expr(self) -> Frame:
+        position = self.position
+        # token after ID is always there, the last one is EOF
+        if TOKENS[self.kinds[position]] != Tokens.ID or TOKENS[self.kinds[position + 1]] != Tokens.SET:
+            return (yield self._test())
+        node = self._node(ParserExpr.VAR, self.values[position])
+        self.position = position + 2
+        return self._node(ParserExpr.SET, None, [node, (yield self._expr())])
 
-    def _test(self) -> Node:
-        lexer_compare = {
-            Tokens.LESS: ParserExpr.LT,
-            Tokens.NON_EQUAL: ParserExpr.NON_EQUAL,
-            Tokens.EQUAL: ParserExpr.EQUAL
-        }
-        node = self._summa()
-        if self.lexer.translated_token in lexer_compare:
-            kind = lexer_compare[self.lexer.translated_token]
-            self.lexer.next_token()
-            node = Node(kind, operands=[node, self._summa()])
+    def _test(self) -> Frame:
+        node = yield self._summa()
+        token = TOKENS[self.kinds[self.position]]
+        if token in self.LEXER_COMPARE:
+            self.position += 1
+            node = self._node(self.LEXER_COMPARE[token], None, [node, (yield self._summa())])
         return node
 
-    def _summa(self) -> Node:
-        lexer_math = {
-            Tokens.PLUS: ParserExpr.ADD,
-            Tokens.MINUS: ParserExpr.SUB,
-            Tokens.MULT: ParserExpr.MULT,
-            Tokens.DIV: ParserExpr.DIV,
-        }
-        node = self._term()
-        while self.lexer.translated_token in lexer_math:
-            kind = lexer_math[self.lexer.translated_token]
-            self.lexer.next_token()
-            node = Node(kind, operands=[node, self._term()])
+    def _summa(self) -> Frame:
+        node = yield self._term()
+        token = TOKENS[self.kinds[self.position]]
+        while token in self.LEXER_MATH:
+            self.position += 1
+            node = self._node(self.LEXER_MATH[token], None, [node, (yield self._term())])
+            token = TOKENS[self.kinds[self.position]]
         return node
 
-    def _term(self) -> Node:
-        node = None
-        if self.lexer.translated_token == Tokens.ID:
-            node = Node(ParserExpr.VAR, self.lexer.value)
-            self.lexer.next_token()
-        elif self.lexer.translated_token == Tokens.GETS:
-            node = Node(ParserExpr.STDIN, self.lexer.value)
-            self.lexer.next_token()
-        elif self.lexer.translated_token in (Tokens.NUM, Tokens.STRING):
-            node = Node(ParserExpr.CONST, self.lexer.value)
-            self.lexer.next_token()
-        elif self.lexer.translated_token == Tokens.MARK:
-            node = Node(ParserExpr.MARK, self.lexer.value)
-            self.lexer.next_token()
-        if node is not None:
+    def _term(self) -> Frame:
+        token = TOKENS[self.kinds[self.position]]
+        if token in self.LEXER_TERMS:
+            node = self._node(self.LEXER_TERMS[token], self.values[self.position])
+            self.position += 1
             return node
-        else:
-            return self._paren_expr()
+        return (yield self._paren_expr())
 
     def _log(self, node) -> None:
-        self.logger_file.write(node.draw_tree())
+        node.dump(self.logger)
 
 
 if __name__ == '__main__':
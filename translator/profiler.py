@@ -0,0 +1,101 @@
+from collections import Counter
+from time import perf_counter
+from typing import Callable, Optional
+
+from translator.commands import Commands
+from translator.fast_dispatch import STOP, Handler
+
+
+class Profiler:
+    """
+    Opt-in profiling of VirtualMachine.run_fast: execution count and time of every address,
+    hits of every backward jump (loop). Counts of opcodes and source lines are derived from
+    addresses in report. VirtualMachine without profiler does not pay anything for it
+    """
+
+    __slots__ = 'clock', 'program', 'lines', 'counts', 'times', 'loops'
+
+    def __init__(self, lines: Optional[list[int]] = None, clock: Callable[[], float] = perf_counter):
+        self.clock = clock
+        self.program: list = []
+        # source line of every address of program (Compiler.lines), report shows addresses without it
+        self.lines = lines
+        self.counts: list[int] = []
+        self.times: list[float] = []
+        self.loops: Counter[tuple[int, int]] = Counter()
+
+    def run(self, program: list, code: list[Handler]) -> None:
+        # counters are kept in profiler before start, so they survive program stopped by error
+        self.program = program
+        self.counts = counts = [0] * len(program)
+        self.times = times = [0.0] * len(program)
+        loops = self.loops
+        clock = self.clock
+        address = 0
+        while address != STOP:
+            started = clock()
+            following = code[address]()
+            times[address] += clock() - started
+            counts[address] += 1
+            if following <= address and following != STOP:
+                loops[address, following] += 1
+            address = following
+
+    def line(self, address: int) -> int:
+        return self.lines[address] if self.lines else 0
+
+    def opcodes(self) -> list[tuple[Commands, int, float]]:
+        """
+        (command, executions, seconds) sorted by time
+        """
+        counts, times = Counter(), Counter()
+        for address, count in enumerate(self.counts):
+            if count:
+                counts[self.program[address]] += count
+                times[self.program[address]] += self.times[address]
+        return sorted(((command, counts[command], times[command]) for command in counts), key=lambda row: -row[2])
+
+    def hottest_lines(self, top: int = 10) -> list[tuple[int, int, float]]:
+        """
+        (source line, executed instructions, seconds) sorted by time
+        """
+        counts, times = Counter(), Counter()
+        for address, count in enumerate(self.counts):
+            if count:
+                line = self.line(address)
+                counts[line] += count
+                times[line] += self.times[address]
+        return sorted(((line, counts[line], times[line]) for line in counts), key=lambda row: -row[2])[:top]
+
+    def hottest_loops(self, top: int = 10) -> list[tuple[int, int, int, float, tuple[int, int]]]:
+        """
+        (jump address, loop start, hits, seconds inside loop body, (first line, last line)) sorted by hits
+        """
+        loops = []
+        for (jump, start), hits in self.loops.most_common(top):
+            body = range(start, jump + 1)
+            lines = [self.line(address) for address in body if self.counts[address] and self.line(address)]
+            loops.append((
+                jump, start, hits, sum(self.times[address] for address in body),
+                (min(lines), max(lines)) if lines else (0, 0),
+            ))
+        return loops
+
+    def report(self, top: int = 10) -> str:
+        total = sum(self.times) or 1.0
+        rows = [f'executed {sum(self.counts)} instructions in {sum(self.times):.6f} s\n', '\nopcodes:\n']
+        rows.extend(
+            f'  {command.name:<12}{count:>12}{seconds:>12.6f} s{seconds / total:>8.1%}\n'
+            for command, count, seconds in self.opcodes()
+        )
+        rows.append('\nhottest lines:\n')
+        rows.extend(
+            f'  line {line if line else "?":<6}{count:>12}{seconds:>12.6f} s{seconds / total:>8.1%}\n'
+            for line, count, seconds in self.hottest_lines(top)
+        )
+        rows.append('\nhottest loops:\n')
+        rows.extend(
+            f'  {start:>6} <- {jump:<6} lines {first}-{last}{hits:>12} hits{seconds:>12.6f} s{seconds / total:>8.1%}\n'
+            for jump, start, hits, seconds, (first, last) in self.hottest_loops(top)
+        )
+        return ''.join(rows)
@@ -0,0 +1,55 @@
+from hashlib import sha256
+from typing import Any, Iterable, Optional
+
+from translator import bytecode as bytecode_format
+from translator.commands import Operand, Slot, COMMAND_OPERANDS, SYSTEM_FUNCTIONS
+from translator.compiler import Compiler
+
+
+class Program:
+    """
+    Compiled program, which can be run many times by any VirtualMachine: bytecode, its constants,
+    names of variables, source lines and verified max stack depth. Immutable, as VirtualMachine
+    keeps code predecoded from it between runs. digest is hash of its bytecode, checkpoint keeps it
+    instead of the program
+    """
+
+    __slots__ = 'bytecode', 'constants', 'variables', 'lines', 'max_stack_depth', 'name', 'digest'
+
+    def __init__(self, bytecode: Iterable, lines: Iterable[int] = (), name: str = '<program>'):
+        bytecode = tuple(bytecode)
+        constants, variables = {}, {}
+        address = 0
+        while address < len(bytecode):
+            operands = COMMAND_OPERANDS.get(bytecode[address], ())
+            for offset, operand in enumerate(operands, start=1):
+                argument = bytecode[address + offset]
+                if operand == Operand.VALUE:
+                    constants.setdefault((type(argument), argument), argument)
+                elif operand == Operand.NAME and argument not in SYSTEM_FUNCTIONS:
+                    variables.setdefault(str(argument.name if isinstance(argument, Slot) else argument))
+            address += 1 + len(operands)
+
+        set_attribute = super().__setattr__
+        set_attribute('bytecode', bytecode)
+        set_attribute('constants', tuple(constants.values()))
+        set_attribute('variables', tuple(variables))
+        set_attribute('lines', tuple(lines))
+        set_attribute('max_stack_depth', Compiler.max_stack_depth(bytecode))
+        set_attribute('name', name)
+        set_attribute('digest', sha256(bytecode_format.encode(list(bytecode))).digest())
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f'Program is immutable, "{name}" can not be changed')
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f'Program is immutable, "{name}" can not be deleted')
+
+    def __len__(self) -> int:
+        return len(self.bytecode)
+
+    def line(self, address: int) -> Optional[int]:
+        return self.lines[address] if self.lines and self.lines[address] else None
+
+    def __repr__(self):
+        return f'Program({self.name!r}, {len(self.bytecode)} words, max stack depth {self.max_stack_depth})'
@@ -0,0 +1,111 @@
+from typing import Any, Union
+
+
+class Rope:
+    """
+    Lazy result of string concatenation. Parts are joined only when value is observed:
+    printed, compared, multiplied or added to something, which is not a string.
+    Any other operation works on joined string, so its errors are the same as for str.
+    Joined string is cached and parts are dropped
+    """
+
+    __slots__ = 'left', 'right', 'length'
+
+    def __init__(self, left: Union[str, 'Rope'], right: Union[str, 'Rope']):
+        self.left = left
+        self.right = right
+        self.length = len(left) + len(right)
+
+    def flatten(self) -> str:
+        if self.right is None:
+            return self.left
+
+        parts = []
+        pending = [self]
+        while pending:
+            part = pending.pop()
+            if type(part) is str:
+                parts.append(part)
+            elif part.right is None:
+                parts.append(part.left)
+            else:
+                pending.append(part.right)
+                pending.append(part.left)
+        self.left, self.right = ''.join(parts), None
+        return self.left
+
+    def __str__(self):
+        return self.flatten()
+
+    def __repr__(self):
+        return repr(self.flatten())
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.flatten(), format_spec)
+
+    def __len__(self):
+        return self.length
+
+    def __hash__(self):
+        return hash(self.flatten())
+
+    def __add__(self, other: Any):
+        if type(other) is str or type(other) is Rope:
+            return Rope(self, other)
+        return self.flatten() + other
+
+    def __radd__(self, other: Any):
+        if type(other) is str:
+            return Rope(other, self)
+        return other + self.flatten()
+
+    def __mul__(self, other: Any):
+        return self.flatten() * other
+
+    def __rmul__(self, other: Any):
+        return other * self.flatten()
+
+    # strings can not be subtracted or divided, joined string raises the same TypeError as str does
+
+    def __sub__(self, other: Any):
+        return self.flatten() - flatten(other)
+
+    def __rsub__(self, other: Any):
+        return other - self.flatten()
+
+    def __truediv__(self, other: Any):
+        return self.flatten() / flatten(other)
+
+    def __rtruediv__(self, other: Any):
+        return other / self.flatten()
+
+    def __eq__(self, other: Any):
+        if self is other:
+            return True
+        if type(other) is Rope:
+            return self.length == other.length and self.flatten() == other.flatten()
+        if type(other) is str:
+            return self.length == len(other) and self.flatten() == other
+        return NotImplemented
+
+    def __ne__(self, other: Any):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __lt__(self, other: Any):
+        return self.flatten() < flatten(other)
+
+    def __gt__(self, other: Any):
+        # called for other < rope, so error of not comparable values names them in that order
+        return flatten(other) < self.flatten()
+
+
+def concat(first: Any, second: Any) -> Any:
+    # two strings make rope, everything else is added as usual (Rope takes care of itself)
+    if type(first) is str and type(second) is str:
+        return Rope(first, second)
+    return first + second
+
+
+def flatten(value: Any) -> Any:
+    return value.flatten() if type(value) is Rope else value
@@ -1,12 +1,16 @@
+from typing import Iterable, Optional
+
 from translator.memalloc import MemoryAllocator
 from translator.sys_exceptions import CustomException, custom_raise
 
 
 class Collection:
-    __slots__ = '_elements', 'memory'
+    # handles of allocated memory are kept in the same order as elements
+    __slots__ = '_elements', '_handles', 'memory'
 
     def __init__(self, memory: MemoryAllocator):
         self._elements = []
+        self._handles: list[int] = []
         self.memory: MemoryAllocator = memory
 
     def __str__(self) -> str:
@@ -19,52 +23,277 @@ class Collection:
     def __len__(self) -> int:
         return len(self._elements)
 
+    def values(self) -> list:
+        # from the first pushed
+        return list(self._elements)
+
+    def clear(self) -> None:
+        for handle in self._handles:
+            self.memory.free(handle)
+        self._elements.clear()
+        self._handles.clear()
+
 
 class Stack(Collection):
     def push(self, element):
-        self.memory.allocate(element)
+        self._handles.append(self.memory.allocate(element))
         self._elements.append(element)
 
     def pop(self):
         self._out_of_elements_alert()
 
         element = self._elements.pop()
-        self.memory.free(element)
+        self.memory.free(self._handles.pop())
         return element
 
 
-class Deck(Collection):
+class FixedStack:
+    """
+    Operand stack of program with verified max depth. Memory for whole stack is accounted once,
+    push and pop are bound straight to list methods, as overflow and underflow can not happen
+    """
+
+    __slots__ = '_elements', '_handle', 'memory', 'capacity', 'push', 'pop'
+
+    def __init__(self, memory: MemoryAllocator, capacity: int):
+        self._elements = []
+        self.memory: MemoryAllocator = memory
+        self.capacity = capacity
+        self._handle = memory.allocate([None] * capacity)
+        self.push = self._elements.append
+        self.pop = self._elements.pop
+
+    def __str__(self) -> str:
+        return str(self._elements)
+
+    def __len__(self) -> int:
+        return len(self._elements)
+
+    def values(self) -> list:
+        return list(self._elements)
+
+    def reset(self) -> None:
+        # elements are dropped, memory of whole capacity stays for the next run
+        self._elements.clear()
+
+    def clear(self) -> None:
+        self._elements.clear()
+        if self._handle is not None:
+            self.memory.free(self._handle)
+            self._handle = None
+
+
+class ListDeck(Collection):
+    """
+    Deck over plain list: operations on the first element are O(n), kept to compare with Deck
+    """
+
     def push_first(self, element):
-        self.memory.allocate(element)
+        self._handles.insert(0, self.memory.allocate(element))
         self._elements.insert(0, element)
 
     def pop_first(self):
         self._out_of_elements_alert()
 
         element = self._elements.pop(0)
-        self.memory.free(element)
+        self.memory.free(self._handles.pop(0))
         return element
 
     def push_last(self, element):
-        self.memory.allocate(element)
+        self._handles.append(self.memory.allocate(element))
         self._elements.append(element)
 
     def pop_last(self):
         self._out_of_elements_alert()
 
         element = self._elements.pop()
-        self.memory.free(element)
+        self.memory.free(self._handles.pop())
         return element
 
 
-class Queue(Collection):
+class ListQueue(Collection):
+    """
+    Queue over plain list: pop is O(n), kept to compare with Queue
+    """
+
     def push(self, element):
-        self.memory.allocate(element)
+        self._handles.append(self.memory.allocate(element))
         self._elements.append(element)
 
     def pop(self):
         self._out_of_elements_alert()
 
         element = self._elements.pop(0)
-        self.memory.free(element)
+        self.memory.free(self._handles.pop(0))
         return element
+
+
+class RingCollection:
+    """
+    Elements in circular buffer, which doubles when full, so both ends are amortized O(1).
+    With capacity given, pushing into full collection is an error.
+    Each element keeps handle of its memory, elements added by one extend share one handle,
+    which is freed after the last of them is removed
+    """
+
+    MIN_BUFFER_SIZE = 8
+
+    __slots__ = '_elements', '_handles', '_batches', '_head', '_size', 'memory', 'capacity'
+
+    def __init__(self, memory: MemoryAllocator, capacity: Optional[int] = None):
+        if capacity is not None and capacity < 1:
+            custom_raise(CustomException('Capacity must be a positive number'))
+        self._elements: list = [None] * self.MIN_BUFFER_SIZE
+        self._handles: list[Optional[int]] = [None] * self.MIN_BUFFER_SIZE
+        # handle -> number of elements, which still use it
+        self._batches: dict[int, int] = {}
+        self._head = 0
+        self._size = 0
+        self.memory: MemoryAllocator = memory
+        self.capacity = capacity
+
+    def extend(self, elements: Iterable) -> None:
+        elements = list(elements)
+        if not elements:
+            return
+        self._reserve(len(elements))
+
+        handle = self.memory.allocate_many(elements)
+        self._batches[handle] = len(elements)
+        mask = len(self._elements) - 1
+        index = self._head + self._size
+        for element in elements:
+            self._elements[index & mask] = element
+            self._handles[index & mask] = handle
+            index += 1
+        self._size += len(elements)
+
+    def drain(self, count: Optional[int] = None) -> list:
+        """
+        Removes and returns up to count elements (all by default) from the beginning
+        """
+        if count is not None and count < 0:
+            custom_raise(CustomException('Count must not be negative'))
+        count = self._size if count is None else min(count, self._size)
+        mask = len(self._elements) - 1
+        drained = []
+        released: dict[int, int] = {}
+        for index in range(self._head, self._head + count):
+            drained.append(self._elements[index & mask])
+            handle = self._handles[index & mask]
+            released[handle] = released.get(handle, 0) + 1
+            self._elements[index & mask] = self._handles[index & mask] = None
+        self._head = (self._head + count) & mask
+        self._size -= count
+
+        for handle, used in released.items():
+            self._release(handle, used)
+        return drained
+
+    def clear(self) -> None:
+        self.drain()
+
+    def __iter__(self):
+        mask = len(self._elements) - 1
+        for index in range(self._head, self._head + self._size):
+            yield self._elements[index & mask]
+
+    def __str__(self) -> str:
+        return str(list(self))
+
+    def __len__(self) -> int:
+        return self._size
+
+    # PRIVATE
+
+    def _append(self, element) -> None:
+        self._reserve(1)
+        handle = self.memory.allocate(element)
+        self._batches[handle] = 1
+        index = (self._head + self._size) & (len(self._elements) - 1)
+        self._elements[index] = element
+        self._handles[index] = handle
+        self._size += 1
+
+    def _append_first(self, element) -> None:
+        self._reserve(1)
+        handle = self.memory.allocate(element)
+        self._batches[handle] = 1
+        self._head = (self._head - 1) & (len(self._elements) - 1)
+        self._elements[self._head] = element
+        self._handles[self._head] = handle
+        self._size += 1
+
+    def _pop_first(self):
+        self._out_of_elements_alert()
+
+        index = self._head
+        element, handle = self._elements[index], self._handles[index]
+        self._elements[index] = self._handles[index] = None
+        self._head = (index + 1) & (len(self._elements) - 1)
+        self._size -= 1
+        self._release(handle, 1)
+        return element
+
+    def _pop_last(self):
+        self._out_of_elements_alert()
+
+        index = (self._head + self._size - 1) & (len(self._elements) - 1)
+        element, handle = self._elements[index], self._handles[index]
+        self._elements[index] = self._handles[index] = None
+        self._size -= 1
+        self._release(handle, 1)
+        return element
+
+    def _release(self, handle: int, used: int) -> None:
+        remaining = self._batches[handle] - used
+        if remaining:
+            self._batches[handle] = remaining
+        else:
+            del self._batches[handle]
+            self.memory.free(handle)
+
+    def _reserve(self, count: int) -> None:
+        if self.capacity is not None and self._size + count > self.capacity:
+            custom_raise(CustomException('Collection is full'))
+        if self._size + count <= len(self._elements):
+            return
+
+        size = len(self._elements)
+        while size < self._size + count:
+            size *= 2
+        mask = len(self._elements) - 1
+        order = [index & mask for index in range(self._head, self._head + self._size)]
+        self._elements = [self._elements[index] for index in order] + [None] * (size - self._size)
+        self._handles = [self._handles[index] for index in order] + [None] * (size - self._size)
+        self._head = 0
+
+    def _out_of_elements_alert(self) -> None:
+        if not self._size:
+            custom_raise(CustomException('Collection out of elements'))
+
+
+class Deck(RingCollection):
+    __slots__ = ()
+
+    def push_first(self, element):
+        self._append_first(element)
+
+    def pop_first(self):
+        return self._pop_first()
+
+    def push_last(self, element):
+        self._append(element)
+
+    def pop_last(self):
+        return self._pop_last()
+
+
+class Queue(RingCollection):
+    __slots__ = ()
+
+    def push(self, element):
+        self._append(element)
+
+    def pop(self):
+        return self._pop_first()
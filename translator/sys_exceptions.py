@@ -1,3 +1,8 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, NamedTuple
+
+
 class CustomException:
     RED_COLOR = '\033[1;31m'
 
@@ -13,6 +18,51 @@ class CustomException:
         return f'{self.RED_COLOR}{is_invalid} {self.message}. finished with code {self.exit_code}'
 
 
+class ProgramExit(SystemExit):
+    """
+    Raised by custom_raise. Behaves as exit() with code of exception, but can be caught
+    with the exception itself, so one failed program does not stop the others
+    """
+
+    def __init__(self, exception: CustomException):
+        super().__init__(exception.exit_code)
+        self.exception = exception
+
+
+class ErrorReporting(NamedTuple):
+    # error messages are printed only when nobody is going to catch ProgramExit and report it
+    printed: bool = True
+    # called before error message is printed, so buffered program output comes first
+    flushes: tuple[Callable[[], None], ...] = ()
+
+
+# reporting of running execution. Context variable, so every thread and every asyncio task (session
+# of VirtualMachine.run_async) has its own, one session does not silence or flush the others
+REPORTING: ContextVar[ErrorReporting] = ContextVar('reporting', default=ErrorReporting())
+
+
+@contextmanager
+def reporting(errors: ErrorReporting):
+    token = REPORTING.set(errors)
+    try:
+        yield
+    finally:
+        REPORTING.reset(token)
+
+
+def flush_before_raise(flush: Callable[[], None]):
+    errors = REPORTING.get()
+    return reporting(errors._replace(flushes=errors.flushes + (flush,)))
+
+
+def errors_not_printed():
+    return reporting(REPORTING.get()._replace(printed=False))
+
+
 def custom_raise(exception: CustomException):
-    print(exception())
-    exit(exception.exit_code)
+    errors = REPORTING.get()
+    for flush in errors.flushes:
+        flush()
+    if errors.printed:
+        print(exception())
+    raise ProgramExit(exception)
@@ -0,0 +1,281 @@
+from collections import Counter
+from typing import Any, Callable, NamedTuple, Optional, TextIO, Union, TYPE_CHECKING
+
+from translator.channels import parse_value
+from translator.commands import Commands, Operand, Slot, STACK_EFFECTS
+from translator.compiler import Compiler
+from translator.fast_dispatch import FINISH_MESSAGE, STOP, UNDEFINED, Handler, variable_writer
+from translator.linker import Instruction, decode
+from translator.logger import Logger, LogLevel, as_logger
+from translator.transpiler import Transpiler, divide, fail, raise_value
+
+if TYPE_CHECKING:
+    from translator.virtual_machine import VirtualMachine
+
+
+# taken backward jumps to loop header before loop is compiled
+THRESHOLD = 100
+
+# failed guards after which compiled loop is dropped and loop stays in interpreter
+MAX_DEOPTS = 8
+
+STATS = 'tier_ups', 'rejected', 'entries', 'deopts', 'dropped'
+
+# function of compiled loop: address where interpreter continues, None when guard failed
+CompiledFunction = Callable[[], Optional[int]]
+
+
+class CompiledLoop(NamedTuple):
+    header: int
+    # address of the last backward jump to header
+    end: int
+    source: str
+
+
+class LoopTranspiler(Transpiler):
+    """
+    Transpiles loop (instructions from header to the last backward jump to it) into function loop(),
+    which works on state of VirtualMachine: variables are read to locals on entry and written back
+    on exit, jump out of loop returns address of target, values left on stack are pushed to
+    stack of VirtualMachine. Guard: loop() does nothing and returns None, when some variable of loop
+    is not defined yet, so interpreter raises the same error as without compilation
+    """
+
+    __slots__ = 'exit_address', 'variables', 'stored'
+
+    def __init__(self, log_to: Union[Logger, TextIO, None] = None):
+        super().__init__(log_to)
+        # address after the last instruction of loop
+        self.exit_address = STOP
+        # local of variable -> its name in program, for all variables of loop and for stored ones
+        self.variables: dict[str, Any] = {}
+        self.stored: dict[str, Any] = {}
+
+    def transpile_loop(self, instructions: list[Instruction], exit_address: int) -> Optional[str]:
+        """
+        None when loop can not be compiled: stack depth inside loop is not static
+        or loop takes values, which were on stack before header
+        """
+        depths = self.loop_depths(instructions)
+        if depths is None:
+            return None
+        blocks = self._split(instructions)
+        self.blocks_count = len(blocks)
+        self.index_of = {block[0]: index for index, block in enumerate(blocks)}
+        self.exit_address = exit_address
+        self._collect_variables(instructions)
+
+        self.lines = ['def loop():']
+        for local, name in self.variables.items():
+            if isinstance(name, Slot):
+                self._emit(1, f'{local} = slots[{int(name)}]')
+            else:
+                self._emit(1, f'{local} = get({name!r}, UNDEFINED)')
+        if self.variables:
+            self._emit(1, f'if {" or ".join(f"{local} is UNDEFINED" for local in self.variables)}:')
+            self._emit(2, 'return None')
+        self._emit(1, 'try:')
+        self._emit(2, 'block = 0')
+        self._emit(2, 'while True:')
+        self._dispatch_tree(blocks, depths, 0, len(blocks), 3)
+        self._emit(1, 'finally:')
+        for local in self.stored:
+            self._emit(2, f'store_{local}({local})')
+        if not self.stored:
+            self._emit(2, 'pass')
+        return '\n'.join(self.lines) + '\n'
+
+    @staticmethod
+    def loop_depths(instructions: list[Instruction]) -> Optional[dict[int, int]]:
+        """
+        Depth of operand stack before every instruction of loop, counted from depth at header
+        """
+        index_of = {instruction: index for index, instruction in enumerate(instructions)}
+        depths = {instructions[0]: 0}
+        pending = [instructions[0]]
+        while pending:
+            instruction = pending.pop()
+            if instruction.command not in STACK_EFFECTS:
+                return None
+            popped, pushed = STACK_EFFECTS[instruction.command]
+            depth = depths[instruction]
+            if popped > depth:
+                return None
+            depth += pushed - popped
+
+            successors = [] if instruction.target is None else [instruction.target]
+            index = index_of[instruction] + 1
+            if instruction.command not in Compiler.TERMINATORS and index < len(instructions):
+                successors.append(instructions[index])
+            for successor in successors:
+                if successor not in index_of:
+                    # exit, values on stack are pushed to VirtualMachine
+                    continue
+                if successor not in depths:
+                    depths[successor] = depth
+                    pending.append(successor)
+                elif depths[successor] != depth:
+                    return None
+        return {instruction.address: depth for instruction, depth in depths.items()}
+
+    # PRIVATE
+
+    def _collect_variables(self, instructions: list[Instruction]) -> None:
+        self.variables, self.stored = {}, {}
+        for instruction in instructions:
+            for operand, argument in zip(instruction.operands, instruction.arguments):
+                if operand != Operand.NAME:
+                    continue
+                if instruction.command in (Commands.STORE, Commands.STORE_POP, Commands.PUSH_STORE):
+                    local = self._variable_target(argument)
+                    self.stored.setdefault(local, argument)
+                else:
+                    # system functions are not variables, their FETCH fails
+                    local = self._variable(argument)
+                    if local is None:
+                        continue
+                self.variables.setdefault(local, argument)
+
+    def _go(self, target: Optional[Instruction], indent: int) -> None:
+        if target in self.index_of:
+            super()._go(target, indent)
+            return
+        # stack is materialized before every transfer of control
+        for position in range(len(self.entries)):
+            self._emit(indent, f'push(s{position})')
+        self._emit(indent, f'return {self.exit_address if target is None else target.address}')
+
+    def _finish(self, indent: int) -> None:
+        self._emit(indent, 'write(FINISH_MESSAGE)')
+        self._emit(indent, f'return {STOP}')
+
+
+class HotLoopCompiler:
+    """
+    Tiered execution of VirtualMachine.run_fast. Interpreter counts taken backward jumps of every
+    loop header, loop which crosses threshold is compiled by LoopTranspiler and its function replaces
+    handler of header. Loops, which can not be compiled or whose guard fails MAX_DEOPTS times,
+    stay in interpreter; cold code is never compiled. Statistics add up over runs
+    """
+
+    __slots__ = 'threshold', 'logger', 'stats', 'loops', 'suspended'
+
+    def __init__(self, threshold: int = THRESHOLD, log_to: Union[Logger, TextIO, None] = None):
+        self.threshold = threshold
+        self.logger = as_logger(log_to, 'virtual_machine')
+        self.stats: Counter[str] = Counter()
+        # header address -> loop compiled in the last installed program
+        self.loops: dict[int, CompiledLoop] = {}
+        # compiled loops are not entered while VirtualMachine counts instructions (run with max_steps)
+        self.suspended = False
+
+    def install(self, vm: 'VirtualMachine', program: list, code: list[Handler]) -> None:
+        """
+        Replaces handlers of backward jumps in predecoded code with counting ones
+        """
+        self.loops = {}
+        instructions = decode(program)
+        back_edges: dict[Instruction, list[Instruction]] = {}
+        for instruction in instructions:
+            if instruction.target is not None and instruction.target.address <= instruction.address:
+                back_edges.setdefault(instruction.target, []).append(instruction)
+        for header, jumps in back_edges.items():
+            self._count(vm, code, instructions, header, jumps)
+
+    def report(self) -> str:
+        rows = [f'tier-up threshold {self.threshold}: ' + ', '.join(f'{key} {self.stats[key]}' for key in STATS) + '\n']
+        rows.extend(
+            f'  loop {loop.header}..{loop.end}, {loop.source.count(chr(10))} lines of Python\n'
+            for loop in self.loops.values()
+        )
+        return ''.join(rows)
+
+    # PRIVATE
+
+    def _count(self, vm: 'VirtualMachine', code: list[Handler], instructions: list[Instruction],
+               header: Instruction, jumps: list[Instruction]) -> None:
+        header_address, threshold = header.address, self.threshold
+        originals = {jump.address: code[jump.address] for jump in jumps}
+        taken = 0
+
+        def counting(original: Handler) -> Handler:
+            def jump():
+                nonlocal taken
+                following = original()
+                if following == header_address:
+                    taken += 1
+                    if taken >= threshold:
+                        for address, handler in originals.items():
+                            code[address] = handler
+                        self._tier_up(vm, code, instructions, header, jumps)
+                return following
+            return jump
+
+        for address, original in originals.items():
+            code[address] = counting(original)
+
+    def _tier_up(self, vm: 'VirtualMachine', code: list[Handler], instructions: list[Instruction],
+                 header: Instruction, jumps: list[Instruction]) -> None:
+        start = instructions.index(header)
+        end = max(instructions.index(jump) for jump in jumps)
+        exit_address = instructions[end + 1].address if end + 1 < len(instructions) else STOP
+        transpiler = LoopTranspiler()
+        source = transpiler.transpile_loop(instructions[start:end + 1], exit_address)
+        loop = None
+        if source is not None:
+            try:
+                loop = self._load(vm, source, transpiler.stored)
+            except (SyntaxError, RecursionError):
+                loop = None
+        if loop is None:
+            self.stats['rejected'] += 1
+            self.logger.log(LogLevel.INFO, f'loop {header.address}..{jumps[-1].address} stays in interpreter\n')
+            return
+
+        self.stats['tier_ups'] += 1
+        self.loops[header.address] = CompiledLoop(header.address, instructions[end].address, source)
+        self.logger.log(
+            LogLevel.INFO,
+            f'loop {header.address}..{instructions[end].address} compiled, {transpiler.blocks_count} blocks\n',
+        )
+        code[header.address] = self._entry(code, header.address, loop)
+
+    def _load(self, vm: 'VirtualMachine', source: str, stored: dict[str, Any]) -> CompiledFunction:
+        namespace = {
+            'slots': vm.slots, 'get': vm.local_variables.get_or_default, 'UNDEFINED': UNDEFINED,
+            'push': vm.stack.push, 'pop': vm.stack.pop,
+            'read': vm.input_channel.read, 'interactive': vm.input_channel.interactive,
+            'write': vm.output_channel.write, 'flush': vm.output_channel.flush,
+            'parse_value': parse_value, 'FINISH_MESSAGE': FINISH_MESSAGE,
+            'divide': divide, 'fail': fail, 'raise_value': raise_value,
+        }
+        for local, name in stored.items():
+            namespace[f'store_{local}'] = variable_writer(vm, name)
+        exec(compile(source, '<loop>', 'exec'), namespace)
+        return namespace['loop']
+
+    def _entry(self, code: list[Handler], header_address: int, loop: CompiledFunction) -> Handler:
+        stats, interpreted = self.stats, code[header_address]
+        # trace of VirtualMachine shows instructions of interpreter, run of compiled loop is one line of it
+        traced = self.logger.is_enabled(LogLevel.TRACE)
+        deopts = 0
+
+        def enter():
+            nonlocal deopts
+            if self.suspended:
+                return interpreted()
+            following = loop()
+            if following is not None:
+                stats['entries'] += 1
+                if traced:
+                    self.logger.log(
+                        LogLevel.TRACE, f'Compiled loop {header_address} executed, continues at {following}\n'
+                    )
+                return following
+            stats['deopts'] += 1
+            deopts += 1
+            if deopts >= MAX_DEOPTS:
+                stats['dropped'] += 1
+                code[header_address] = interpreted
+            return interpreted()
+        return enter
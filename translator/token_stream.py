@@ -0,0 +1,71 @@
+from array import array
+from typing import Any, Iterator, Tuple
+
+from translator.lexer import BufferedLexer, Lexer, Tokens
+
+
+TOKENS = tuple(Tokens)
+
+
+class TokenBuffer:
+    """
+    All tokens of program, got from lexer at once. Token kinds and line numbers are stored in
+    parallel typed arrays, values of tokens are stored in side table of the same length
+    """
+
+    __slots__ = 'kinds', 'lines', 'values'
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.lines = array('I')
+        self.values: list[Any] = []
+
+    @classmethod
+    def tokenize(cls, lexer: Lexer) -> 'TokenBuffer':
+        buffer = cls()
+        if isinstance(lexer, BufferedLexer):
+            buffer.kinds, buffer.lines, buffer.values = lexer.tokenize_all()
+            return buffer
+        kinds, lines, values = buffer.kinds, buffer.lines, buffer.values
+        while lexer.translated_token != Tokens.EOF:
+            lexer.next_token()
+            kinds.append(lexer.translated_token.value)
+            lines.append(lexer.current_line_count)
+            values.append(lexer.value)
+        return buffer
+
+    def __iter__(self) -> Iterator[Tuple[Tokens, Any, int]]:
+        for kind, line, value in zip(self.kinds, self.lines, self.values):
+            yield TOKENS[kind], value, line
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+class TokenStream:
+    """
+    Tokens are read from Lexer only when Parser gets to them, as without TokenBuffer, so lexical
+    errors come in order of source. Parser indexes it as kinds array, value and line of token
+    are in buffer once its kind is read
+    """
+
+    __slots__ = 'lexer', 'buffer', 'values', 'lines'
+
+    def __init__(self, lexer: Lexer):
+        self.lexer = lexer
+        self.buffer = TokenBuffer()
+        self.values = self.buffer.values
+        self.lines = self.buffer.lines
+
+    @property
+    def kinds(self) -> 'TokenStream':
+        return self
+
+    def __getitem__(self, position: int) -> int:
+        kinds, lexer = self.buffer.kinds, self.lexer
+        while position >= len(kinds):
+            lexer.next_token()
+            kinds.append(lexer.translated_token.value)
+            self.lines.append(lexer.current_line_count)
+            self.values.append(lexer.value)
+        return kinds[position]
@@ -0,0 +1,420 @@
+import math
+import re
+from typing import Any, Callable, Optional, TextIO, Union
+
+from translator.channels import InputChannel, OutputChannel
+from translator.commands import Commands, Slot, SYSTEM_FUNCTIONS
+from translator.compiler import Compiler
+from translator.linker import Instruction, decode, jump_targets
+from translator.logger import Logger, LogLevel, as_logger
+from translator.sys_exceptions import CustomException, custom_raise, flush_before_raise
+
+
+# transpiled program: run(read, write, interactive, flush)
+TranspiledProgram = Callable[..., None]
+
+
+def divide(first, second):
+    # DIV of VirtualMachine: error on zero, whole results become int
+    if second == 0:
+        custom_raise(CustomException('division by zero detected'))
+    result = first / second
+    return int(result) if int(result) == result else result
+
+
+def fail(message: str, exit_code: int = 1) -> None:
+    custom_raise(CustomException(message, exit_code))
+
+
+def raise_value(value) -> None:
+    fail(f'raised an exception: "{value}"', 2)
+
+
+def not_found(error: NameError) -> None:
+    # variables are locals of transpiled function, reading one before STORE or without any STORE fails
+    name = re.search(r"'v_(\w+)'", str(error))
+    fail(f'No id: "{name.group(1) if name else error}" found')
+
+
+def execute(run: TranspiledProgram, input_channel: InputChannel, output_channel: OutputChannel) -> None:
+    with flush_before_raise(output_channel.flush):
+        try:
+            run(input_channel.read, output_channel.write, input_channel.interactive, output_channel.flush)
+        finally:
+            output_channel.flush()
+
+
+def load(source: str, name: str = '<transpiled>') -> TranspiledProgram:
+    namespace: dict[str, Any] = {'__name__': name}
+    exec(compile(source, name, 'exec'), namespace)
+    return namespace['run']
+
+
+def dump(source: str, file_name: str) -> None:
+    with open(file_name, 'w') as file:
+        file.write(source)
+
+
+class Entry:
+    """
+    Value on operand stack while block is transpiled: Python expression, which is evaluated
+    only when value is used or must be stored in local of its stack position
+    """
+
+    __slots__ = 'code', 'pure', 'depth', 'condition'
+
+    def __init__(self, code: str, pure: bool, depth: int = 0, condition: Optional[str] = None):
+        self.code = code
+        # constants and stack locals can be evaluated at any moment, reads of variables can fail
+        self.pure = pure
+        # nesting of expression, deep expressions are stored to locals to keep Python compiler happy
+        self.depth = depth
+        # for comparisons: condition, which is true when value is 1
+        self.condition = condition
+
+
+class Transpiler:
+    """
+    Ahead-of-time backend: program of Commands becomes Python module with function
+    run(read, write, interactive, flush). Program is split into basic blocks, which are chosen
+    by binary tree of ifs in while loop. Variables are Python locals. When stack depth of every
+    instruction is known (Compiler.stack_depths), stack cells are locals s0, s1, ... and most
+    of them are folded into expressions, otherwise list is used as stack
+    """
+
+    BINARY_TEMPLATES = {
+        Commands.ADD: '({a} + {b})',
+        Commands.SUB: '({a} - {b})',
+        # VirtualMachine multiplies the top of stack by the value under it
+        Commands.MULT: '({b} * {a})',
+        Commands.DIV: 'divide({a}, {b})',
+    }
+
+    CONDITION_TEMPLATES = {
+        Commands.LT: '{a} < {b}',
+        Commands.NON_EQUAL: '{a} != {b}',
+        Commands.EQUAL: '{a} == {b}',
+    }
+
+    CONDITIONAL_JUMPS = {Commands.JZ, Commands.JNZ, Commands.CMP_JZ, Commands.CMP_JNZ}
+
+    TERMINATORS = Compiler.TERMINATORS
+
+    MAX_EXPRESSION_DEPTH = 16
+
+    __slots__ = 'logger', 'lines', 'entries', 'blocks_count', 'index_of'
+
+    def __init__(self, log_to: Union[Logger, TextIO, None] = None):
+        self.logger = as_logger(log_to, 'transpiler')
+        self.lines: list[str] = []
+        self.entries: list[Entry] = []
+        self.blocks_count = 0
+        # first instruction of block -> index of block
+        self.index_of: dict[Instruction, int] = {}
+
+    def transpile(self, program: list, name: str = '<program>') -> str:
+        instructions = decode(program)
+        depths = Compiler.stack_depths(program)
+        blocks = self._split(instructions)
+        self.blocks_count = len(blocks)
+        self.index_of = {block[0]: index for index, block in enumerate(blocks)}
+
+        self.lines = [
+            '"""',
+            f'Transpiled from {name} by translator.transpiler, change the program and transpile it again',
+            '"""',
+            'from translator.channels import parse_value',
+            'from translator.fast_dispatch import FINISH_MESSAGE',
+            'from translator.transpiler import divide, fail, not_found, raise_value',
+            '',
+            '',
+            'def run(read, write, interactive=False, flush=None):',
+        ]
+        if depths is None:
+            self.lines.append('    stack = []')
+            self.lines.append('    push, pop = stack.append, stack.pop')
+        self.lines.append('    block = 0')
+        self.lines.append('    try:')
+        self.lines.append('        while True:')
+        self._dispatch_tree(blocks, depths, 0, len(blocks), 3)
+        self.lines.append('    except NameError as error:')
+        self.lines.append('        not_found(error)')
+        if depths is None:
+            self.lines.append('    except IndexError:')
+            self.lines.append("        fail('Collection out of elements')")
+
+        if self.logger.is_enabled(LogLevel.INFO):
+            mode = 'stack in locals' if depths is not None else 'stack in list'
+            self.logger.log(
+                LogLevel.INFO, f'transpiled {len(instructions)} instructions, {len(blocks)} blocks, {mode}\n'
+            )
+        return '\n'.join(self.lines) + '\n'
+
+    # PRIVATE
+
+    def _split(self, instructions: list[Instruction]) -> list[list[Instruction]]:
+        # block starts at the first instruction, at jump targets and after jumps and terminators
+        leaders = jump_targets(instructions)
+        blocks = []
+        for index, instruction in enumerate(instructions):
+            if not blocks or instruction in leaders:
+                blocks.append([])
+            blocks[-1].append(instruction)
+            if (instruction.is_jump or instruction.command in self.TERMINATORS) and index + 1 < len(instructions):
+                leaders.add(instructions[index + 1])
+        return blocks
+
+    def _dispatch_tree(self, blocks, depths, low: int, high: int, indent: int) -> None:
+        if high - low == 1:
+            following = blocks[low + 1][0] if low + 1 < len(blocks) else None
+            self._block(blocks[low], depths, following, indent)
+            return
+        middle = (low + high) // 2
+        self._emit(indent, f'if block < {middle}:')
+        self._dispatch_tree(blocks, depths, low, middle, indent + 1)
+        self._emit(indent, 'else:')
+        self._dispatch_tree(blocks, depths, middle, high, indent + 1)
+
+    def _emit(self, indent: int, line: str) -> None:
+        self.lines.append('    ' * indent + line)
+
+    def _block(self, block: list[Instruction], depths, following: Optional[Instruction], indent: int) -> None:
+        static = depths is not None
+        if static:
+            if block[0].address not in depths:
+                # unreachable, never dispatched
+                self._emit(indent, 'pass')
+                return
+            self.entries = [Entry(f's{position}', True) for position in range(depths[block[0].address])]
+        for instruction in block:
+            finished = (self._static if static else self._dynamic)(instruction, following, indent)
+            if finished:
+                return
+        if static:
+            self._materialize(len(self.entries), indent)
+        self._go(following, indent)
+
+    # static stack: entries are Python expressions, cells are locals s0, s1, ...
+
+    def _static(self, instruction: Instruction, following: Optional[Instruction], indent: int) -> bool:
+        command, arguments = instruction.command, instruction.arguments
+        if command == Commands.PUSH:
+            self._push(Entry(self._constant(arguments[0]), True))
+        elif command == Commands.FETCH:
+            if self._variable(arguments[0]) is None:
+                self._materialize(len(self.entries), indent)
+                self._system_function(arguments[0], indent)
+                return True
+            self._push(Entry(self._variable(arguments[0]), False))
+        elif command in (Commands.STORE, Commands.STORE_POP):
+            value = self._pop(indent)
+            self._emit(indent, f'{self._variable_target(arguments[0])} = {value.code}')
+        elif command == Commands.PUSH_STORE:
+            self._materialize(len(self.entries), indent)
+            self._emit(indent, f'{self._variable_target(arguments[1])} = {self._constant(arguments[0])}')
+        elif command == Commands.POP:
+            pass
+        elif command in self.BINARY_TEMPLATES or command in self.CONDITION_TEMPLATES:
+            self._binary(command, indent)
+        elif command == Commands.FETCH2:
+            first, second, operation = arguments
+            for name in (first, second):
+                if self._variable(name) is None:
+                    self._materialize(len(self.entries), indent)
+                    self._system_function(name, indent)
+                    return True
+                self._push(Entry(self._variable(name), False))
+            self._binary(operation, indent)
+        elif command == Commands.OUTPUT:
+            self._emit(indent, f'write({self._pop(indent).code})')
+        elif command == Commands.INPUT:
+            self._pop(indent, evaluate=True)
+            self._materialize(len(self.entries), indent)
+            self._emit(indent, 'if interactive:')
+            self._emit(indent + 1, 'flush()')
+            position = len(self.entries)
+            self._emit(indent, f's{position} = parse_value(read())')
+            self.entries.append(Entry(f's{position}', True))
+        elif command in (Commands.JZ, Commands.JNZ, Commands.CMP_JZ, Commands.CMP_JNZ):
+            if command in (Commands.CMP_JZ, Commands.CMP_JNZ):
+                self._binary(arguments[0], indent)
+            value = self._pop(indent)
+            self._materialize(len(self.entries), indent)
+            condition = value.condition if value.condition is not None else f'{value.code} != 0'
+            self._branch(command, condition, instruction.target, following, indent)
+            return True
+        elif command == Commands.JMP:
+            self._materialize(len(self.entries), indent)
+            if instruction.target is None:
+                self._emit(indent, "fail('Failed jump. Check if marks correct')")
+            else:
+                self._go(instruction.target, indent)
+            return True
+        elif command == Commands.RAISE:
+            value = self._pop(indent)
+            self._emit(indent, f'raise_value({value.code})')
+            return True
+        elif command == Commands.FINISH:
+            self._materialize(len(self.entries), indent)
+            self._finish(indent)
+            return True
+        else:
+            self._materialize(len(self.entries), indent)
+            self._emit(indent, f"fail('Unknown command {command}')")
+            return True
+        return False
+
+    def _push(self, entry: Entry) -> None:
+        self.entries.append(entry)
+
+    def _pop(self, indent: int, evaluate: bool = False) -> Entry:
+        # values under the top were calculated before it, so they are stored first
+        entry = self.entries.pop()
+        self._materialize(len(self.entries), indent)
+        if evaluate and not entry.pure:
+            self._emit(indent, entry.code)
+        return entry
+
+    def _binary(self, command: Commands, indent: int) -> None:
+        second, first = self.entries.pop(), self.entries.pop()
+        if command == Commands.MULT and not (first.pure and second.pure):
+            # Python evaluates left operand first, MULT has them reversed, so they are read beforehand
+            self.entries.extend((first, second))
+            self._materialize(len(self.entries), indent)
+            second, first = self.entries.pop(), self.entries.pop()
+
+        values = {'a': first.code, 'b': second.code}
+        depth = max(first.depth, second.depth) + 1
+        if command in self.CONDITION_TEMPLATES:
+            condition = self.CONDITION_TEMPLATES[command].format(**values)
+            entry = Entry(f'(1 if {condition} else 0)', False, depth, condition)
+        else:
+            entry = Entry(self.BINARY_TEMPLATES[command].format(**values), False, depth)
+        self.entries.append(entry)
+        if depth >= self.MAX_EXPRESSION_DEPTH:
+            self._materialize(len(self.entries), indent)
+
+    def _materialize(self, count: int, indent: int) -> None:
+        # the first count entries are stored to locals of their positions, from the bottom up
+        for position in range(count):
+            entry = self.entries[position]
+            cell = f's{position}'
+            if entry.code != cell:
+                self._emit(indent, f'{cell} = {entry.code}')
+                self.entries[position] = Entry(cell, True)
+
+    def _system_function(self, name, indent: int) -> None:
+        self._emit(indent, f"fail('invalid operation. \"{name}\" is a system functions. finished with code 1')")
+
+    # dynamic stack: every command works with list, as in VirtualMachine
+
+    def _dynamic(self, instruction: Instruction, following: Optional[Instruction], indent: int) -> bool:
+        command, arguments = instruction.command, instruction.arguments
+        if command == Commands.PUSH:
+            self._emit(indent, f'push({self._constant(arguments[0])})')
+        elif command == Commands.FETCH:
+            if self._variable(arguments[0]) is None:
+                self._system_function(arguments[0], indent)
+                return True
+            self._emit(indent, f'push({self._variable(arguments[0])})')
+        elif command in (Commands.STORE, Commands.STORE_POP):
+            self._emit(indent, f'{self._variable_target(arguments[0])} = pop()')
+        elif command == Commands.PUSH_STORE:
+            self._emit(indent, f'{self._variable_target(arguments[1])} = {self._constant(arguments[0])}')
+        elif command == Commands.POP:
+            pass
+        elif command in self.BINARY_TEMPLATES or command in self.CONDITION_TEMPLATES:
+            self._emit(indent, 'b = pop()')
+            self._emit(indent, f'push({self._dynamic_operation(command, "pop()", "b")})')
+        elif command == Commands.FETCH2:
+            first, second, operation = arguments
+            for name in (first, second):
+                if self._variable(name) is None:
+                    self._system_function(name, indent)
+                    return True
+            self._emit(indent, f'a = {self._variable(first)}')
+            self._emit(indent, f'push({self._dynamic_operation(operation, "a", self._variable(second))})')
+        elif command == Commands.OUTPUT:
+            self._emit(indent, 'write(pop())')
+        elif command == Commands.INPUT:
+            self._emit(indent, 'if interactive:')
+            self._emit(indent + 1, 'flush()')
+            self._emit(indent, 'value = parse_value(read())')
+            self._emit(indent, 'pop()')
+            self._emit(indent, 'push(value)')
+        elif command in (Commands.JZ, Commands.JNZ, Commands.CMP_JZ, Commands.CMP_JNZ):
+            if command in (Commands.CMP_JZ, Commands.CMP_JNZ):
+                self._emit(indent, 'b = pop()')
+                condition = self.CONDITION_TEMPLATES[arguments[0]].format(a='pop()', b='b')
+            else:
+                condition = 'pop() != 0'
+            self._branch(command, condition, instruction.target, following, indent)
+            return True
+        elif command == Commands.JMP:
+            if instruction.target is None:
+                self._emit(indent, "fail('Failed jump. Check if marks correct')")
+            else:
+                self._go(instruction.target, indent)
+            return True
+        elif command == Commands.RAISE:
+            self._emit(indent, 'raise_value(pop())')
+            return True
+        elif command == Commands.FINISH:
+            self._finish(indent)
+            return True
+        else:
+            self._emit(indent, f"fail('Unknown command {command}')")
+            return True
+        return False
+
+    def _dynamic_operation(self, command: Commands, first: str, second: str) -> str:
+        if command in self.CONDITION_TEMPLATES:
+            return f'(1 if {self.CONDITION_TEMPLATES[command].format(a=first, b=second)} else 0)'
+        if command == Commands.MULT:
+            # VirtualMachine multiplies the top of stack by the value under it
+            return f'({second} * {first})'
+        return self.BINARY_TEMPLATES[command].format(a=first, b=second)
+
+    # transfers of control
+
+    def _branch(self, command: Commands, condition: str, target: Instruction, following: Optional[Instruction],
+                indent: int) -> None:
+        # condition is true when value on stack is not zero
+        taken, not_taken = (target, following) if command in (Commands.JNZ, Commands.CMP_JNZ) else (following, target)
+        if taken in self.index_of and not_taken in self.index_of:
+            self._emit(indent, f'block = {self.index_of[taken]} if {condition} else {self.index_of[not_taken]}')
+            return
+        self._emit(indent, f'if {condition}:')
+        self._go(taken, indent + 1)
+        self._emit(indent, 'else:')
+        self._go(not_taken, indent + 1)
+
+    def _go(self, target: Optional[Instruction], indent: int) -> None:
+        # target is None after the last instruction, VirtualMachine would run out of program
+        if target is None:
+            self._emit(indent, "fail('Program ended without FINISH')")
+        else:
+            self._emit(indent, f'block = {self.index_of[target]}')
+
+    def _finish(self, indent: int) -> None:
+        self._emit(indent, 'write(FINISH_MESSAGE)')
+        self._emit(indent, 'return')
+
+    # names and values
+
+    @staticmethod
+    def _variable(name) -> Optional[str]:
+        if not isinstance(name, Slot) and name in SYSTEM_FUNCTIONS:
+            return None
+        return f'v_{name.name if isinstance(name, Slot) else name}'
+
+    @staticmethod
+    def _variable_target(name) -> str:
+        # STORE does not check system names, value is kept under that name as in VirtualMachine
+        return f'v_{name.name if isinstance(name, Slot) else name}'
+
+    @staticmethod
+    def _constant(value) -> str:
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"float('{value}')"
+        return repr(value)
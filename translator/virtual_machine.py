@@ -1,27 +1,363 @@
-from typing import TextIO
+import asyncio
+import sys
+from contextlib import contextmanager
+from inspect import isawaitable
+from typing import Iterable, NamedTuple, Optional, TextIO, Union
 
-from translator.compiler import Commands
-from translator.hash_table import HashTable
+from translator.channels import (
+    ConsoleInput, ConsoleOutput, InputChannel, MemoryOutput, OutputChannel, ScriptedInput, parse_value,
+)
+from translator.checkpoint import Checkpoint
+from translator.commands import Commands, Slot, SYSTEM_FUNCTIONS
+from translator.fast_dispatch import FINISH_MESSAGE, STOP, UNDEFINED, Handler, predecode, variable_writer
+from translator.hash_table import CompactHashTable
+from translator.linker import decode
+from translator.logger import Logger, LogLevel, as_logger
 from translator.memalloc import MemoryAllocator
-from translator.stack_deck_queue import Stack
-from translator.sys_exceptions import CustomException, custom_raise
+from translator.profiler import Profiler
+from translator.program import Program
+from translator.rope import Rope, concat
+from translator.stack_deck_queue import FixedStack, Stack
+from translator.sys_exceptions import CustomException, ProgramExit, custom_raise, errors_not_printed, flush_before_raise
+from translator.tiering import HotLoopCompiler
+
+
+# instructions run_async executes before it lets other tasks of event loop run
+INSTRUCTION_BUDGET = 1000
+
+# handlers of INPUT in run_async return address below it: -2 - address of the next instruction
+INPUT_REQUEST = -2
+
+
+class Execution(NamedTuple):
+    # printed values, without message of FINISH
+    outputs: list[str]
+    exit_code: int
+    error: Optional[str]
+    # state of program stopped by max_steps, continued by VirtualMachine.resume
+    checkpoint: Optional[Checkpoint] = None
 
 
 class VirtualMachine:
-    __slots__ = 'logger_file', 'local_variables', 'stack'
+    __slots__ = (
+        'logger', 'local_variables', 'stack', 'slots', 'slot_names', 'slot_handles', 'slots_handle',
+        'input_channel', 'output_channel', 'program_input', 'program_output', 'profiler', 'tiering',
+        'program', 'code', 'reserved_handle',
+    )
 
-    SYSTEM_FUNCTIONS = ['puts', 'gets', 'raise']
+    SYSTEM_FUNCTIONS = SYSTEM_FUNCTIONS
 
-    def __init__(self, memory_allocator: MemoryAllocator, log_to: TextIO):
-        self.logger_file = log_to
-        self.local_variables: HashTable = HashTable(memory_allocator)
+    def __init__(self, memory_allocator: MemoryAllocator, log_to: Union[Logger, TextIO, None],
+                 input_channel: Optional[InputChannel] = None, output_channel: Optional[OutputChannel] = None,
+                 profiler: Optional[Profiler] = None, tiering: Optional[HotLoopCompiler] = None):
+        self.logger = as_logger(log_to, 'virtual_machine')
+        # collects counters in run_fast, run is reference implementation and is never profiled
+        self.profiler = profiler
+        # compiles hot loops of run_fast, off while profiling, so every instruction is counted.
+        # Trace shows instructions which stay in interpreter and every run of compiled loop
+        self.tiering = tiering
+        self.input_channel = ConsoleInput() if input_channel is None else input_channel
+        self.output_channel = ConsoleOutput() if output_channel is None else output_channel
+        # executions of Program read given inputs and return outputs, channels above stay for run_fast and run
+        self.program_input = ScriptedInput(())
+        self.program_output = MemoryOutput()
+        self.local_variables = CompactHashTable(memory_allocator)
         self.stack = Stack(memory_allocator)
+        self.slots: list = []
+        self.slot_names: list[str] = []
+        self.slot_handles: list[Optional[int]] = []
+        self.slots_handle: Optional[int] = None
+        # Program loaded by load and its predecoded code
+        self.program: Optional[Program] = None
+        self.code: list[Handler] = []
+        # memory reserved by resume, so accounting matches checkpoint
+        self.reserved_handle: Optional[int] = None
+
+    def load(self, program: Program) -> None:
+        """
+        Predecodes program once, next runs of the same program only reset state of VirtualMachine.
+        Loaded program reads input from program_input and collects output in program_output,
+        input and output channels of VirtualMachine are not changed
+        """
+        self._release_reserved()
+        self._prepare_stack(program.max_stack_depth)
+        self.local_variables.clear()
+        with self._program_channels():
+            self.code = predecode(self, program.bytecode)
+            self._tier(program.bytecode, self.code)
+        self.program = program
+
+    def reset(self) -> None:
+        """
+        Drops values left by previous run. Stack, table of variables and slots stay allocated
+        and keep their size, so predecoded code is still bound to them
+        """
+        self._release_reserved()
+        if isinstance(self.stack, FixedStack):
+            self.stack.reset()
+        else:
+            self.stack.clear()
+        self.local_variables.clear()
+        memory = self.local_variables.memory
+        for index, handle in enumerate(self.slot_handles):
+            if handle is not None:
+                memory.free(handle)
+                self.slot_handles[index] = None
+            self.slots[index] = UNDEFINED
+
+    def run_fast(self, program: list, max_stack_depth: Optional[int] = None) -> None:
+        self._prepare_stack(max_stack_depth)
+        code = predecode(self, program)
+        self._tier(program, code)
+        with flush_before_raise(self.output_channel.flush):
+            try:
+                self._dispatch(program, code)
+            finally:
+                self.output_channel.flush()
+
+    def run(self, program: list, max_stack_depth: Optional[int] = None) -> None:
+        """
+        Reference implementation, runs list on channels of VirtualMachine and prints.
+        With max_stack_depth given (Compiler.max_stack_depth) operand stack is preallocated and not checked
+        """
+        self._prepare_stack(max_stack_depth)
+        with flush_before_raise(self.output_channel.flush):
+            try:
+                self._interpret(program)
+            finally:
+                self.output_channel.flush()
+
+    def execute(self, program: Program, inputs: Iterable[str] = (), max_steps: Optional[int] = None) -> Execution:
+        """
+        Program is run on code predecoded by load, with given input lines, and its outputs and exit code
+        are returned instead of being printed. With max_steps Program, which does not finish in so many
+        instructions, is suspended: outputs so far are returned with checkpoint of its state
+        (hot loops are interpreted then, so every instruction is counted)
+        """
+        if not isinstance(program, Program):
+            raise ValueError(f'execute runs Program, got {type(program).__name__}, list is run by run or run_fast')
+        self._start(program)
+        self.program_input.feed(inputs)
+        return self._execute(program, 0, 0, max_steps)
+
+    def resume(self, checkpoint: Checkpoint, program: Program, inputs: Optional[Iterable[str]] = None,
+               max_steps: Optional[int] = None) -> Execution:
+        """
+        Continues program suspended by execute(..., max_steps=N), in this or other process
+        (checkpoint.load). Checkpoint keeps only digest of program, so the same Program is given again.
+        Without inputs unread lines given to previous run are read.
+        Free memory of allocator is brought down to free memory of checkpoint
+        """
+        if program.digest != checkpoint.program:
+            raise ValueError(f'checkpoint is not made by {program!r}')
+        self._start(program)
+        if inputs is not None:
+            self.program_input.feed(inputs)
+
+        slot_indexes = {name: index for index, name in enumerate(self.slot_names) if name is not None}
+        for name, value in checkpoint.variables.items():
+            if name in slot_indexes:
+                variable_writer(self, Slot(slot_indexes[name], name))(value)
+            else:
+                self.local_variables.set_pair(name, value)
+        for value in checkpoint.stack:
+            self.stack.push(value)
+        memory = self.local_variables.memory
+        if memory.memory_size > checkpoint.memory_free:
+            self.reserved_handle = memory.reserve(memory.memory_size - checkpoint.memory_free)
+        return self._execute(program, checkpoint.address, checkpoint.steps, max_steps)
+
+    async def run_async(self, program: Union[list, Program], max_stack_depth: Optional[int] = None,
+                        budget: int = INSTRUCTION_BUDGET) -> Execution:
+        """
+        Runs program as coroutine, so one event loop serves many programs: gets awaits read of input
+        channel when it is awaitable (QueueInput) and other tasks get control after every budget
+        instructions. Errors are returned in Execution as by execute, outputs only with MemoryOutput.
+        Hot loops are not compiled here, compiled loop can not wait for input
+        """
+        if budget < 1:
+            raise ValueError(f'budget must be a positive number, got {budget}')
+        if isinstance(program, Program):
+            program, max_stack_depth = program.bytecode, program.max_stack_depth
+        self._prepare_stack(max_stack_depth)
+        self.local_variables.clear()
+        code = predecode(self, program)
+        for instruction in decode(program):
+            if instruction.command == Commands.INPUT:
+                code[instruction.address] = self._input_request(instruction.address + 1)
+
+        exit_code, error = 0, None
+        with errors_not_printed():
+            try:
+                await self._dispatch_async(code, budget)
+            except ProgramExit as stop:
+                exit_code, error = stop.exception.exit_code, stop.exception.message
+            except (TypeError, ValueError, ArithmeticError) as failure:
+                exit_code, error = 1, f'{type(failure).__name__}: {failure}'
+            finally:
+                self.output_channel.flush()
+        return self._execution(exit_code, error)
+
+    @property
+    def variables(self) -> dict:
+        variables = {str(key): value for key, value in self.local_variables.pairs}
+        for name, value in zip(self.slot_names, self.slots):
+            if value is not UNDEFINED:
+                variables[name] = value
+        return variables
+
+    def fetch(self, name):
+        if name in self.SYSTEM_FUNCTIONS:
+            custom_raise(
+                CustomException(
+                    f'invalid operation. "{name}" is a system functions. finished with code 1'
+                )
+            )
+        return self.local_variables.get(name)
+
+    def calculate(self, command: Commands, first, second):
+        if command == Commands.ADD:
+            return concat(first, second)
+        if command == Commands.SUB:
+            return first - second
+        if command == Commands.MULT:
+            return second * first
+        if command == Commands.DIV:
+            if second == 0:
+                custom_raise(CustomException('division by zero detected'))
+            result = first / second
+            return int(result) if int(result) == result else result
+        if command == Commands.LT:
+            return 1 if first < second else 0
+        if command == Commands.NON_EQUAL:
+            return 1 if first != second else 0
+        return 1 if first == second else 0
+
+    def log(self, instruction):
+        self.logger.log(LogLevel.TRACE, f'Currently {instruction} executing\n')
 
-    def run(self, program: list) -> None:
+    # PRIVATE
+
+    def _dispatch(self, program: list, code: list) -> None:
+        address = 0
+        if self.profiler is not None:
+            self.profiler.run(program, code)
+        elif self.logger.is_enabled(LogLevel.TRACE):
+            while address != STOP:
+                self.log(program[address])
+                address = code[address]()
+        else:
+            while address != STOP:
+                address = code[address]()
+
+    def _start(self, program: Program) -> None:
+        if program is self.program:
+            self.reset()
+        else:
+            self.load(program)
+
+    @contextmanager
+    def _program_channels(self):
+        # handlers of loaded program and its compiled loops are bound to channels of VirtualMachine
+        channels = self.input_channel, self.output_channel
+        self.input_channel, self.output_channel = self.program_input, self.program_output
+        try:
+            yield
+        finally:
+            self.input_channel, self.output_channel = channels
+
+    def _execute(self, program: Program, address: int, steps: int, max_steps: Optional[int]) -> Execution:
+        exit_code, error, checkpoint = 0, None, None
+        with self._program_channels(), errors_not_printed():
+            try:
+                if address == 0 and max_steps is None:
+                    self._dispatch(program.bytecode, self.code)
+                elif max_steps is None:
+                    self._dispatch_steps(address, sys.maxsize)
+                else:
+                    address, executed = self._counted_steps(address, max_steps)
+                    if address != STOP:
+                        checkpoint = self._checkpoint(address, steps + executed)
+            except ProgramExit as stop:
+                exit_code, error = stop.exception.exit_code, stop.exception.message
+            except (TypeError, ValueError, ArithmeticError) as failure:
+                # operations on values of wrong types, language does not check them before
+                exit_code, error = 1, f'{type(failure).__name__}: {failure}'
+            return self._execution(exit_code, error, checkpoint)
+
+    def _execution(self, exit_code: int, error: Optional[str], checkpoint: Optional[Checkpoint] = None) -> Execution:
+        if not isinstance(self.output_channel, MemoryOutput):
+            return Execution([], exit_code, error, checkpoint)
+        outputs, self.output_channel.lines = self.output_channel.lines, []
+        if exit_code == 0 and outputs and outputs[-1] == FINISH_MESSAGE:
+            outputs.pop()
+        return Execution(outputs, exit_code, error, checkpoint)
+
+    def _dispatch_steps(self, address: int, max_steps: int) -> tuple[int, int]:
+        # profiler and trace see whole runs only
+        code, executed = self.code, 0
+        while address != STOP and executed < max_steps:
+            address = code[address]()
+            executed += 1
+        return address, executed
+
+    def _counted_steps(self, address: int, max_steps: int) -> tuple[int, int]:
+        # compiled loop runs many instructions in one call, so it would not stop at max_steps
+        if self.tiering is None:
+            return self._dispatch_steps(address, max_steps)
+        self.tiering.suspended = True
+        try:
+            return self._dispatch_steps(address, max_steps)
+        finally:
+            self.tiering.suspended = False
+
+    def _checkpoint(self, address: int, steps: int) -> Checkpoint:
+        stack = tuple(str(value) if type(value) is Rope else value for value in self.stack.values())
+        variables = {name: str(value) if type(value) is Rope else value for name, value in self.variables.items()}
+        return Checkpoint(
+            self.program.digest, address, stack, variables, self.local_variables.memory.memory_size, steps,
+        )
+
+    def _release_reserved(self) -> None:
+        if self.reserved_handle is not None:
+            self.local_variables.memory.free(self.reserved_handle)
+            self.reserved_handle = None
+
+    async def _dispatch_async(self, code: list[Handler], budget: int) -> None:
+        push, pop = self.stack.push, self.stack.pop
+        read, interactive, flush = self.input_channel.read, self.input_channel.interactive, self.output_channel.flush
+        address = 0
+        while address != STOP:
+            remaining = budget
+            while remaining and address >= 0:
+                address = code[address]()
+                remaining -= 1
+            if address <= INPUT_REQUEST:
+                if interactive:
+                    flush()
+                line = read()
+                if isawaitable(line):
+                    line = await line
+                value = parse_value(line)
+                pop()
+                push(value)
+                address = INPUT_REQUEST - address
+            elif not remaining:
+                await asyncio.sleep(0)
+
+    @staticmethod
+    def _input_request(next_address: int) -> Handler:
+        request = INPUT_REQUEST - next_address
+        return lambda: request
+
+    def _interpret(self, program: list) -> None:
+        # reference implementation: decodes every command on every execution
         current_address = 0
+        trace = self.logger.is_enabled(LogLevel.TRACE)
         while True:
             instruction = program[current_address]
-            self.log(instruction)
+            if trace:
+                self.log(instruction)
             if current_address < len(program) - 1:
                 arg = program[current_address + 1]
             if instruction == Commands.FETCH:
@@ -48,7 +384,7 @@ class VirtualMachine:
                 value = self.stack.pop()
                 value_2 = self.stack.pop()
                 current_address += 1
-                self.stack.push(value_2 + value)
+                self.stack.push(concat(value_2, value))
             elif instruction == Commands.SUB:
                 value = self.stack.pop()
                 value_2 = self.stack.pop()
@@ -103,23 +439,45 @@ class VirtualMachine:
                 )
                 break
             elif instruction == Commands.INPUT:
-                value = input().strip()
-                try:
-                    value = int(value)
-                except ValueError:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        value = str(value)
+                if self.input_channel.interactive:
+                    self.output_channel.flush()
+                value = parse_value(self.input_channel.read())
                 self.stack.pop()
                 self.stack.push(value)
                 current_address += 1
             elif instruction == Commands.OUTPUT:
-                print(self.stack.pop())
+                self.output_channel.write(self.stack.pop())
                 current_address += 1
+            elif instruction == Commands.CMP_JZ:
+                second = self.stack.pop()
+                first = self.stack.pop()
+                jump = self.calculate(arg, first, second) == 0
+                current_address = program[current_address + 2] if jump else current_address + 3
+            elif instruction == Commands.CMP_JNZ:
+                second = self.stack.pop()
+                first = self.stack.pop()
+                jump = self.calculate(arg, first, second) != 0
+                current_address = program[current_address + 2] if jump else current_address + 3
+            elif instruction == Commands.FETCH2:
+                first = self.fetch(arg)
+                second = self.fetch(program[current_address + 2])
+                self.stack.push(self.calculate(program[current_address + 3], first, second))
+                current_address += 4
+            elif instruction == Commands.PUSH_STORE:
+                self.local_variables.set_pair(program[current_address + 2], arg)
+                current_address += 3
+            elif instruction == Commands.STORE_POP:
+                self.local_variables.set_pair(arg, self.stack.pop())
+                current_address += 2
             elif instruction == Commands.FINISH:
-                print('Execution finished with exit code 0')
+                self.output_channel.write(FINISH_MESSAGE)
                 break
 
-    def log(self, instruction):
-        self.logger_file.write(f'Currently {instruction} executing\n')
+    def _tier(self, program: list, code: list[Handler]) -> None:
+        if self.tiering is not None and self.profiler is None:
+            self.tiering.install(self, program, code)
+
+    def _prepare_stack(self, max_stack_depth: Optional[int]) -> None:
+        memory = self.stack.memory
+        self.stack.clear()
+        self.stack = Stack(memory) if max_stack_depth is None else FixedStack(memory, max_stack_depth)